@@ -0,0 +1,246 @@
+"""
+Thin-client backend: the Database interface over the store's HTTP API.
+
+ApiDatabase has the same methods as Database (those in
+api_server.RPC_METHODS), so RecordStoreApp and AuthWindow work unchanged
+against a store server instead of a local vinylflow.db:
+
+    python api_server.py                     # on the store server
+    python main.py --server http://store:8765  # on each till (or VINYLFLOW_SERVER=...)
+
+A login (authenticate_customer, authenticate_owner) keeps the session
+token the server returns and sends it with every later call until
+end_session(). Use an https:// URL for a server on another machine;
+VINYLFLOW_SERVER_CA names the CA file for a self-signed certificate, and
+VINYLFLOW_TILL_KEY the till key that lets offline sales sync.
+
+To keep tills responsive over the network it
+  * reuses one keep-alive HTTP connection per thread,
+  * sends call_batch() groups as one /batch request, and
+  * caches the results of cacheable reads with their ETag; repeats are
+    revalidated with If-None-Match and a 304 reuses the cached copy.
+
+Errors come back as the exceptions Database would raise: ValueError for
+rejected calls, sqlite3.IntegrityError for duplicates and
+sqlite3.OperationalError when the server's database is busy.
+"""
+import http.client
+import json
+import os
+import sqlite3
+import ssl
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from api_server import (CACHEABLE_METHODS, MAX_BATCH_CALLS, RPC_METHODS, SESSION_METHODS, ApiError,
+                        rpc_dumps, rpc_loads)
+from database import read_csv_import, write_csv_export
+
+CACHE_ENTRIES = 512
+
+
+class ApiDatabase:
+    def __init__(self, url: str, timeout: float = 30):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Store server URL must look like http(s)://host:port, not {url!r}")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.timeout = timeout
+        self._ssl_context = None
+        if parts.scheme == 'https':
+            self._ssl_context = ssl.create_default_context(cafile=os.environ.get('VINYLFLOW_SERVER_CA'))
+        self.till_key = os.environ.get('VINYLFLOW_TILL_KEY')
+        self.session_token = None
+        self._local = threading.local()
+        # (method, encoded arguments) -> (etag, encoded result), least recently used first
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        if name in RPC_METHODS:
+            return partial(self.call, name)
+        raise AttributeError(f"{type(self).__name__} has no attribute {name!r}")
+
+    # ---------- Transport ----------
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self._ssl_context:
+                conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout,
+                                                   context=self._ssl_context)
+            else:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _post(self, path: str, body: bytes, etag: str = None, session: bool = True) -> http.client.HTTPResponse:
+        headers = {'Content-Type': 'application/json'}
+        if etag:
+            headers['If-None-Match'] = etag
+        if session and self.session_token:
+            headers['Authorization'] = f"Bearer {self.session_token}"
+        if self.till_key:
+            headers['X-Till-Key'] = self.till_key
+        for attempt in (1, 2):
+            conn = self._connection()
+            reused = conn.sock is not None
+            try:
+                conn.request('POST', path, body, headers)
+                response = conn.getresponse()
+                response.body = response.read()
+                return response
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                # The server drops idle keep-alive connections; only then is a resend safe
+                if not reused or attempt == 2:
+                    raise
+
+    @staticmethod
+    def _raise_for(status: int, message: str):
+        if status == 400:
+            raise ValueError(message)
+        if status == 409:
+            raise sqlite3.IntegrityError(message)
+        if status == 503:
+            raise sqlite3.OperationalError(message)
+        raise ApiError(status, message)
+
+    @staticmethod
+    def _error_message(response: http.client.HTTPResponse) -> str:
+        try:
+            return json.loads(response.body)['error']
+        except (ValueError, KeyError, TypeError):
+            return response.reason
+
+    # ---------- Caching ----------
+    def _cache_get(self, key: tuple) -> Optional[tuple]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, key: tuple, etag: str, encoded: bytes):
+        with self._cache_lock:
+            self._cache[key] = (etag, encoded)
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _set_session(self, token: Optional[str]):
+        if token != self.session_token:
+            self.session_token = token
+            self.clear_cache()
+
+    # ---------- Calls ----------
+    def call(self, name: str, *args, **kwargs):
+        """Call one Database method on the server"""
+        body = rpc_dumps({'args': list(args), 'kwargs': kwargs})
+        key = (name, body)
+        cached = self._cache_get(key) if name in CACHEABLE_METHODS else None
+        # A login starts afresh, even if the old session has lapsed
+        logging_in = name in SESSION_METHODS and name != 'end_session'
+        response = self._post(f"/rpc/{name}", body, cached[0] if cached else None, session=not logging_in)
+        if name in SESSION_METHODS:
+            return self._session_result(name, response)
+        if response.status == 304 and cached:
+            # Decoded afresh each time so callers cannot modify the cached copy
+            return rpc_loads(cached[1])
+        if response.status != 200:
+            self._raise_for(response.status, self._error_message(response))
+        etag = response.getheader('ETag')
+        if etag and name in CACHEABLE_METHODS:
+            self._cache_put(key, etag, response.body)
+        return rpc_loads(response.body)
+
+    def _session_result(self, name: str, response: http.client.HTTPResponse):
+        if response.status != 200:
+            self._raise_for(response.status, self._error_message(response))
+        result = rpc_loads(response.body)
+        if name == 'end_session':
+            self._set_session(None)
+        elif result:
+            self._set_session(result['session_token'])
+        return result
+
+    def call_batch(self, calls: List[tuple], return_exceptions: bool = False) -> List:
+        """Run (method name, args, kwargs) calls on the server in as few requests as possible.
+
+        Same results as Database.call_batch, except that the server still runs
+        the calls after a failing one. Cached reads are revalidated inside the batch.
+        """
+        results = []
+        for start in range(0, len(calls), MAX_BATCH_CALLS):
+            results.extend(self._send_batch(calls[start:start + MAX_BATCH_CALLS], return_exceptions))
+        return results
+
+    def _send_batch(self, calls: List[tuple], return_exceptions: bool) -> List:
+        keys, entries = [], []
+        for name, args, kwargs in calls:
+            arguments = {'args': list(args), 'kwargs': kwargs}
+            key = (name, rpc_dumps(arguments))
+            cached = self._cache_get(key) if name in CACHEABLE_METHODS else None
+            keys.append((key, cached))
+            entries.append(dict(arguments, method=name, etag=cached[0] if cached else None))
+
+        response = self._post("/batch", rpc_dumps({'calls': entries}))
+        if response.status != 200:
+            self._raise_for(response.status, self._error_message(response))
+
+        results = []
+        for (key, cached), outcome in zip(keys, rpc_loads(response.body)['results']):
+            if 'error' in outcome:
+                try:
+                    self._raise_for(outcome['status'], outcome['error'])
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results.append(e)
+                continue
+            if outcome.get('not_modified') and cached:
+                results.append(rpc_loads(cached[1]))
+                continue
+            result = outcome.get('result')
+            if outcome.get('etag'):
+                self._cache_put(key, outcome['etag'], rpc_dumps(result))
+            results.append(result)
+        return results
+
+    # ---------- Local-only parts of the Database interface ----------
+    def export_to_csv(self, filename: str, data_type: str = 'records'):
+        write_csv_export(filename, data_type, self.get_export_rows(data_type))
+
+    def import_from_csv(self, filename: str, data_type: str = 'records') -> int:
+        method = {'records': 'add_record', 'customers': 'register_customer'}.get(data_type)
+        if method is None:
+            return 0
+        results = self.call_batch([(method, (item,), {}) for item in read_csv_import(filename, data_type)],
+                                  return_exceptions=True)
+        return sum(1 for result in results if not isinstance(result, Exception))
+
+    def start_reservation_sweeper(self, interval_seconds: float = 60):
+        """No-op: the store server expires stale holds"""
+
+    def stop_reservation_sweeper(self):
+        """No-op: the store server expires stale holds"""
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def server_health(self) -> Dict:
+        conn = self._connection()
+        conn.request('GET', '/health')
+        response = conn.getresponse()
+        return json.loads(response.read())
@@ -0,0 +1,1052 @@
+"""
+Headless HTTP/JSON API over the Database layer.
+
+Lets the web shop and other tills share vinylflow.db without the Tkinter
+app. The server is plain asyncio (standard library only): one event loop
+parses HTTP/1.1 with keep-alive, and every Database call runs on a bounded
+thread pool. Each pool thread keeps one SQLite connection open for its
+lifetime instead of opening a new one per method call.
+
+Catalog reads (/records, /records/search, /records/changes, /records/deleted,
+/records/{id}) carry an ETag built from Database.get_change_version(). A
+client that sends it back in If-None-Match gets 304 Not Modified without the
+query being run.
+
+Endpoints (JSON in, JSON out):
+    GET    /health
+    GET    /records?limit=&offset=&include_deleted=     catalog page
+    GET    /records/search?q=&limit=
+    GET    /records/changes?since=&limit=               records changed after row_version `since`
+    GET    /records/deleted?q=&from=&to=&limit=&after_deleted_at=&after_id=
+                                                        deleted records, newest first (keyset pages)
+    GET    /records/{id}
+    GET    /records/{id}/available?holder=
+    POST   /records                                     {record fields...}
+    PATCH  /records/{id}                                {updates: {...}}
+    DELETE /records/{id}
+    POST   /records/{id}/restore
+    POST   /records/bulk                                {record_ids, operation, value}
+    POST   /records/restore                             {record_ids} (one transaction)
+    GET    /carts/{holder}                              active holds
+    POST   /carts/{holder}/items                        {record_id, quantity}
+    DELETE /carts/{holder}/items/{record_id}
+    DELETE /carts/{holder}
+    POST   /carts/{holder}/checkout                     {customer_id, items, shipping_address}
+    GET    /artists
+    GET    /bookings
+    GET    /bookings/slots?from=&to=                    ISO dates
+    POST   /bookings                                    {artist_id, performance_date, duration_minutes, notes}
+    PATCH  /bookings/{id}                               {status}
+    GET    /stats
+
+Thin clients (api_client.ApiDatabase) call Database methods directly:
+    POST   /rpc/{method}                                {args: [...], kwargs: {...}}
+    POST   /batch                                       {calls: [{method, args, kwargs, etag}, ...]}
+Only the methods in RPC_METHODS can be called. Arguments and results use
+rpc_dumps/rpc_loads, which keep datetimes as datetimes. Reads in
+CACHEABLE_METHODS get an ETag too (per call inside a batch). A batch runs
+its calls in order on one worker thread, but not as one transaction.
+
+Access: a login (/rpc/authenticate_customer or /rpc/authenticate_owner)
+returns a session_token, sent back as "Authorization: Bearer <token>".
+The server takes user_id from the session, never from the request. Owner
+methods (OWNER_METHODS, and the REST endpoints that edit records or
+bookings, list deleted records or report statistics) need the owner's
+session. A customer's session can only read or act for that customer's
+own account, sales and artist profile. Browsing, carts, guest checkout
+and registration need no session; without the owner's session, artists
+are listed with PUBLIC_ARTIST_FIELDS only (approved ones) and bookings
+without account usernames. Repeated failed logins for one username or
+from one client address get 429 until an exponentially growing wait has
+passed (LoginThrottle). apply_offline_sales also accepts the
+till key (--till-key) in X-Till-Key.
+
+Errors come back as {"error": "..."} with 400 (rejected, e.g. not enough
+stock), 401 (log in), 403 (not allowed), 404, 409 (duplicate), 429 (too
+many failed logins), 503 (database busy; retry) or 500.
+
+LocalApiServer runs a server on a free port in a background thread, as a
+stand-in store server for tests and benchmarks.
+
+Run (localhost only by default; any other --host needs TLS and VINYLFLOW_OWNER_PASSWORD):
+    python api_server.py [--port 8765] [--workers 8] [--db-dir DIR] [--till-key KEY]
+                         [--host 0.0.0.0 --certfile cert.pem --keyfile key.pem]
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import inspect
+import ipaddress
+import json
+import math
+import os
+import re
+import secrets
+import sqlite3
+import ssl
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from http import HTTPStatus
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from database import Database, PersistentConnection
+from query_stats import QUERY_STATS
+from sql_statements import STATEMENT_CACHE_SIZE
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1024 * 1024
+KEEP_ALIVE_SECONDS = 30
+MAX_BATCH_CALLS = 200
+
+# Database methods thin clients may call through /rpc and /batch
+RPC_METHODS = frozenset({
+    'add_record', 'update_record', 'bulk_update_records', 'delete_record', 'restore_record',
+    'get_record', 'get_all_records', 'get_deleted_records', 'search_records', 'get_artist_names',
+    'get_change_version', 'register_artist', 'get_artist_by_customer_id', 'get_artist_by_id',
+    'get_all_artists', 'delete_artist', 'get_available_slots', 'get_booked_slots', 'create_booking',
+    'get_artist_bookings', 'get_all_bookings', 'update_booking_status', 'register_customer',
+    'get_customer_by_username', 'get_customer_by_id', 'authenticate_customer', 'resume_session',
+    'reserve_stock', 'release_reservations', 'get_available_stock', 'get_reservations',
+    'checkout_reservations', 'create_sale', 'get_revenue_report', 'get_top_sellers',
+    'get_units_by_genre', 'get_sell_through', 'get_customer_sales', 'count_customer_sales',
+    'get_sale_details', 'get_statistics', 'get_export_rows', 'get_records_changed_since',
+    'get_records_version', 'apply_offline_sales', 'set_stock_threshold', 'clear_stock_threshold',
+    'get_stock_thresholds', 'get_stock_alerts', 'count_stock_alerts', 'acknowledge_stock_alerts',
+    'archive_deleted_records', 'count_deleted_records', 'restore_records', 'authenticate_owner',
+    'end_session',
+})
+RPC_SIGNATURES = {name: inspect.signature(getattr(Database, name)) for name in RPC_METHODS}
+# Handled by the server itself: logins start an API session, end_session ends the caller's
+SESSION_METHODS = frozenset({'authenticate_customer', 'authenticate_owner', 'resume_session', 'end_session'})
+# Only for the owner's session
+OWNER_METHODS = frozenset({
+    'add_record', 'update_record', 'bulk_update_records', 'delete_record', 'restore_record',
+    'restore_records', 'get_deleted_records', 'count_deleted_records', 'archive_deleted_records',
+    'delete_artist', 'update_booking_status', 'get_revenue_report', 'get_top_sellers',
+    'get_units_by_genre', 'get_sell_through', 'get_statistics', 'get_export_rows',
+    'set_stock_threshold', 'clear_stock_threshold', 'get_stock_thresholds', 'get_stock_alerts',
+    'count_stock_alerts', 'acknowledge_stock_alerts', 'apply_offline_sales',
+})
+# Owner methods a till may also call with the server's till key (X-Till-Key), whoever is logged in on it
+TILL_METHODS = frozenset({'apply_offline_sales'})
+# Only for the customer behind artist_id
+ARTIST_METHODS = frozenset({'create_booking', 'get_artist_bookings'})
+# An API session lapses after this long without a request
+SESSION_TTL_SECONDS = 12 * 60 * 60
+# Failed logins allowed per username and per client address before each further attempt has to
+# wait; the wait then doubles with every failure, up to LOGIN_MAX_DELAY_SECONDS
+LOGIN_FREE_FAILURES = 5
+LOGIN_BASE_DELAY_SECONDS = 1
+LOGIN_MAX_DELAY_SECONDS = 15 * 60
+# Failures are forgotten this long after the last one
+LOGIN_FAILURE_WINDOW_SECONDS = 60 * 60
+LOGIN_METHODS = frozenset({'authenticate_customer', 'authenticate_owner'})
+# What anyone may see of an artist (and only of approved artists); the rest is for the owner
+# and the artist's own account
+PUBLIC_ARTIST_FIELDS = ('id', 'stage_name', 'genre', 'bio', 'website')
+# Reads whose results only change when get_change_version() does (tables covered by change_log)
+CACHEABLE_METHODS = frozenset({
+    'get_record', 'get_all_records', 'get_deleted_records', 'search_records', 'get_artist_names',
+    'get_revenue_report', 'get_top_sellers', 'get_units_by_genre', 'get_sell_through',
+    'get_customer_sales', 'count_customer_sales', 'get_sale_details', 'get_statistics',
+    'get_export_rows', 'get_records_changed_since', 'get_records_version', 'count_deleted_records',
+})
+# Never sent to clients
+SECRET_FIELDS = ('password_hash',)
+
+
+class WorkerDatabase(Database):
+    """Database that also keeps track of the connections it has handed out.
+
+    Database already reuses connections per thread. Here a connection a
+    method left open because it raised is reclaimed by reset_connections(),
+    which every request calls when it is done, and close_connections()
+    shuts every connection down when the server stops.
+    """
+
+    def __init__(self, base_dir: str, **kwargs):
+        self._connections: List[PersistentConnection] = []
+        self._connections_lock = threading.Lock()
+        super().__init__(base_dir, **kwargs)
+
+    def _in_use(self) -> List[PersistentConnection]:
+        local = self._local
+        if not hasattr(local, 'in_use'):
+            local.in_use = []
+        return local.in_use
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = super()._connect()
+        self._in_use().append(conn)
+        return conn
+
+    def _open(self) -> PersistentConnection:
+        # Not tied to its thread, so close_connections() can shut it down from another one
+        conn = QUERY_STATS.connect(self.db_path, factory=PersistentConnection, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        conn.release = self._release
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _release(self, conn: PersistentConnection):
+        in_use = self._in_use()
+        if conn in in_use:
+            in_use.remove(conn)
+            super()._release(conn)
+
+    def reset_connections(self):
+        """Reset and reclaim the connections still checked out on this thread"""
+        for conn in list(self._in_use()):
+            conn.close()
+
+    def expire_reservations(self) -> int:
+        # Run by the sweeper thread, outside any request
+        try:
+            return super().expire_reservations()
+        finally:
+            self.reset_connections()
+
+    def archive_deleted_records(self, *args, **kwargs) -> int:
+        # Also run by the sweeper thread
+        try:
+            return super().archive_deleted_records(*args, **kwargs)
+        finally:
+            self.reset_connections()
+
+    def close_connections(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.release = None
+            conn.shutdown()
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    __slots__ = ('method', 'path', 'query', 'headers', 'body', 'client', 'session', 'till')
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes, client: str = None):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = unquote(parts.path).rstrip('/') or '/'
+        self.query = dict(parse_qsl(parts.query))
+        self.headers = headers
+        self.body = body
+        # The peer's address
+        self.client = client
+        # Set by ApiServer._authenticate
+        self.session = None
+        self.till = False
+
+    def json(self, object_hook=None) -> Dict:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body, object_hook=object_hook)
+        except ValueError:
+            raise ApiError(400, "Request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return data
+
+    def int_arg(self, name: str, default: Optional[int] = None) -> Optional[int]:
+        value = self.query.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ApiError(400, f"{name} must be an integer")
+
+
+class Response:
+    __slots__ = ('status', 'payload', 'etag')
+
+    def __init__(self, status: int = 200, payload=None, etag: str = None):
+        self.status = status
+        self.payload = payload
+        self.etag = etag
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
+
+
+def _rpc_default(value):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'$date': value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
+
+
+def _rpc_object_hook(obj: Dict):
+    if len(obj) == 1:
+        if '$datetime' in obj:
+            return datetime.fromisoformat(obj['$datetime'])
+        if '$date' in obj:
+            return date.fromisoformat(obj['$date'])
+    return obj
+
+
+def rpc_dumps(value) -> bytes:
+    """JSON for /rpc and /batch bodies; datetimes survive the round trip"""
+    return json.dumps(value, default=_rpc_default, separators=(',', ':')).encode()
+
+
+def rpc_loads(data: bytes):
+    return json.loads(data, object_hook=_rpc_object_hook)
+
+
+def _without_secrets(value):
+    if isinstance(value, dict):
+        return {k: v for k, v in value.items() if k not in SECRET_FIELDS}
+    if isinstance(value, list):
+        return [_without_secrets(item) for item in value]
+    return value
+
+
+def error_status(error: Exception) -> tuple:
+    """(HTTP status, message) for an exception raised by a handler or Database method"""
+    if isinstance(error, ApiError):
+        return error.status, str(error)
+    if isinstance(error, ValueError):
+        # Database refuses business-rule violations with ValueError
+        return 400, str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        # e.g. a record with the same artist and album already exists
+        return 409, str(error)
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error)
+        return (503 if 'locked' in message or 'busy' in message else 500), message
+    print(f"API error: {error!r}", file=sys.stderr)
+    return 500, "Internal server error"
+
+
+def _parse_datetime(value, name: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be an ISO date/time")
+
+
+def _require(data: Dict, *names):
+    missing = [name for name in names if name not in data]
+    if missing:
+        raise ApiError(400, f"Missing field(s): {', '.join(missing)}")
+
+
+def is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class ApiSessions:
+    """Logged-in API clients by bearer token; a session lapses after `ttl` seconds unused"""
+
+    def __init__(self, ttl: float = SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def start(self, user: Dict, is_owner: bool) -> str:
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            for stale in [t for t, session in self._sessions.items() if session['expires'] < now]:
+                del self._sessions[stale]
+            self._sessions[token] = {'token': token, 'user': user, 'is_owner': is_owner,
+                                     'expires': now + self.ttl}
+        return token
+
+    def get(self, token: str) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None or session['expires'] < now:
+                self._sessions.pop(token, None)
+                return None
+            session['expires'] = now + self.ttl
+            return session
+
+    def end(self, token: str):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+
+class LoginThrottle:
+    """Failed-login counts per key (a username or a client address) and the wait they impose"""
+
+    def __init__(self, free_failures: int = LOGIN_FREE_FAILURES, base_delay: float = LOGIN_BASE_DELAY_SECONDS,
+                 max_delay: float = LOGIN_MAX_DELAY_SECONDS, window: float = LOGIN_FAILURE_WINDOW_SECONDS):
+        self.free_failures = free_failures
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.window = window
+        # key -> (failures, monotonic time of the last one)
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def attempt(self, *keys) -> float:
+        """Seconds until any of `keys` may try again; 0 means go ahead now.
+
+        A go-ahead for a key that is already being slowed down also restarts its
+        wait, so parallel requests cannot all slip through the same opening.
+        """
+        now = time.monotonic()
+        with self._lock:
+            wait = 0.0
+            for key in keys:
+                failures, last = self._failures.get(key, (0, now))
+                if failures >= self.free_failures:
+                    delay = min(self.base_delay * 2 ** (failures - self.free_failures), self.max_delay)
+                    wait = max(wait, last + delay - now)
+            if wait <= 0:
+                for key in keys:
+                    if self._failures.get(key, (0, now))[0] >= self.free_failures:
+                        self._failures[key] = (self._failures[key][0], now)
+            return max(wait, 0.0)
+
+    def failed(self, *keys):
+        now = time.monotonic()
+        with self._lock:
+            for stale in [key for key, (_, last) in self._failures.items() if now - last > self.window]:
+                del self._failures[stale]
+            for key in keys:
+                self._failures[key] = (self._failures.get(key, (0, now))[0] + 1, now)
+
+    def succeeded(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._failures.pop(key, None)
+
+
+class ApiServer:
+    # (HTTP method, path pattern, handler name); the first match wins
+    ROUTES = [
+        ('GET', r'/health', 'health'),
+        ('GET', r'/records', 'list_records'),
+        ('POST', r'/records', 'add_record'),
+        ('GET', r'/records/search', 'search_records'),
+        ('GET', r'/records/changes', 'records_changed_since'),
+        ('GET', r'/records/deleted', 'deleted_records'),
+        ('POST', r'/records/bulk', 'bulk_update_records'),
+        ('POST', r'/records/restore', 'restore_records'),
+        ('GET', r'/records/(\d+)', 'get_record'),
+        ('PATCH', r'/records/(\d+)', 'update_record'),
+        ('DELETE', r'/records/(\d+)', 'delete_record'),
+        ('POST', r'/records/(\d+)/restore', 'restore_record'),
+        ('GET', r'/records/(\d+)/available', 'available_stock'),
+        ('GET', r'/carts/([^/]+)', 'get_cart'),
+        ('POST', r'/carts/([^/]+)/items', 'reserve'),
+        ('DELETE', r'/carts/([^/]+)/items/(\d+)', 'release_item'),
+        ('DELETE', r'/carts/([^/]+)', 'release_cart'),
+        ('POST', r'/carts/([^/]+)/checkout', 'checkout'),
+        ('GET', r'/artists', 'list_artists'),
+        ('GET', r'/bookings', 'list_bookings'),
+        ('GET', r'/bookings/slots', 'available_slots'),
+        ('POST', r'/bookings', 'create_booking'),
+        ('PATCH', r'/bookings/(\d+)', 'update_booking'),
+        ('GET', r'/stats', 'statistics'),
+        ('POST', r'/rpc/(\w+)', 'rpc'),
+        ('POST', r'/batch', 'batch'),
+    ]
+
+    def __init__(self, db_dir: str = BASE_DIR, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 workers: int = 8, ssl_context: ssl.SSLContext = None, till_key: str = None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.ssl_context = ssl_context
+        self.till_key = till_key
+        self.sessions = ApiSessions()
+        self.login_throttle = LoginThrottle()
+        self.db = WorkerDatabase(db_dir)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='vinylflow-db')
+        self._routes = [(method, re.compile(pattern + '$'), getattr(self, name))
+                        for method, pattern, name in self.ROUTES]
+        self._server = None
+        self._connection_tasks = set()
+
+    # ---------- Lifecycle ----------
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port,
+                                                  ssl=self.ssl_context)
+        # Port 0 picks a free port; report the real one
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.db.start_reservation_sweeper()
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        """Stop listening and drop open keep-alive connections"""
+        self._server.close()
+        for task in list(self._connection_tasks):
+            task.cancel()
+        await asyncio.gather(*self._connection_tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def close(self):
+        """Release the worker threads and their connections (after the event loop is done)"""
+        if self._server is not None:
+            self._server.close()
+        self.db.stop_reservation_sweeper()
+        self.executor.shutdown(wait=True)
+        self.db.close_connections()
+
+    # ---------- HTTP ----------
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connection_tasks.add(task)
+        peer = writer.get_extra_info('peername')
+        client = peer[0] if isinstance(peer, tuple) else str(peer)
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._write(writer, Response(400, {'error': "Malformed request line"}), False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get('content-length') or '0'
+                if not (length.isascii() and length.isdigit()):
+                    # Without a usable length the body cannot be skipped, so the connection ends too
+                    await self._write(writer, Response(400, {'error': "Invalid Content-Length"}), False)
+                    break
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    await self._write(writer, Response(413, {'error': "Request body too large"}), False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+                request = Request(method.upper(), target, headers, body, client)
+                response = await self._dispatch(request)
+                await self._write(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connection_tasks.discard(task)
+            writer.close()
+
+    async def _write(self, writer: asyncio.StreamWriter, response: Response, keep_alive: bool):
+        body = b''
+        if isinstance(response.payload, bytes):
+            # Already encoded (RPC)
+            body = response.payload
+        elif response.status != 304:
+            body = json.dumps(response.payload, default=_json_default, separators=(',', ':')).encode()
+        head = [f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if response.etag:
+            # Clients may cache but must revalidate each time
+            head += [f"ETag: {response.etag}", "Cache-Control: no-cache"]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _dispatch(self, request: Request) -> Response:
+        loop = asyncio.get_running_loop()
+        try:
+            handler, args = self._route(request)
+            return await loop.run_in_executor(self.executor, self._call, handler, request, args)
+        except ApiError as e:
+            return Response(e.status, {'error': str(e)})
+
+    def _route(self, request: Request):
+        path_matched = False
+        for method, pattern, handler in self._routes:
+            match = pattern.match(request.path)
+            if match:
+                path_matched = True
+                if method == request.method:
+                    return handler, match.groups()
+        if path_matched:
+            raise ApiError(405, f"{request.method} not allowed on {request.path}")
+        raise ApiError(404, f"No such endpoint: {request.path}")
+
+    def _call(self, handler, request: Request, args) -> Response:
+        """Run a handler on a pool thread and turn its result or error into a Response"""
+        try:
+            self._authenticate(request)
+            result = handler(request, *args)
+        except Exception as e:
+            status, message = error_status(e)
+            return Response(status, {'error': message})
+        finally:
+            # Locks must not outlive the request, even when a method raised mid-transaction
+            self.db.reset_connections()
+        return result if isinstance(result, Response) else Response(200, result)
+
+    # ---------- Access ----------
+    def _authenticate(self, request: Request):
+        """Attach the caller's session and till key; 401 for a token that is not (or no longer) live"""
+        authorization = request.headers.get('authorization')
+        if authorization:
+            scheme, _, token = authorization.partition(' ')
+            if scheme.lower() != 'bearer':
+                raise ApiError(401, "Authorization must be a Bearer session token")
+            request.session = self.sessions.get(token.strip())
+            if request.session is None:
+                raise ApiError(401, "Session expired; log in again")
+        key = request.headers.get('x-till-key')
+        request.till = bool(self.till_key and key and hmac.compare_digest(key.encode(), self.till_key.encode()))
+
+    @staticmethod
+    def _denied(request: Request) -> ApiError:
+        if request.session is None:
+            return ApiError(401, "Log in first")
+        return ApiError(403, "Not allowed for this account")
+
+    @staticmethod
+    def _is_owner(request: Request) -> bool:
+        return request.session is not None and request.session['is_owner']
+
+    def _require_owner(self, request: Request):
+        if not self._is_owner(request):
+            raise self._denied(request)
+
+    @staticmethod
+    def _user_id(request: Request) -> Optional[int]:
+        """Who made the change, for the audit columns"""
+        return request.session['user']['id'] if request.session else None
+
+    def _check_customer(self, request: Request, customer_id):
+        """A customer may only name their own account (None, a guest, is anyone's)"""
+        if customer_id is None or self._is_owner(request):
+            return
+        if request.session is None or request.session['user']['id'] != customer_id:
+            raise self._denied(request)
+
+    def _check_artist(self, request: Request, artist_id):
+        if self._is_owner(request):
+            return
+        if request.session is None:
+            raise self._denied(request)
+        artist = self.db.get_artist_by_customer_id(request.session['user']['id'])
+        if not artist or artist['id'] != artist_id:
+            raise self._denied(request)
+
+    def _authorize(self, request: Request, name: str, args, kwargs) -> inspect.BoundArguments:
+        """Check the caller may make this RPC call; returns the arguments to make it with"""
+        if name in OWNER_METHODS and not (name in TILL_METHODS and request.till):
+            self._require_owner(request)
+        try:
+            bound = RPC_SIGNATURES[name].bind(None, *args, **kwargs)
+        except TypeError as e:
+            raise ApiError(400, f"Bad call: {e}")
+        arguments = bound.arguments
+        if 'user_id' in RPC_SIGNATURES[name].parameters:
+            arguments['user_id'] = self._user_id(request)
+        self._check_customer(request, arguments.get('customer_id'))
+        if name in ARTIST_METHODS:
+            self._check_artist(request, arguments.get('artist_id'))
+        if name == 'get_customer_by_username' and not self._is_owner(request):
+            if request.session is None or request.session['user'].get('username') != arguments.get('username'):
+                raise self._denied(request)
+        if name == 'get_all_records' and arguments.get('include_deleted'):
+            self._require_owner(request)
+        return bound
+
+    def _session_call(self, request: Request, name: str, bound: inspect.BoundArguments):
+        """Logins start an API session; its token replaces the Database's session_token"""
+        if name == 'end_session':
+            if request.session:
+                self.sessions.end(request.session['token'])
+            return None
+        if name == 'resume_session':
+            session = self.sessions.get(bound.arguments.get('token'))
+            return dict(session['user'], session_token=session['token']) if session else None
+        # One username's failures slow down that username; one client's, every login from it
+        keys = (('username', name, str(bound.arguments.get('username'))), ('client', request.client))
+        wait = self.login_throttle.attempt(*keys)
+        if wait > 0:
+            raise ApiError(429, f"Too many failed logins; try again in {math.ceil(wait)} s")
+        user = getattr(self.db, name)(*bound.args[1:], **bound.kwargs)
+        if not user:
+            self.login_throttle.failed(*keys)
+            return None
+        self.login_throttle.succeeded(keys[0])
+        user = _without_secrets(user)
+        user.pop('session_token', None)
+        return dict(user, session_token=self.sessions.start(user, name == 'authenticate_owner'))
+
+    @staticmethod
+    def _public_artists(artists: List[Dict]) -> List[Dict]:
+        return [{field: artist.get(field) for field in PUBLIC_ARTIST_FIELDS}
+                for artist in artists if artist.get('is_approved')]
+
+    def _public_artist(self, request: Request, artist: Dict) -> Optional[Dict]:
+        """The whole artist for its own account, else the public fields of an approved one"""
+        if request.session is not None and request.session['user']['id'] == artist.get('customer_id'):
+            return artist
+        public = self._public_artists([artist])
+        return public[0] if public else None
+
+    @staticmethod
+    def _public_bookings(bookings: List[Dict]) -> List[Dict]:
+        # Account usernames would be a list of logins to guess passwords for
+        return [{k: v for k, v in booking.items() if k != 'username'} for booking in bookings]
+
+    @staticmethod
+    def _etag(version: int, key: bytes) -> str:
+        return f'"{version}-{hashlib.blake2b(key, digest_size=6).hexdigest()}"'
+
+    @staticmethod
+    def _matches(request: Request, etag: str) -> bool:
+        return etag in (tag.strip() for tag in request.headers.get('if-none-match', '').split(','))
+
+    def _cached(self, request: Request, load) -> Response:
+        """Catalog response with an ETag; 304 without running `load` if the client's copy is current"""
+        target = request.path + '?' + '&'.join(f"{k}={v}" for k, v in sorted(request.query.items()))
+        etag = self._etag(self.db.get_change_version(), target.encode())
+        if self._matches(request, etag):
+            return Response(304, etag=etag)
+        return Response(200, load(), etag)
+
+    # ---------- Catalog and records ----------
+    def health(self, request: Request):
+        return {'status': 'ok', 'version': self.db.get_change_version()}
+
+    def list_records(self, request: Request):
+        limit = request.int_arg('limit')
+        offset = request.int_arg('offset', 0)
+        include_deleted = request.query.get('include_deleted') in ('1', 'true')
+        if include_deleted:
+            self._require_owner(request)
+        return self._cached(request, lambda: self.db.get_all_records(limit, offset, include_deleted))
+
+    def search_records(self, request: Request):
+        query = request.query.get('q', '')
+        limit = request.int_arg('limit', 50)
+        return self._cached(request, lambda: self.db.search_records(query, limit))
+
+    def records_changed_since(self, request: Request):
+        since = request.int_arg('since', 0)
+        limit = request.int_arg('limit', 1000)
+
+        def load():
+            records = self.db.get_records_changed_since(since, limit)
+            # `version` is the `since` for the next call; `more` says whether to make it now
+            return {'records': records, 'version': records[-1]['row_version'] if records else since,
+                    'more': len(records) == limit}
+        return self._cached(request, load)
+
+    def deleted_records(self, request: Request):
+        self._require_owner(request)
+        limit = request.int_arg('limit', 100)
+        search = request.query.get('q')
+        deleted_from, deleted_to = request.query.get('from'), request.query.get('to')
+        after = None
+        if request.query.get('after_deleted_at'):
+            after = (request.query['after_deleted_at'], request.int_arg('after_id', 0))
+
+        def load():
+            records = self.db.get_deleted_records(limit, after, search, deleted_from, deleted_to)
+            # Pass the last record's deleted_at and id back as after_deleted_at / after_id for the next page
+            return {'records': records, 'total': self.db.count_deleted_records(search, deleted_from, deleted_to),
+                    'more': len(records) == limit}
+        return self._cached(request, load)
+
+    def get_record(self, request: Request, record_id):
+        record = self._cached(request, lambda: self.db.get_record(int(record_id)))
+        if record.status == 200 and record.payload is None:
+            raise ApiError(404, f"Record {record_id} not found")
+        return record
+
+    def add_record(self, request: Request):
+        self._require_owner(request)
+        data = request.json()
+        data.pop('user_id', None)
+        record_id = self.db.add_record(data, user_id=self._user_id(request))
+        return Response(201, {'id': record_id})
+
+    def update_record(self, request: Request, record_id):
+        self._require_owner(request)
+        data = request.json()
+        _require(data, 'updates')
+        if not self.db.update_record(int(record_id), data['updates'], user_id=self._user_id(request)):
+            raise ApiError(404, f"Record {record_id} not found")
+        return {'updated': True}
+
+    def delete_record(self, request: Request, record_id):
+        self._require_owner(request)
+        if not self.db.delete_record(int(record_id), user_id=self._user_id(request)):
+            raise ApiError(404, f"Record {record_id} not found")
+        return {'deleted': True}
+
+    def restore_record(self, request: Request, record_id):
+        self._require_owner(request)
+        if not self.db.restore_record(int(record_id), user_id=self._user_id(request)):
+            raise ApiError(404, f"Record {record_id} not found")
+        return {'restored': True}
+
+    def restore_records(self, request: Request):
+        self._require_owner(request)
+        data = request.json()
+        _require(data, 'record_ids')
+        return {'restored': self.db.restore_records(data['record_ids'], user_id=self._user_id(request))}
+
+    def bulk_update_records(self, request: Request):
+        self._require_owner(request)
+        data = request.json()
+        _require(data, 'record_ids', 'operation')
+        return self.db.bulk_update_records(data['record_ids'], data['operation'], data.get('value'),
+                                           user_id=self._user_id(request))
+
+    def available_stock(self, request: Request, record_id):
+        return {'available': self.db.get_available_stock(int(record_id), request.query.get('holder'))}
+
+    # ---------- Cart ----------
+    def get_cart(self, request: Request, holder):
+        return self.db.get_reservations(holder)
+
+    def reserve(self, request: Request, holder):
+        data = request.json()
+        _require(data, 'record_id', 'quantity')
+        held = self.db.reserve_stock(holder, int(data['record_id']), int(data['quantity']))
+        return {'record_id': data['record_id'], 'held': held}
+
+    def release_item(self, request: Request, holder, record_id):
+        return {'released': self.db.release_reservations(holder, int(record_id))}
+
+    def release_cart(self, request: Request, holder):
+        return {'released': self.db.release_reservations(holder)}
+
+    def checkout(self, request: Request, holder):
+        data = request.json()
+        _require(data, 'items')
+        self._check_customer(request, data.get('customer_id'))
+        sale_id = self.db.checkout_reservations(holder, data.get('customer_id'), data['items'],
+                                                data.get('shipping_address', ""))
+        return Response(201, {'sale_id': sale_id})
+
+    # ---------- Artists and bookings ----------
+    def list_artists(self, request: Request):
+        artists = self.db.get_all_artists()
+        return artists if self._is_owner(request) else self._public_artists(artists)
+
+    def list_bookings(self, request: Request):
+        bookings = self.db.get_all_bookings()
+        return bookings if self._is_owner(request) else self._public_bookings(bookings)
+
+    def available_slots(self, request: Request):
+        from_date = request.query.get('from')
+        to_date = request.query.get('to')
+        return self.db.get_available_slots(
+            _parse_datetime(from_date, 'from') if from_date else None,
+            _parse_datetime(to_date, 'to') if to_date else None)
+
+    def create_booking(self, request: Request):
+        data = request.json()
+        _require(data, 'artist_id', 'performance_date')
+        self._check_artist(request, int(data['artist_id']))
+        booking_id = self.db.create_booking(
+            int(data['artist_id']), _parse_datetime(data['performance_date'], 'performance_date'),
+            int(data.get('duration_minutes', 60)), data.get('notes', ""), user_id=self._user_id(request))
+        return Response(201, {'id': booking_id})
+
+    def update_booking(self, request: Request, booking_id):
+        self._require_owner(request)
+        data = request.json()
+        _require(data, 'status')
+        if not self.db.update_booking_status(int(booking_id), data['status'], user_id=self._user_id(request)):
+            raise ApiError(404, f"Booking {booking_id} not found")
+        return {'updated': True}
+
+    # ---------- Statistics ----------
+    def statistics(self, request: Request):
+        self._require_owner(request)
+        return self.db.get_statistics()
+
+    # ---------- Thin-client RPC ----------
+    def _rpc_method(self, name: str):
+        if name not in RPC_METHODS:
+            raise ApiError(404, f"No such method: {name}")
+        return getattr(self.db, name)
+
+    def _rpc_call(self, request: Request, name: str, method, bound: inspect.BoundArguments):
+        result = method(*bound.args[1:], **bound.kwargs)
+        if name == 'get_sale_details' and result:
+            self._check_customer(request, result.get('customer_id'))
+        if not self._is_owner(request):
+            if name == 'get_all_artists':
+                result = self._public_artists(result)
+            elif name == 'get_artist_by_id' and result:
+                result = self._public_artist(request, result)
+            elif name == 'get_all_bookings':
+                result = self._public_bookings(result)
+        return _without_secrets(result)
+
+    def rpc(self, request: Request, name):
+        method = self._rpc_method(name)
+        data = request.json(_rpc_object_hook)
+        bound = self._authorize(request, name, data.get('args', ()), data.get('kwargs', {}))
+        if name in SESSION_METHODS:
+            return Response(200, rpc_dumps(self._session_call(request, name, bound)))
+        etag = None
+        if name in CACHEABLE_METHODS:
+            key = name.encode() + rpc_dumps({'args': data.get('args', []), 'kwargs': data.get('kwargs', {})})
+            etag = self._etag(self.db.get_change_version(), key)
+            if self._matches(request, etag):
+                return Response(304, etag=etag)
+        return Response(200, rpc_dumps(self._rpc_call(request, name, method, bound)), etag)
+
+    def batch(self, request: Request):
+        calls = request.json(_rpc_object_hook).get('calls', [])
+        if len(calls) > MAX_BATCH_CALLS:
+            raise ApiError(413, f"At most {MAX_BATCH_CALLS} calls per batch")
+        version = None
+        results = []
+        for call in calls:
+            try:
+                name = call['method']
+                method = self._rpc_method(name)
+                if name in SESSION_METHODS:
+                    raise ApiError(400, f"Call {name} through /rpc, not in a batch")
+                bound = self._authorize(request, name, call.get('args', ()), call.get('kwargs', {}))
+                entry = {}
+                if name in CACHEABLE_METHODS:
+                    if version is None:
+                        version = self.db.get_change_version()
+                    key = name.encode() + rpc_dumps({'args': call.get('args', []),
+                                                     'kwargs': call.get('kwargs', {})})
+                    entry['etag'] = self._etag(version, key)
+                    if entry['etag'] == call.get('etag'):
+                        entry['not_modified'] = True
+                        results.append(entry)
+                        continue
+                entry['result'] = self._rpc_call(request, name, method, bound)
+            except Exception as e:
+                if isinstance(e, (KeyError, TypeError)):
+                    e = ApiError(400, f"Bad call: {e}")
+                status, message = error_status(e)
+                entry = {'status': status, 'error': message}
+            finally:
+                self.db.reset_connections()
+            results.append(entry)
+        return Response(200, rpc_dumps({'results': results}))
+
+
+class LocalApiServer:
+    """An ApiServer on a free localhost port, run in a background thread.
+
+        with LocalApiServer(db_dir) as server:
+            db = ApiDatabase(server.url)
+    """
+
+    def __init__(self, db_dir: str = BASE_DIR, workers: int = 4, port: int = 0, **kwargs):
+        self.server = ApiServer(db_dir, port=port, workers=workers, **kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        scheme = 'https' if self.server.ssl_context else 'http'
+        return f"{scheme}://{self.server.host}:{self.server.port}"
+
+    def start(self) -> 'LocalApiServer':
+        self._loop.run_until_complete(self.server.start())
+        self._thread = threading.Thread(target=self._loop.run_forever, name="local-api-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+        self._loop.close()
+        self.server.close()
+
+    def __enter__(self) -> 'LocalApiServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve vinylflow.db as an HTTP/JSON API")
+    parser.add_argument('--db-dir', default=BASE_DIR, help="directory holding vinylflow.db")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    parser.add_argument('--workers', type=int, default=8, help="database threads (one connection each)")
+    parser.add_argument('--certfile', help="serve HTTPS with this certificate (PEM)")
+    parser.add_argument('--keyfile', help="private key for --certfile, if not in the same file")
+    parser.add_argument('--till-key', default=os.environ.get('VINYLFLOW_TILL_KEY'),
+                        help="shared key that lets tills sync offline sales (or VINYLFLOW_TILL_KEY)")
+    args = parser.parse_args()
+    if args.keyfile and not args.certfile:
+        parser.error("--keyfile needs --certfile")
+    if not args.certfile and not is_loopback(args.host):
+        # Logins and session tokens would cross the network in clear text
+        parser.error(f"--host {args.host} is reachable from other machines; serve it over HTTPS "
+                     f"with --certfile/--keyfile, or listen on 127.0.0.1")
+    if not is_loopback(args.host) and not os.environ.get('VINYLFLOW_OWNER_PASSWORD'):
+        # The built-in owner PIN is not a secret fit for a network
+        parser.error(f"--host {args.host} is reachable from other machines; set VINYLFLOW_OWNER_PASSWORD "
+                     f"(and VINYLFLOW_OWNER_USERNAME) to the owner's login first")
+
+    ssl_context = None
+    if args.certfile:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+    server = ApiServer(args.db_dir, args.host, args.port, args.workers, ssl_context, args.till_key)
+
+    async def run():
+        await server.start()
+        scheme = 'https' if ssl_context else 'http'
+        print(f"VinylFlow API listening on {scheme}://{server.host}:{server.port} "
+              f"({server.workers} database workers)", flush=True)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
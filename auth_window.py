@@ -8,7 +8,7 @@ from database import Database
 import math
 
 class AuthWindow:
-    def __init__(self, parent, on_login_success):
+    def __init__(self, parent, on_login_success, db=None):
         self.parent = parent
         self.on_login_success = on_login_success
         
@@ -16,13 +16,9 @@ class AuthWindow:
         for widget in self.parent.winfo_children():
             widget.destroy()
         
-        # Owner credentials
-        self.owner_username = "FP"
-        self.owner_password = "1539"
-        
-        # Initialize database
+        # Local database unless a backend (e.g. api_client.ApiDatabase) is passed in
         self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        self.db = Database(self.base_dir)
+        self.db = db if db is not None else Database(self.base_dir)
         
         # Create main container
         self.main_container = tk.Frame(self.parent, bg=COLORS['bg'])
@@ -151,6 +147,14 @@ class AuthWindow:
         except:
             pass
     
+    # Vinyl animation: 5 degrees per 50 ms frame, i.e. 72 frames per revolution
+    VINYL_FRAME_MS = 50
+    VINYL_STEP_DEGREES = 5
+    # How often a paused animation checks whether it can resume
+    VINYL_PAUSED_CHECK_MS = 500
+    VINYL_GROOVE_RADII = range(10, 80, 5)
+    _vinyl_frames = None
+    
     def create_vinyl_animation(self, parent):
         """Create vinyl record animation"""
         self.canvas = tk.Canvas(parent, width=200, height=200, bg=COLORS['bg'], highlightthickness=0)
@@ -159,68 +163,73 @@ class AuthWindow:
         center_x, center_y = 100, 100
         radius = 80
         
+        # Items are created once; each frame only moves the grooves
         self.canvas.create_oval(center_x - radius, center_y - radius,
                                center_x + radius, center_y + radius,
                                fill='#222222', outline='#444444', width=2)
         
-        for i in range(10, 80, 5):
+        self.groove_items = [
             self.canvas.create_oval(center_x - i, center_y - i,
                                    center_x + i, center_y + i,
                                    outline='#333333', width=1)
+            for i in self.VINYL_GROOVE_RADII
+        ]
         
         label_radius = 30
         self.canvas.create_oval(center_x - label_radius, center_y - label_radius,
                                center_x + label_radius, center_y + label_radius,
                                fill='#1e293b', outline='#475569', width=2)
         
+        self.canvas.create_text(center_x, center_y,
+                              text="VF",
+                              font=('Inter', 10, 'bold'),
+                              fill=COLORS['primary'])
+        
         self.canvas.create_oval(center_x - 5, center_y - 5,
                                center_x + 5, center_y + 5,
                                fill='#ffffff', outline='#cbd5e1')
         
-        self.rotation_angle = 0
+        self.vinyl_frame = 0
         self.animate_vinyl()
     
+    @classmethod
+    def vinyl_frames(cls):
+        """Groove coordinates for every frame of one revolution, computed once per process"""
+        if cls._vinyl_frames is None:
+            center_x, center_y = 100, 100
+            frames = []
+            for angle in range(0, 360, cls.VINYL_STEP_DEGREES):
+                rad_angle = math.radians(angle)
+                coords = []
+                for i in cls.VINYL_GROOVE_RADII:
+                    offset = math.sin(rad_angle + i/20) * 2
+                    coords.append((center_x - i + offset, center_y - i,
+                                   center_x + i + offset, center_y + i))
+                frames.append(coords)
+            cls._vinyl_frames = frames
+        return cls._vinyl_frames
+    
+    def vinyl_visible(self):
+        """True while the canvas is on screen and the application has keyboard focus"""
+        try:
+            return bool(self.canvas.winfo_viewable()) and self.parent.focus_get() is not None
+        except (KeyError, tk.TclError):
+            # focus_get can fail while a combobox popdown owns the focus
+            return False
+    
     def animate_vinyl(self):
-        """Animate vinyl rotation"""
+        """Animate vinyl rotation, pausing while the window is hidden or unfocused"""
         if hasattr(self, 'canvas') and self.canvas.winfo_exists():
-            self.rotation_angle += 5
-            if self.rotation_angle >= 360:
-                self.rotation_angle = 0
-            
-            self.canvas.delete("all")
-            
-            center_x, center_y = 100, 100
-            radius = 80
-            
-            rad_angle = math.radians(self.rotation_angle)
-            cos_a = math.cos(rad_angle)
-            sin_a = math.sin(rad_angle)
-            
-            self.canvas.create_oval(center_x - radius, center_y - radius,
-                                   center_x + radius, center_y + radius,
-                                   fill='#222222', outline='#444444', width=2)
-            
-            for i in range(10, 80, 5):
-                offset = math.sin(rad_angle + i/20) * 2
-                self.canvas.create_oval(center_x - i + offset, center_y - i,
-                                       center_x + i + offset, center_y + i,
-                                       outline='#333333', width=1)
-            
-            label_radius = 30
-            self.canvas.create_oval(center_x - label_radius, center_y - label_radius,
-                                   center_x + label_radius, center_y + label_radius,
-                                   fill='#1e293b', outline='#475569', width=2)
+            if not self.vinyl_visible():
+                self.parent.after(self.VINYL_PAUSED_CHECK_MS, self.animate_vinyl)
+                return
             
-            self.canvas.create_text(center_x, center_y,
-                                  text="VF",
-                                  font=('Inter', 10, 'bold'),
-                                  fill=COLORS['primary'])
+            frames = self.vinyl_frames()
+            self.vinyl_frame = (self.vinyl_frame + 1) % len(frames)
+            for item, coords in zip(self.groove_items, frames[self.vinyl_frame]):
+                self.canvas.coords(item, *coords)
             
-            self.canvas.create_oval(center_x - 5, center_y - 5,
-                                   center_x + 5, center_y + 5,
-                                   fill='#ffffff', outline='#cbd5e1')
-            
-            self.parent.after(50, self.animate_vinyl)
+            self.parent.after(self.VINYL_FRAME_MS, self.animate_vinyl)
     
     def create_auth_forms(self, parent):
         """Create modern auth forms"""
@@ -716,8 +725,9 @@ class AuthWindow:
             return
         
         try:
-            # Register customer
+            # Register customer, then log in (an API server only lets a customer add their own artist profile)
             customer_id = self.db.register_customer(data)
+            customer = self.db.authenticate_customer(data['username'], data['password'])
             
             # If artist, also create artist profile
             if data['role'] == 'artist':
@@ -733,11 +743,6 @@ class AuthWindow:
                     artist_data['stage_name'] = data['username']
                 self.db.register_artist(customer_id, artist_data)
             
-            # Get customer record
-            customer = self.db.get_customer_by_username(data['username'])
-            if customer and 'password_hash' in customer:
-                del customer['password_hash']
-            
             messagebox.showinfo("Success", "Account created successfully!")
             self.on_login_success(is_owner=False, user=customer)
             
@@ -750,9 +755,12 @@ class AuthWindow:
         username = self.owner_username_entry.get().strip()
         password = self.owner_password_entry.get().strip()
         
-        if username == self.owner_username and password == self.owner_password:
-            # Create a user dict with owner role
-            user = {'username': 'owner', 'role': 'owner', 'id': 0}
+        try:
+            user = self.db.authenticate_owner(username, password)
+        except Exception as e:
+            self.show_error(self.owner_error, f"Error: {str(e)}")
+            return
+        if user:
             self.on_login_success(is_owner=True, user=user)
         else:
             self.show_error(self.owner_error, "Invalid owner credentials")
@@ -0,0 +1,180 @@
+"""
+Online backups of vinylflow.db.
+
+Backups are taken with sqlite3's backup API. It copies the live database a
+few pages at a time and sleeps between steps, so tills writing to the
+database are only ever held up for one short step, and the copy is always
+a consistent snapshot (unlike copying the file while it is being written).
+
+Every backup is checked with PRAGMA integrity_check before it is kept,
+can optionally be gzip-compressed, and old vinylflow_backup_* files are
+pruned down to a retention count.
+
+Run:
+    python backup_engine.py [--compress] [--keep 10]
+    python backup_engine.py --restore vinylflow_backup_20260401_211335.db
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List
+
+BACKUP_PREFIX = "vinylflow_backup_"
+BACKUP_SUFFIXES = (".db", ".db.gz")
+
+
+class BackupEngine:
+    def __init__(self, db_path: str, backup_dir: str = None, pages_per_step: int = 256,
+                 step_sleep: float = 0.005, compress: bool = False, keep: int = 10):
+        self.db_path = db_path
+        self.backup_dir = backup_dir or os.path.dirname(os.path.abspath(db_path))
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.compress = compress
+        self.keep = keep
+
+    def backup(self, backup_path: str = None, compress: bool = None, inspect=None) -> str:
+        """Take a verified snapshot of the live database and return its path.
+
+        `inspect`, if given, is called with the path of the verified,
+        uncompressed snapshot before it is compressed or renamed.
+        """
+        compress = self.compress if compress is None else compress
+        # Rotation only ever prunes backup_dir: a one-off copy elsewhere (say, a USB drive) leaves it alone
+        rotate = backup_path is None or (os.path.realpath(os.path.dirname(os.path.abspath(backup_path)))
+                                         == os.path.realpath(self.backup_dir))
+        if backup_path is None:
+            backup_path = self._new_backup_path(compress)
+
+        # Copy (and compress) into temp files next to the target so a failed, corrupt or
+        # truncated copy never shows up under a backup name
+        target_dir = os.path.dirname(os.path.abspath(backup_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".backup_", suffix=".db", dir=target_dir)
+        os.close(fd)
+        gz_path = None
+        try:
+            self.copy_database(self.db_path, tmp_path)
+            self.check_integrity(tmp_path)
+            if inspect:
+                inspect(tmp_path)
+            if compress:
+                fd, gz_path = tempfile.mkstemp(prefix=".backup_", suffix=".db.gz", dir=target_dir)
+                with os.fdopen(fd, 'wb') as raw, open(tmp_path, 'rb') as src, \
+                        gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(gz_path, backup_path)
+            else:
+                os.replace(tmp_path, backup_path)
+        finally:
+            for path in (tmp_path, gz_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+
+        if self.keep and rotate:
+            self.rotate()
+        return backup_path
+
+    def copy_database(self, source_path: str, target_path: str):
+        """Copy one SQLite database into another in page steps"""
+        src = sqlite3.connect(source_path)
+        dst = sqlite3.connect(target_path)
+        try:
+            src.backup(dst, pages=self.pages_per_step, sleep=self.step_sleep)
+        finally:
+            dst.close()
+            src.close()
+
+    def check_integrity(self, path: str):
+        """Raise ValueError unless PRAGMA integrity_check passes on an uncompressed copy"""
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+        finally:
+            conn.close()
+        if result != ['ok']:
+            raise ValueError(f"Backup failed integrity check: {'; '.join(result[:5])}")
+
+    def verify(self, backup_path: str) -> bool:
+        """Check an existing backup (compressed or not)"""
+        try:
+            with plain_backup_file(backup_path) as path:
+                self.check_integrity(path)
+            return True
+        except (ValueError, sqlite3.DatabaseError, OSError):
+            return False
+
+    def restore(self, backup_path: str, target_path: str = None):
+        """Copy a backup over the live database (or target_path) through the backup API"""
+        target_path = target_path or self.db_path
+        with plain_backup_file(backup_path) as path:
+            self.check_integrity(path)
+            self.copy_database(path, target_path)
+
+    def list_backups(self) -> List[str]:
+        """Full backup files in the backup directory, oldest first"""
+        names = [name for name in os.listdir(self.backup_dir)
+                 if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIXES)]
+        # Names embed a sortable timestamp
+        return [os.path.join(self.backup_dir, name) for name in sorted(names)]
+
+    def rotate(self, keep: int = None) -> List[str]:
+        """Delete all but the newest `keep` backups and return the removed paths"""
+        keep = self.keep if keep is None else keep
+        backups = self.list_backups()
+        removed = backups[:-keep] if keep else []
+        for path in removed:
+            os.remove(path)
+        return removed
+
+    def _new_backup_path(self, compress: bool) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = ".db.gz" if compress else ".db"
+        path = os.path.join(self.backup_dir, f"{BACKUP_PREFIX}{timestamp}{suffix}")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.backup_dir, f"{BACKUP_PREFIX}{timestamp}_{n}{suffix}")
+            n += 1
+        return path
+
+
+@contextmanager
+def plain_backup_file(backup_path: str):
+    """Yield a plain .db path for a backup, decompressing .gz backups to a temp file"""
+    if not backup_path.endswith('.gz'):
+        yield backup_path
+        return
+    fd, tmp_path = tempfile.mkstemp(prefix=".restore_", suffix=".db")
+    try:
+        with os.fdopen(fd, 'wb') as dst, gzip.open(backup_path, 'rb') as src:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        yield tmp_path
+    finally:
+        os.remove(tmp_path)
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Back up or restore vinylflow.db")
+    parser.add_argument('--compress', action='store_true', help="gzip the backup")
+    parser.add_argument('--keep', type=int, default=10, help="backups to retain (0 = keep all)")
+    parser.add_argument('--restore', metavar='BACKUP', help="restore this backup over vinylflow.db")
+    parser.add_argument('--verify', metavar='BACKUP', help="run an integrity check on a backup")
+    args = parser.parse_args()
+
+    engine = BackupEngine(os.path.join(base_dir, "vinylflow.db"), compress=args.compress, keep=args.keep)
+    if args.restore:
+        engine.restore(args.restore)
+        print(f"Restored {args.restore}")
+    elif args.verify:
+        print("ok" if engine.verify(args.verify) else "FAILED")
+    else:
+        print(f"Backed up to: {engine.backup()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Memory and sort/filter time of the catalog as dicts versus a CatalogSnapshot.
+
+Loads the live records of a copy of the database three ways and reports the
+memory each keeps per record (tracemalloc) and the peak while loading:
+
+    dicts              Database.get_all_records()
+    snapshot (dicts)   CatalogSnapshot.from_records(get_all_records())  (the UI, on an API or offline till)
+    snapshot (cursor)  Database.get_catalog_snapshot()  (the UI, on a local database)
+
+then times sorting by album and price and a text + in-stock filter over the
+dicts and over the snapshot. The database is copied to a temp directory, so
+the original is never modified.
+
+Run:
+    python seed_demo_data.py --generate    # 100k-record database in generated/
+    python benchmarks/bench_catalog_memory.py [--db generated/vinylflow.db] [--repeat 5]
+"""
+import argparse
+import gc
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_snapshot import CatalogSnapshot
+from database import Database
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GENERATED_DB = os.path.join(BASE_DIR, "generated", "vinylflow.db")
+FILTER_TEXT = 'love'
+
+
+def measure(load):
+    """(result, bytes still allocated, peak bytes) for one load"""
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, peak
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def dict_filter(records, text):
+    return [record for record in records
+            if record['stock'] > 0 and any(text in (record[column] or '').lower()
+                                           for column in ('artist', 'album', 'genre'))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=GENERATED_DB if os.path.exists(GENERATED_DB)
+                        else os.path.join(BASE_DIR, "vinylflow.db"))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy2(args.db, os.path.join(tmp, "vinylflow.db"))
+        db = Database(tmp)
+
+        records, dict_bytes, dict_peak = measure(db.get_all_records)
+        count = len(records)
+        from_dicts, from_dicts_bytes, from_dicts_peak = measure(
+            lambda: CatalogSnapshot.from_records(db.get_all_records()))
+        snapshot, snapshot_bytes, snapshot_peak = measure(db.get_catalog_snapshot)
+        assert len(snapshot) == len(from_dicts) == count
+
+        print(f"{count:,} live records from {args.db}")
+        print(f"{'representation':<20} {'bytes/record':>13} {'retained MB':>12} {'peak MB':>9}")
+        for label, retained, peak in (("dicts", dict_bytes, dict_peak),
+                                      ("snapshot (dicts)", from_dicts_bytes, from_dicts_peak),
+                                      ("snapshot (cursor)", snapshot_bytes, snapshot_peak)):
+            print(f"{label:<20} {retained / max(count, 1):>13.0f} {retained / 2 ** 20:>12.1f} "
+                  f"{peak / 2 ** 20:>9.1f}")
+
+        print(f"\n{'operation (median ms)':<26} {'dicts':>9} {'snapshot':>9}")
+        timings = [
+            ("sort by album",
+             lambda: sorted(records, key=lambda r: (r.get('album') or '').lower()),
+             lambda: snapshot.sorted_indices('album')),
+            ("sort by price",
+             lambda: sorted(records, key=lambda r: float(r.get('price') or 0.0)),
+             lambda: snapshot.sorted_indices('price')),
+            (f"filter '{FILTER_TEXT}', in stock",
+             lambda: dict_filter(records, FILTER_TEXT),
+             lambda: snapshot.filter_indices(text=FILTER_TEXT, in_stock=True)),
+        ]
+        for label, on_dicts, on_snapshot in timings:
+            print(f"{label:<26} {median_ms(on_dicts, args.repeat):>9.1f} "
+                  f"{median_ms(on_snapshot, args.repeat):>9.1f}")
+        assert len(dict_filter(records, FILTER_TEXT)) == len(snapshot.filter_indices(text=FILTER_TEXT,
+                                                                                      in_stock=True))
+
+
+if __name__ == '__main__':
+    main()
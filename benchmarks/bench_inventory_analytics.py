@@ -0,0 +1,78 @@
+"""
+Time InventoryAnalytics metrics on a synthetic catalog (1M records by default).
+
+Builds a CatalogSnapshot of random records and sales in memory (no
+database needed), loads it into InventoryAnalytics, then reports the median
+time of each metric and of applying a batch of changed records.
+
+Run (needs NumPy):
+    python benchmarks/bench_inventory_analytics.py [--records 1000000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_snapshot import CatalogSnapshot
+from inventory_analytics import InventoryAnalytics
+
+GENRES = ['Rock', 'Jazz', 'Pop', 'Hip Hop', 'Classical', 'Electronic', 'Metal', 'Folk', 'Soul', None]
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def synthetic_rows(count: int, rng: random.Random):
+    for record_id in range(1, count + 1):
+        yield (record_id, f"Artist {rng.randrange(count // 10 + 1)}", f"Album {record_id}", rng.choice(GENRES),
+               rng.choice((0, rng.randint(1950, 2025))), round(rng.uniform(5, 60), 2), rng.randint(0, 30),
+               record_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    snapshot = CatalogSnapshot.from_rows(synthetic_rows(args.records, rng))
+    units_sold = {rng.randint(1, args.records): rng.randint(1, 40) for _ in range(args.records // 3)}
+    analytics = InventoryAnalytics(snapshot, units_sold)
+    print(f"{args.records:,} records, {len(units_sold):,} with sales; built in "
+          f"{time.perf_counter() - start:.1f}s")
+
+    changes = [{'id': record_id, 'artist': 'Changed', 'album': f"Album {record_id}", 'genre': 'Rock',
+                'year': 1999, 'price': 9.99, 'stock': 3, 'row_version': args.records + n + 1,
+                'deleted_at': '2025-01-01 00:00:00' if n % 10 == 0 else None}
+               for n, record_id in enumerate(rng.sample(range(1, args.records + 1), 1000))]
+
+    print(f"{'metric':<34} {'median ms':>10}")
+    for label, func in (
+            ("valuation", analytics.valuation),
+            ("valuation_by_genre", analytics.valuation_by_genre),
+            ("valuation_by_decade", analytics.valuation_by_decade),
+            ("price_percentiles", analytics.price_percentiles),
+            ("stock_cover_days", analytics.stock_cover_days),
+            ("reorder_suggestions (50)", analytics.reorder_suggestions),
+            ("what_if (Rock +10%, demand x1.5)",
+             lambda: analytics.what_if(price_factor=1.1, demand_factor=1.5, genre='Rock')),
+            ("summary", analytics.summary)):
+        print(f"{label:<34} {median_ms(func, args.repeat):>10.1f}")
+    print(f"{'apply 1,000 changes (100 deletes)':<34} {median_ms(lambda: analytics._apply_changes(changes), 1):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Login latency for each password hashing cost setting.
+
+For every hasher/cost pair this reports the time to hash a new password,
+the time for a first login (full KDF verification), and the time for a
+repeat login that hits the session cache. A throwaway database in a temp
+directory is used, so vinylflow.db is never touched.
+
+Run:
+    python benchmarks/bench_password_hashing.py [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from password_hasher import AuthSessionCache, Pbkdf2Hasher, ScryptHasher
+
+SETTINGS = [
+    ("pbkdf2_sha256 100k", Pbkdf2Hasher(iterations=100_000)),
+    ("pbkdf2_sha256 260k", Pbkdf2Hasher(iterations=260_000)),
+    ("pbkdf2_sha256 600k", Pbkdf2Hasher(iterations=600_000)),
+    ("pbkdf2_sha256 1M", Pbkdf2Hasher(iterations=1_000_000)),
+    ("scrypt n=2^14", ScryptHasher(n=2 ** 14)),
+    ("scrypt n=2^15", ScryptHasher(n=2 ** 15)),
+    ("scrypt n=2^16", ScryptHasher(n=2 ** 16)),
+]
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'setting':<22} {'hash ms':>9} {'first login ms':>15} {'cached login ms':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (label, hasher) in enumerate(SETTINGS):
+            db = Database(tmp, hasher=hasher)
+            db.sessions = AuthSessionCache()
+            username = f"bench{i}"
+            db.register_customer({'username': username, 'password': 'correct horse'})
+
+            hash_ms = median_ms(lambda: hasher.hash('correct horse'), args.repeat)
+
+            def first_login():
+                db.sessions.invalidate()
+                assert db.authenticate_customer(username, 'correct horse')
+            first_ms = median_ms(first_login, args.repeat)
+
+            db.authenticate_customer(username, 'correct horse')
+            cached_ms = median_ms(lambda: db.authenticate_customer(username, 'correct horse'), args.repeat)
+            print(f"{label:<22} {hash_ms:>9.1f} {first_ms:>15.1f} {cached_ms:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Per-call cost of SQL built per call versus the fixed statements in sql_statements.
+
+First, through Database methods as the app calls them: a new connection per
+call (what Database._connect used to do) against Database's own per-thread
+connection reuse, which keeps sqlite3's statement cache between calls.
+
+Then the SQL alone, both variants on one long-lived connection opened with
+cached_statements=STATEMENT_CACHE_SIZE:
+
+    paged browse   LIMIT/OFFSET formatted into the text  vs  bound (records.list_live_page)
+    record update  SET clause in the caller's key order   vs  update_statement()
+    id lookup      IN (?, ?, ...) sized to the id list    vs  ID_LIST with one JSON array
+
+A text that differs from call to call misses sqlite3's statement cache and
+is compiled again. The database is copied to a temp directory, so the
+original is never modified.
+
+Run:
+    python benchmarks/bench_statements.py [--db generated/vinylflow.db] [--calls 2000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from sql_statements import ID_LIST, STATEMENT_CACHE_SIZE, id_list, statement, update_statement
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GENERATED_DB = os.path.join(BASE_DIR, "generated", "vinylflow.db")
+PAGE_SIZE = 20
+
+
+class PerCallDatabase(Database):
+    """Database as it was: a fresh connection, and so a cold statement cache, for every call"""
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+
+
+def per_call_us(func, calls):
+    start = time.perf_counter()
+    for n in range(calls):
+        func(n)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=GENERATED_DB if os.path.exists(GENERATED_DB)
+                        else os.path.join(BASE_DIR, "vinylflow.db"))
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy2(args.db, os.path.join(tmp, "vinylflow.db"))
+        db = Database(tmp)
+        db_path = db.db_path
+        conn = sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        ids = [row[0] for row in conn.execute('SELECT id FROM records WHERE deleted_at IS NULL')]
+        # The first pages, as the UI browses; deep OFFSETs are dominated by skipping rows
+        pages = min(max(len(ids) // PAGE_SIZE, 1), 50)
+        offsets = [rng.randrange(pages) * PAGE_SIZE for _ in range(args.calls)]
+        targets = [rng.choice(ids) for _ in range(args.calls)]
+        changes = [dict(rng.sample([('price', 19.99), ('stock', 3), ('genre', 'Rock')], rng.randint(1, 3)))
+                   for _ in range(args.calls)]
+        id_sets = [rng.sample(ids, rng.randint(1, 50)) for _ in range(args.calls)]
+
+        def browse_formatted(n):
+            conn.execute(f'SELECT * FROM records WHERE deleted_at IS NULL ORDER BY artist, album '
+                         f'LIMIT {PAGE_SIZE} OFFSET {offsets[n]}').fetchall()
+
+        def browse_bound(n):
+            conn.execute(statement('records.list_live_page'), (PAGE_SIZE, offsets[n])).fetchall()
+
+        def update_formatted(n):
+            updates = changes[n]
+            conn.execute(f"UPDATE records SET {', '.join(f'{k}=?' for k in updates)} WHERE id=?",
+                         list(updates.values()) + [targets[n]])
+
+        def update_registry(n):
+            sql, values = update_statement('records', changes[n])
+            conn.execute(sql, values + [targets[n]])
+
+        def lookup_expanded(n):
+            conn.execute(f"SELECT * FROM records WHERE id IN ({', '.join('?' for _ in id_sets[n])})",
+                         id_sets[n]).fetchall()
+
+        def lookup_json(n):
+            conn.execute(f'SELECT * FROM records WHERE id {ID_LIST}', (id_list(id_sets[n]),)).fetchall()
+
+        print(f"{len(ids):,} live records, {args.calls:,} calls per variant")
+        print(f"{'Database method':<16} {'new conn µs':>16} {'reused µs':>13}")
+        per_call = PerCallDatabase(tmp)
+        for label, call in (
+                ("paged browse", lambda d, n: d.get_all_records(limit=PAGE_SIZE, offset=offsets[n])),
+                ("record lookup", lambda d, n: d.get_record(targets[n])),
+                ("record update", lambda d, n: d.update_record(targets[n], changes[n]))):
+            print(f"{label:<16} {per_call_us(lambda n: call(per_call, n), args.calls):>16.1f} "
+                  f"{per_call_us(lambda n: call(db, n), args.calls):>13.1f}")
+
+        print(f"\n{'SQL, one conn':<16} {'per-call SQL µs':>16} {'fixed SQL µs':>13}")
+        conn.execute('BEGIN')
+        for label, built, fixed in (("paged browse", browse_formatted, browse_bound),
+                                    ("record update", update_formatted, update_registry),
+                                    ("id lookup", lookup_expanded, lookup_json)):
+            print(f"{label:<16} {per_call_us(built, args.calls):>16.1f} {per_call_us(fixed, args.calls):>13.1f}")
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Time to switch theme on the full owner interface.
+
+Builds RecordStoreApp as the owner with every lazy tab opened, so all of
+its widgets exist, then cycles dark -> light -> vinyl with apply_theme (the
+theme button's path). Each switch is timed up to update_idletasks, so Tk's
+redraw is included. Reported per theme:
+
+    registry ms   THEME_REGISTRY.switch: the batched widget reconfigure
+    total ms      registry + ttk restyle + Treeview tags + redraw
+    widgets/opts  how many widgets and options actually changed colour
+
+For comparison, it also times rebuilding the interface, which was the only
+way to recolour widgets that already existed. The database is copied to a
+temp directory and the saved theme is left as it was.
+
+Needs a display (Tk window). Run:
+    python benchmarks/bench_theme_switch.py [--db generated/vinylflow.db] [--rounds 10]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from record_store import RecordStoreApp
+from theme_registry import THEME_ORDER, THEME_REGISTRY, next_theme
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GENERATED_DB = os.path.join(BASE_DIR, "generated", "vinylflow.db")
+OWNER = {'username': 'owner', 'role': 'owner', 'id': 0}
+
+
+def build(root, db):
+    """The owner interface with every tab built and the records loaded"""
+    for widget in root.winfo_children():
+        widget.destroy()
+    app = RecordStoreApp(root, is_owner=True, user=OWNER, db=db)
+    app.load_data()
+    for key in app.lazy_tabs:
+        app.show_lazy_tab(key)
+    root.update()
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=GENERATED_DB if os.path.exists(GENERATED_DB)
+                        else os.path.join(BASE_DIR, "vinylflow.db"))
+    parser.add_argument('--rounds', type=int, default=10, help="full dark/light/vinyl cycles")
+    parser.add_argument('--rebuilds', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy2(args.db, os.path.join(tmp, "vinylflow.db"))
+        db = Database(tmp)
+        root = tk.Tk()
+        root.geometry("1400x900")
+
+        start = time.perf_counter()
+        app = build(root, db)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        results = {theme: [] for theme in THEME_ORDER}
+        # One cycle first so every theme is timed switching from the one before it
+        for _ in range((args.rounds + 1) * len(THEME_ORDER)):
+            stats = app.apply_theme(next_theme(app.theme))
+            results[stats['theme']].append(stats)
+        print(f"owner interface: {THEME_REGISTRY.tracked():,} widgets with palette colours, "
+              f"built in {build_ms:.0f} ms")
+        print(f"{'to theme':<8} {'registry ms':>12} {'total ms':>9} {'widgets':>8} {'options':>8}")
+        for theme, runs in results.items():
+            runs = runs[1:]
+            print(f"{theme:<8} {statistics.median(r['ms'] for r in runs):>12.1f} "
+                  f"{statistics.median(r['total_ms'] for r in runs):>9.1f} "
+                  f"{runs[-1]['widgets']:>8,} {runs[-1]['options']:>8,}")
+
+        rebuilds = []
+        for _ in range(args.rebuilds):
+            start = time.perf_counter()
+            build(root, db)
+            rebuilds.append((time.perf_counter() - start) * 1000)
+        print(f"rebuild  {statistics.median(rebuilds):>22.1f}   (destroy and build again, median)")
+        THEME_REGISTRY.uninstall()
+        root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+CPU cost of the login screen's vinyl animation.
+
+Compares the old approach (delete every canvas item and redraw ~18 of them
+with fresh trigonometry each frame) against AuthWindow's current one
+(persistent items moved with canvas.coords from precomputed frames).
+Each frame is flushed with update_idletasks so Tk's redraw is included.
+
+Needs a display (Tk window). Run:
+    python benchmarks/bench_vinyl_animation.py [--frames 2000]
+or, on a machine without one, under a virtual X server:
+    xvfb-run -a python benchmarks/bench_vinyl_animation.py [--frames 2000]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+import tkinter as tk
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth_window import AuthWindow
+from config import COLORS
+
+
+def legacy_frame(canvas, angle):
+    """One frame of the original animate_vinyl"""
+    canvas.delete("all")
+    center_x, center_y = 100, 100
+    radius = 80
+    rad_angle = math.radians(angle)
+    canvas.create_oval(center_x - radius, center_y - radius,
+                       center_x + radius, center_y + radius,
+                       fill='#222222', outline='#444444', width=2)
+    for i in range(10, 80, 5):
+        offset = math.sin(rad_angle + i/20) * 2
+        canvas.create_oval(center_x - i + offset, center_y - i,
+                           center_x + i + offset, center_y + i,
+                           outline='#333333', width=1)
+    label_radius = 30
+    canvas.create_oval(center_x - label_radius, center_y - label_radius,
+                       center_x + label_radius, center_y + label_radius,
+                       fill='#1e293b', outline='#475569', width=2)
+    canvas.create_text(center_x, center_y, text="VF",
+                       font=('Inter', 10, 'bold'), fill=COLORS['primary'])
+    canvas.create_oval(center_x - 5, center_y - 5,
+                       center_x + 5, center_y + 5,
+                       fill='#ffffff', outline='#cbd5e1')
+
+
+def run_legacy(canvas, frames):
+    start = time.process_time()
+    for n in range(frames):
+        legacy_frame(canvas, (n * 5) % 360)
+        canvas.update_idletasks()
+    return time.process_time() - start
+
+
+def run_current(canvas, frames):
+    canvas.delete("all")
+    grooves = [canvas.create_oval(0, 0, 0, 0, outline='#333333', width=1)
+               for _ in AuthWindow.VINYL_GROOVE_RADII]
+    precomputed = AuthWindow.vinyl_frames()
+    start = time.process_time()
+    for n in range(frames):
+        for item, coords in zip(grooves, precomputed[n % len(precomputed)]):
+            canvas.coords(item, *coords)
+        canvas.update_idletasks()
+    return time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=2000)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f"No display ({e}); run under a virtual X server: xvfb-run -a python {sys.argv[0]}")
+    canvas = tk.Canvas(root, width=200, height=200, bg=COLORS['bg'], highlightthickness=0)
+    canvas.pack()
+    root.update()
+
+    legacy = run_legacy(canvas, args.frames)
+    current = run_current(canvas, args.frames)
+    root.destroy()
+
+    # At 20 frames per second, CPU seconds per frame * 20 = share of one core
+    fps = 1000 / AuthWindow.VINYL_FRAME_MS
+    for name, cpu in (("legacy (delete + redraw)", legacy), ("current (coords)", current)):
+        per_frame = cpu / args.frames
+        print(f"{name:<26} {per_frame * 1000:8.3f} ms CPU/frame  ~{per_frame * fps * 100:5.2f}% of a core")
+    print(f"speed-up: {legacy / current:.1f}x" if current else "speed-up: n/a")
+    print("Paused (hidden/unfocused) cost: one focus/visibility check every "
+          f"{AuthWindow.VINYL_PAUSED_CHECK_MS} ms, no redraws")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Load test for the HTTP/JSON API server.
+
+Starts api_server.py on a free localhost port against a copy of
+vinylflow.db (or uses --url for a server that is already running), then
+spawns N client processes. Each client holds one keep-alive connection and
+runs a weighted mix for a fixed time:
+
+    browse    GET /records page, revalidated with If-None-Match
+    search    GET /records/search
+    cart      POST /carts/{holder}/items -> POST /carts/{holder}/checkout
+    edit      PATCH /records/{id} (price tweak, audited)
+    booking   POST /bookings
+    stats     GET /stats
+
+Output matches load_test_db.py (503 busy responses count as "locked",
+400s as "rejected"), plus how many catalog reads were answered 304.
+
+Run:
+    python benchmarks/load_test_api.py [--clients 8] [--workers 8] [--duration 10]
+        [--mix browse=40,search=20,cart=15,edit=10,booking=5,stats=10]
+        [--url http://127.0.0.1:8765] [--out after.json] [--compare before.json]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote, urlsplit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import OWNER_PASSWORD, OWNER_USERNAME
+from load_test_db import DEFAULT_MIX, SEARCH_TERMS, prepare_database, print_summary, summarise
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE_SIZE = 100
+
+
+class Client:
+    """One keep-alive connection; remembers ETags so repeat catalog reads revalidate"""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        self.etags = {}
+        self.not_modified = 0
+        self.token = None
+        # The owner may edit records, see statistics and book or check out for anyone
+        self.token = self.request('POST', "/rpc/authenticate_owner",
+                                  {'args': [OWNER_USERNAME, OWNER_PASSWORD]})['session_token']
+
+    def request(self, method: str, path: str, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        if method == 'GET' and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        self.conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = self.conn.getresponse()
+        data = response.read()
+        if response.status == 304:
+            self.not_modified += 1
+            return None
+        if response.getheader('ETag'):
+            self.etags[path] = response.getheader('ETag')
+        if response.status >= 400:
+            raise ApiFailure(response.status, data.decode(errors='replace'))
+        return json.loads(data)
+
+
+class ApiFailure(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+# ---------- Operations ----------
+def op_browse(client, rng, ids, worker):
+    # A small set of pages, as tills mostly look at the same first screens
+    client.request('GET', f"/records?limit={PAGE_SIZE}&offset={rng.randrange(10) * PAGE_SIZE}")
+
+
+def op_search(client, rng, ids, worker):
+    client.request('GET', f"/records/search?q={quote(rng.choice(SEARCH_TERMS))}")
+
+
+def op_cart(client, rng, ids, worker):
+    holder = f"api-load-{worker}-{rng.getrandbits(32):08x}"
+    items = []
+    for record_id in rng.sample(ids['records'], min(len(ids['records']), rng.randint(1, 3))):
+        client.request('POST', f"/carts/{holder}/items", {'record_id': record_id, 'quantity': 1})
+        items.append({'record_id': record_id, 'quantity': 1})
+    customer_id = rng.choice(ids['customers']) if ids['customers'] else None
+    client.request('POST', f"/carts/{holder}/checkout",
+                   {'customer_id': customer_id, 'items': items, 'shipping_address': "Load test"})
+
+
+def op_edit(client, rng, ids, worker):
+    client.request('PATCH', f"/records/{rng.choice(ids['records'])}",
+                   {'updates': {'price': round(rng.uniform(5, 60), 2)}})
+
+
+def op_booking(client, rng, ids, worker):
+    if not ids['artists']:
+        return
+    when = datetime.now() + timedelta(days=rng.randint(1, 365), hours=rng.randint(0, 23))
+    client.request('POST', "/bookings", {'artist_id': rng.choice(ids['artists']),
+                                         'performance_date': when.isoformat(sep=' ', timespec='seconds'),
+                                         'notes': "Load test"})
+
+
+def op_stats(client, rng, ids, worker):
+    client.request('GET', "/stats")
+
+
+OPERATIONS = {
+    'browse': op_browse,
+    'search': op_search,
+    'cart': op_cart,
+    'edit': op_edit,
+    'booking': op_booking,
+    'stats': op_stats,
+}
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def run_client(task):
+    worker, url, mix, ids, start_at, duration, seed = task
+    rng = random.Random(seed + worker)
+    client = Client(url)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = {name: {'latencies_ms': [], 'ok': 0, 'locked': 0, 'rejected': 0, 'errors': 0}
+               for name in names}
+
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = start_at + duration
+    while time.time() < deadline:
+        name = rng.choices(names, weights)[0]
+        result = results[name]
+        start = time.perf_counter()
+        try:
+            OPERATIONS[name](client, rng, ids, worker)
+            result['ok'] += 1
+        except ApiFailure as e:
+            if e.status == 503:
+                result['locked'] += 1
+            elif e.status == 400:
+                result['rejected'] += 1
+            else:
+                result['errors'] += 1
+        except (OSError, http.client.HTTPException):
+            result['errors'] += 1
+            client = Client(url)
+        result['latencies_ms'].append((time.perf_counter() - start) * 1000)
+    return results, client.not_modified
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(work_dir: str, workers: int) -> tuple:
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "api_server.py"),
+                               '--db-dir', work_dir, '--port', str(port), '--workers', str(workers)])
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return server, url
+        except OSError:
+            if server.poll() is not None:
+                raise SystemExit("api_server.py exited during startup")
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("api_server.py did not start listening in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the HTTP/JSON API server")
+    parser.add_argument('--clients', type=int, default=8, help="client processes (tills / shop sessions)")
+    parser.add_argument('--workers', type=int, default=8, help="server database threads")
+    parser.add_argument('--duration', type=float, default=10, help="seconds to run")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="operation weights, name=weight,...")
+    parser.add_argument('--db', default=os.path.join(BASE_DIR, "vinylflow.db"),
+                        help="database to copy and serve (never modified)")
+    parser.add_argument('--url', help="test an already running server instead of starting one")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help="save results as JSON")
+    parser.add_argument('--compare', help="JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    with tempfile.TemporaryDirectory(prefix="vinylflow_api_load_") as work_dir:
+        ids = prepare_database(args.db, work_dir)
+        server, url = (None, args.url) if args.url else start_server(work_dir, args.workers)
+        try:
+            start_at = time.time() + 1.0
+            tasks = [(n, url, mix, ids, start_at, args.duration, args.seed) for n in range(args.clients)]
+            print(f"{args.clients} clients x {args.duration:g}s against {url}")
+            with multiprocessing.Pool(args.clients) as pool:
+                outcomes = pool.map(run_client, tasks)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    summary = summarise([results for results, _ in outcomes], args.duration)
+    not_modified = sum(count for _, count in outcomes)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['operations']
+    print_summary(summary, baseline)
+    print(f"catalog reads answered 304 Not Modified: {not_modified}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({
+                'run_at': datetime.now().isoformat(timespec='seconds'),
+                'clients': args.clients,
+                'server_workers': args.workers,
+                'duration_s': args.duration,
+                'mix': mix,
+                'seed': args.seed,
+                'not_modified': not_modified,
+                'sqlite_version': sqlite3.sqlite_version,
+                'python': platform.python_version(),
+                'operations': summary,
+            }, f, indent=2)
+        print(f"Saved results to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Multi-process load test for the Database layer.
+
+Spawns N worker processes that each open their own Database on a shared
+copy of vinylflow.db and run a weighted mix of till and back-office work
+for a fixed time:
+
+    browse    get_all_records page
+    search    search_records for a random term
+    cart      reserve_stock -> checkout_reservations (the add-to-cart/checkout path)
+    edit      owner update_record (price tweak, audited)
+    booking   create_booking for a random artist
+    stats     get_statistics
+
+Per operation it reports throughput, p50/p95/p99 latency and how often the
+call failed with "database is locked"/busy. Results can be saved as JSON and
+compared against an earlier run.
+
+Run:
+    python benchmarks/load_test_db.py [--workers 8] [--duration 20]
+        [--mix browse=40,search=20,cart=15,edit=10,booking=5,stats=10]
+        [--db some.db] [--out after.json] [--compare before.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+DEFAULT_MIX = "browse=40,search=20,cart=15,edit=10,booking=5,stats=10"
+SEARCH_TERMS = ["rock", "jazz", "the", "blue", "live", "love", "a", "soul", "night", "zz"]
+# Stock added to every record so cart checkouts are not limited by the demo data
+STOCK_TOP_UP = 100_000
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def prepare_database(source: str, work_dir: str) -> dict:
+    """Copy the database into work_dir and collect the ids the workers pick from"""
+    shutil.copy2(source, os.path.join(work_dir, "vinylflow.db"))
+    db = Database(work_dir)
+    conn = sqlite3.connect(db.db_path)
+    conn.execute('UPDATE records SET stock = stock + ? WHERE deleted_at IS NULL', (STOCK_TOP_UP,))
+    conn.execute('DELETE FROM reservations')
+    conn.commit()
+    ids = {
+        'records': [r[0] for r in conn.execute('SELECT id FROM records WHERE deleted_at IS NULL')],
+        'customers': [r[0] for r in conn.execute('SELECT id FROM customers')],
+        'artists': [r[0] for r in conn.execute('SELECT id FROM artists')],
+    }
+    conn.close()
+    if not ids['records']:
+        raise SystemExit("The database has no records to load-test against")
+    return ids
+
+
+# ---------- Operations ----------
+def op_browse(db, rng, ids, worker):
+    db.get_all_records(limit=100, offset=rng.randrange(max(len(ids['records']) - 100, 1)))
+
+
+def op_search(db, rng, ids, worker):
+    db.search_records(rng.choice(SEARCH_TERMS))
+
+
+def op_cart(db, rng, ids, worker):
+    holder = f"load-{worker}-{rng.getrandbits(32):08x}"
+    items = []
+    for record_id in rng.sample(ids['records'], min(len(ids['records']), rng.randint(1, 3))):
+        db.reserve_stock(holder, record_id, 1)
+        items.append({'record_id': record_id, 'quantity': 1})
+    customer_id = rng.choice(ids['customers']) if ids['customers'] else None
+    db.checkout_reservations(holder, customer_id, items, "Load test")
+
+
+def op_edit(db, rng, ids, worker):
+    db.update_record(rng.choice(ids['records']), {'price': round(rng.uniform(5, 60), 2)}, user_id=1)
+
+
+def op_booking(db, rng, ids, worker):
+    if not ids['artists']:
+        return
+    when = datetime.now() + timedelta(days=rng.randint(1, 365), hours=rng.randint(0, 23))
+    db.create_booking(rng.choice(ids['artists']), when, 60, "Load test")
+
+
+def op_stats(db, rng, ids, worker):
+    db.get_statistics()
+
+
+OPERATIONS = {
+    'browse': op_browse,
+    'search': op_search,
+    'cart': op_cart,
+    'edit': op_edit,
+    'booking': op_booking,
+    'stats': op_stats,
+}
+
+
+def is_lock_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def run_worker(task):
+    """Run the mix until the deadline; returns latencies and outcome counts per operation"""
+    worker, work_dir, mix, ids, start_at, duration, seed = task
+    rng = random.Random(seed + worker)
+    db = Database(work_dir)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = {name: {'latencies_ms': [], 'ok': 0, 'locked': 0, 'rejected': 0, 'errors': 0}
+               for name in names}
+
+    # All workers start together so the whole duration is contended
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = start_at + duration
+    while time.time() < deadline:
+        name = rng.choices(names, weights)[0]
+        result = results[name]
+        start = time.perf_counter()
+        try:
+            OPERATIONS[name](db, rng, ids, worker)
+            result['ok'] += 1
+        except sqlite3.OperationalError as e:
+            if is_lock_error(e):
+                result['locked'] += 1
+            else:
+                result['errors'] += 1
+        except ValueError:
+            # Business-rule refusal such as insufficient stock
+            result['rejected'] += 1
+        except Exception:
+            result['errors'] += 1
+        result['latencies_ms'].append((time.perf_counter() - start) * 1000)
+    return results
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarise(worker_results, duration: float) -> dict:
+    merged = {}
+    for results in worker_results:
+        for name, result in results.items():
+            entry = merged.setdefault(name, {'latencies_ms': [], 'ok': 0, 'locked': 0, 'rejected': 0, 'errors': 0})
+            entry['latencies_ms'].extend(result['latencies_ms'])
+            for key in ('ok', 'locked', 'rejected', 'errors'):
+                entry[key] += result[key]
+
+    summary = {}
+    for name, entry in sorted(merged.items()):
+        latencies = sorted(entry['latencies_ms'])
+        calls = len(latencies)
+        summary[name] = {
+            'calls': calls,
+            'ok': entry['ok'],
+            'locked': entry['locked'],
+            'rejected': entry['rejected'],
+            'errors': entry['errors'],
+            'throughput_per_s': entry['ok'] / duration,
+            'lock_error_rate': entry['locked'] / calls if calls else 0.0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+        }
+    return summary
+
+
+def print_summary(summary: dict, baseline: dict = None):
+    print(f"{'operation':<10} {'calls':>7} {'ok/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'locked':>7} {'lock %':>7} {'rejected':>8} {'errors':>6}")
+    for name, s in summary.items():
+        print(f"{name:<10} {s['calls']:>7} {s['throughput_per_s']:>8.1f} {s['p50_ms']:>8.2f} "
+              f"{s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['locked']:>7} "
+              f"{s['lock_error_rate'] * 100:>6.2f}% {s['rejected']:>8} {s['errors']:>6}")
+    total_ok = sum(s['ok'] for s in summary.values())
+    total_calls = sum(s['calls'] for s in summary.values())
+    total_locked = sum(s['locked'] for s in summary.values())
+    print(f"total: {total_calls} calls, {total_locked} locked "
+          f"({total_locked / total_calls * 100 if total_calls else 0:.2f}%), "
+          f"{sum(s['throughput_per_s'] for s in summary.values()):.1f} ok/s ({total_ok} ok)")
+
+    if baseline:
+        print("\nChange vs baseline (throughput, p95):")
+        for name, s in summary.items():
+            before = baseline.get(name)
+            if not before:
+                continue
+            tp = (s['throughput_per_s'] / before['throughput_per_s'] - 1) * 100 if before['throughput_per_s'] else 0
+            p95 = (s['p95_ms'] / before['p95_ms'] - 1) * 100 if before['p95_ms'] else 0
+            print(f"  {name:<10} throughput {tp:+7.1f}%   p95 {p95:+7.1f}%   "
+                  f"lock rate {before['lock_error_rate'] * 100:.2f}% -> {s['lock_error_rate'] * 100:.2f}%")
+
+
+def main():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Multi-process load test for the Database layer")
+    parser.add_argument('--workers', type=int, default=4, help="worker processes (tills)")
+    parser.add_argument('--duration', type=float, default=10, help="seconds to run")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="operation weights, name=weight,...")
+    parser.add_argument('--db', default=os.path.join(base_dir, "vinylflow.db"),
+                        help="database to copy and test against (never modified)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help="save results as JSON")
+    parser.add_argument('--compare', help="JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    with tempfile.TemporaryDirectory(prefix="vinylflow_load_") as work_dir:
+        ids = prepare_database(args.db, work_dir)
+        start_at = time.time() + 1.0
+        tasks = [(n, work_dir, mix, ids, start_at, args.duration, args.seed) for n in range(args.workers)]
+        print(f"{args.workers} workers x {args.duration:g}s against a copy of {args.db}")
+        with multiprocessing.Pool(args.workers) as pool:
+            worker_results = pool.map(run_worker, tasks)
+
+    summary = summarise(worker_results, args.duration)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['operations']
+    print_summary(summary, baseline)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({
+                'run_at': datetime.now().isoformat(timespec='seconds'),
+                'workers': args.workers,
+                'duration_s': args.duration,
+                'mix': mix,
+                'seed': args.seed,
+                'sqlite_version': sqlite3.sqlite_version,
+                'python': platform.python_version(),
+                'operations': summary,
+            }, f, indent=2)
+        print(f"Saved results to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
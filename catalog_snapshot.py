@@ -0,0 +1,210 @@
+"""
+Compact in-memory copy of the live catalog.
+
+get_all_records() returns one dict per record, which costs several hundred
+bytes per row. CatalogSnapshot keeps the same data column by column:
+
+  * id, year, price, stock and row_version in typed arrays (4-8 bytes a value),
+  * artist and genre as interned strings (each distinct name stored once),
+  * album as a plain list of strings.
+
+Rows are kept in id order, so a record is found by bisecting the id array
+and no per-row index is needed. snapshot[i] returns a RecordView, a two-slot
+object that reads the columns on access and supports record['artist'] /
+record.get('artist') like the dicts it replaces.
+
+Sorting and filtering work over whole columns: sort keys are taken from the
+column with sorted(key=column.__getitem__), and filters combine per-column
+masks built with map() and operator functions. Both loops run in C rather
+than calling a Python function per row.
+
+apply_changes() merges rows from Database.get_records_changed_since(), so a
+snapshot can be kept current without a full reload.
+
+Memory per record compared with dicts: python benchmarks/bench_catalog_memory.py
+"""
+import operator
+import sys
+from array import array
+from bisect import bisect_left
+from functools import reduce
+from itertools import compress, repeat
+from typing import Dict, Iterable, List, Optional
+
+# Row order for from_rows(); Database.get_catalog_snapshot selects these
+SNAPSHOT_COLUMNS = ('id', 'artist', 'album', 'genre', 'year', 'price', 'stock', 'row_version')
+STRING_COLUMNS = ('artist', 'album', 'genre')
+
+
+class RecordView:
+    """One snapshot row; reads its values from the snapshot's columns"""
+    __slots__ = ('snapshot', 'index')
+
+    def __init__(self, snapshot: 'CatalogSnapshot', index: int):
+        self.snapshot = snapshot
+        self.index = index
+
+    def __getitem__(self, key: str):
+        return self.snapshot.value(key, self.index)
+
+    def get(self, key: str, default=None):
+        try:
+            return self.snapshot.value(key, self.index)
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict:
+        return {column: self.snapshot.value(column, self.index) for column in SNAPSHOT_COLUMNS}
+
+    def __repr__(self):
+        return f"RecordView({self.to_dict()!r})"
+
+
+class CatalogSnapshot:
+    __slots__ = ('ids', 'artists', 'albums', 'genres', 'years', 'prices', 'stocks', 'versions',
+                 'version', '_columns', '_sort_keys')
+
+    def __init__(self, version: int = 0):
+        self.ids = array('q')
+        self.artists: List[str] = []
+        self.albums: List[str] = []
+        self.genres: List[Optional[str]] = []
+        # 0 for an unknown year
+        self.years = array('i')
+        self.prices = array('d')
+        self.stocks = array('i')
+        self.versions = array('q')
+        # Highest records row_version this snapshot reflects (pass it to get_records_changed_since)
+        self.version = version
+        self._columns = {'id': self.ids, 'artist': self.artists, 'album': self.albums, 'genre': self.genres,
+                         'year': self.years, 'price': self.prices, 'stock': self.stocks,
+                         'row_version': self.versions}
+        # Lower-cased string columns for sorting and text filters, built on first use
+        self._sort_keys: Dict[str, List[str]] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple], version: int = None) -> 'CatalogSnapshot':
+        """Build from tuples in SNAPSHOT_COLUMNS order, sorted by id.
+
+        `version` defaults to the highest row_version among the rows.
+        """
+        snapshot = cls()
+        for row in rows:
+            snapshot._insert(len(snapshot.ids), row)
+        snapshot.version = max(snapshot.versions, default=0) if version is None else version
+        return snapshot
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], version: int = None) -> 'CatalogSnapshot':
+        """Build from record dicts (e.g. get_all_records()), skipping soft-deleted ones"""
+        live = sorted((record for record in records if not record.get('deleted_at')),
+                      key=operator.itemgetter('id'))
+        return cls.from_rows((tuple(record.get(column) for column in SNAPSHOT_COLUMNS) for record in live),
+                             version)
+
+    # ---------- Row access ----------
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> RecordView:
+        if not -len(self.ids) <= index < len(self.ids):
+            raise IndexError("snapshot index out of range")
+        return RecordView(self, index % len(self.ids))
+
+    def __iter__(self):
+        return (RecordView(self, index) for index in range(len(self.ids)))
+
+    def value(self, column: str, index: int):
+        value = self._columns[column][index]
+        if column == 'year' and value == 0:
+            return None
+        return value
+
+    def position(self, record_id: int) -> Optional[int]:
+        index = bisect_left(self.ids, record_id)
+        if index < len(self.ids) and self.ids[index] == record_id:
+            return index
+        return None
+
+    def get(self, record_id: int) -> Optional[RecordView]:
+        index = self.position(record_id)
+        return None if index is None else RecordView(self, index)
+
+    def rows(self, indices: Iterable[int]) -> List[RecordView]:
+        return [RecordView(self, index) for index in indices]
+
+    # ---------- Sorting and filtering ----------
+    def _sort_key_column(self, column: str):
+        if column not in STRING_COLUMNS:
+            return self._columns[column]
+        keys = self._sort_keys.get(column)
+        if keys is None:
+            keys = self._sort_keys[column] = [(value or '').lower() for value in self._columns[column]]
+        return keys
+
+    def sorted_indices(self, column: str, reverse: bool = False) -> List[int]:
+        """Row positions ordered by one column (strings case-insensitively, unknown years as 0)"""
+        return sorted(range(len(self.ids)), key=self._sort_key_column(column).__getitem__, reverse=reverse)
+
+    def filter_indices(self, text: str = None, genre: str = None, in_stock: bool = False,
+                       max_price: float = None) -> List[int]:
+        """Row positions matching every given condition, in id order.
+
+        `text` is a case-insensitive substring of artist, album or genre.
+        """
+        masks = []
+        if text:
+            needle = repeat(text.lower())
+            found = [map(operator.contains, self._sort_key_column(column), needle) for column in STRING_COLUMNS]
+            masks.append(map(any, zip(*found)))
+        if genre is not None:
+            masks.append(map(operator.eq, self.genres, repeat(genre)))
+        if in_stock:
+            masks.append(map(operator.gt, self.stocks, repeat(0)))
+        if max_price is not None:
+            masks.append(map(operator.le, self.prices, repeat(max_price)))
+        if not masks:
+            return list(range(len(self.ids)))
+        return list(compress(range(len(self.ids)), reduce(lambda a, b: map(operator.and_, a, b), masks)))
+
+    # ---------- Changes ----------
+    def apply_changes(self, records: Iterable[Dict]):
+        """Merge changed records (get_records_changed_since rows): soft-deleted ones are dropped"""
+        for record in records:
+            index = bisect_left(self.ids, record['id'])
+            present = index < len(self.ids) and self.ids[index] == record['id']
+            row = tuple(record.get(column) for column in SNAPSHOT_COLUMNS)
+            if record.get('deleted_at'):
+                if present:
+                    self._remove(index)
+            elif present:
+                self._set(index, row)
+            else:
+                self._insert(index, row)
+            self.version = max(self.version, record.get('row_version') or 0)
+        self._sort_keys.clear()
+
+    def _insert(self, index: int, row: tuple):
+        record_id, artist, album, genre, year, price, stock, row_version = row
+        self.ids.insert(index, record_id)
+        self.artists.insert(index, sys.intern(artist))
+        self.albums.insert(index, album)
+        self.genres.insert(index, sys.intern(genre) if genre else genre)
+        self.years.insert(index, year or 0)
+        self.prices.insert(index, price)
+        self.stocks.insert(index, stock or 0)
+        self.versions.insert(index, row_version or 0)
+
+    def _set(self, index: int, row: tuple):
+        _, artist, album, genre, year, price, stock, row_version = row
+        self.artists[index] = sys.intern(artist)
+        self.albums[index] = album
+        self.genres[index] = sys.intern(genre) if genre else genre
+        self.years[index] = year or 0
+        self.prices[index] = price
+        self.stocks[index] = stock or 0
+        self.versions[index] = row_version or 0
+
+    def _remove(self, index: int):
+        for column in self._columns.values():
+            del column[index]
@@ -109,8 +109,25 @@ LIGHT_COLORS = {
     'gradient_end': '#ec4899',
 }
 
+THEMES = {'dark': DARK_COLORS, 'light': LIGHT_COLORS, 'vinyl': VINYL_COLORS}
+
+
+class PaletteColor(str):
+    """A palette colour that remembers its key, so theme_registry can tell which widgets use it"""
+
+    def __new__(cls, value: str, key: str):
+        color = super().__new__(cls, value)
+        color.key = key
+        return color
+
+
+def palette(theme):
+    """A theme's colours as PaletteColor values"""
+    return {key: PaletteColor(value, key) for key, value in THEMES[theme].items()}
+
+
 # Default to dark mode for modern look
-COLORS = DARK_COLORS.copy()
+COLORS = palette('dark')
 
 
 FONTS = {
@@ -163,10 +180,5 @@ RADIUS = {
 
 
 def set_theme(theme):
-    global COLORS
-    if theme == 'dark':
-        COLORS.update(DARK_COLORS)
-    elif theme == 'light':
-        COLORS.update(LIGHT_COLORS)
-    else:
-        COLORS.update(VINYL_COLORS)
\ No newline at end of file
+    """Load a theme into COLORS (widgets already built keep their colours; see theme_registry)"""
+    COLORS.update(palette(theme if theme in THEMES else 'vinyl'))
@@ -1,20 +1,190 @@
+import hmac
+import json
 import os
 from datetime import datetime
-import csv
 import sqlite3
+import threading
+import time
+import weakref
 from typing import List, Dict, Any, Optional
-import hashlib
-import shutil
+from backup_engine import BackupEngine
+from catalog_snapshot import SNAPSHOT_COLUMNS, CatalogSnapshot
+from incremental_backup import IncrementalBackup, drop_change_log_triggers, install_change_log
+from password_hasher import PasswordHasher, AUTH_SESSIONS, default_hasher
+from query_stats import QUERY_STATS
+from sql_statements import ID_LIST, RECORD_COLUMNS, STATEMENT_CACHE_SIZE, id_list, statement, update_statement
+
+# The store owner's login (override both through the environment on a shared install)
+OWNER_USERNAME = os.environ.get('VINYLFLOW_OWNER_USERNAME', 'FP')
+OWNER_PASSWORD = os.environ.get('VINYLFLOW_OWNER_PASSWORD', '1539')
+OWNER_USER = {'username': 'owner', 'role': 'owner', 'id': 0}
+
+# How long a cart hold lasts without activity before its stock is released
+RESERVATION_TTL_SECONDS = 15 * 60
+
+# Soft-deleted records move to records_archive this long after deletion; the reservation
+# sweeper runs archive_deleted_records() and trim_change_log() every ARCHIVE_INTERVAL_SECONDS
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_INTERVAL_SECONDS = 60 * 60
+ARCHIVE_BATCH_SIZE = 500
+
+# Catalog queries all filter deleted_at IS NULL, so their indexes leave deleted rows out;
+# the listing of deleted records (newest first, by deleted_at then id) gets the complementary ones
+RECORD_INDEXES = {
+    # Serves WHERE deleted_at IS NULL ORDER BY artist, album (and artist lookups) without a sort
+    'idx_records_live_order': 'CREATE INDEX idx_records_live_order ON records(artist, album) '
+                              'WHERE deleted_at IS NULL',
+    'idx_records_genre': 'CREATE INDEX idx_records_genre ON records(genre) WHERE deleted_at IS NULL',
+    'idx_records_price': 'CREATE INDEX idx_records_price ON records(price) WHERE deleted_at IS NULL',
+    'idx_records_deleted': 'CREATE INDEX idx_records_deleted ON records(deleted_at DESC, id DESC) '
+                           'WHERE deleted_at IS NOT NULL',
+    'idx_records_archive_deleted': 'CREATE INDEX idx_records_archive_deleted ON records_archive(deleted_at DESC, id DESC)',
+}
+
+# bulk_update_records operations: SET clause (one ? for the value) and audit action
+BULK_RECORD_OPERATIONS = {
+    'price_percent': ('price = ROUND(price * (1 + ? / 100.0), 2)', 'UPDATE'),
+    'set_stock': ('stock = ?', 'UPDATE'),
+    'adjust_stock': ('stock = MAX(stock + ?, 0)', 'UPDATE'),
+    'set_genre': ('genre = ?', 'UPDATE'),
+    'delete': ('deleted_at = CURRENT_TIMESTAMP, deleted_by = ?', 'SOFT_DELETE'),
+}
+
+# Columns of each export_to_csv data type, in file order
+EXPORT_FIELDS = {
+    'records': ['id', 'artist', 'album', 'genre', 'year', 'price', 'stock', 'date_added'],
+    'customers': ['id', 'username', 'email', 'full_name', 'address', 'phone', 'registration_date',
+                  'is_active', 'role'],
+    'sales': ['id', 'customer_id', 'sale_date', 'total_amount', 'status', 'shipping_address',
+              'username', 'email'],
+}
+
+
+def write_csv_export(filename: str, data_type: str, rows: List[Dict]):
+    import csv  # only needed here; kept out of the startup import path
+    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=EXPORT_FIELDS[data_type])
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+def read_csv_import(filename: str, data_type: str) -> List[Dict]:
+    """Records or customers from an import CSV, skipping rows that do not parse"""
+    import csv
+    items = []
+    with open(filename, 'r', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            try:
+                if data_type == 'records':
+                    items.append({
+                        'artist': row['artist'].strip(),
+                        'album': row['album'].strip(),
+                        'genre': row.get('genre', '').strip(),
+                        'year': int(row.get('year', 0)),
+                        'price': float(row['price']),
+                        'stock': int(row.get('stock', 0))
+                    })
+                elif data_type == 'customers':
+                    items.append({
+                        'username': row['username'].strip(),
+                        'password': row.get('password', 'default123'),
+                        'email': row.get('email', ''),
+                        'full_name': row.get('full_name', ''),
+                        'address': row.get('address', ''),
+                        'phone': row.get('phone', ''),
+                        'role': row.get('role', 'customer')
+                    })
+            except (ValueError, KeyError):
+                continue
+    return items
+
+class PersistentConnection(sqlite3.Connection):
+    """A connection that outlives the Database method using it.
+
+    close() resets it to the state of a fresh connection and hands it back
+    to its pool: its cursors are closed (an unfinished SELECT would keep its
+    read lock and block writers), an open transaction is rolled back and the
+    row factory is the default. Closing it again before it is handed out is
+    a no-op. shutdown() really closes it.
+    """
+    release = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cursors = weakref.WeakSet()
+        self.pooled = False
+
+    def cursor(self, factory=sqlite3.Cursor):
+        cursor = super().cursor(factory)
+        self._cursors.add(cursor)
+        return cursor
+
+    def close(self):
+        if self.pooled:
+            return
+        for cursor in list(self._cursors):
+            cursor.close()
+        self._cursors.clear()
+        if self.in_transaction:
+            self.rollback()
+        self.row_factory = None
+        if self.release:
+            self.pooled = True
+            self.release(self)
+
+    def shutdown(self):
+        sqlite3.Connection.close(self)
+
 
 class Database:
-    def __init__(self, base_dir: str):
+    def __init__(self, base_dir: str, hasher: PasswordHasher = None):
         self.base_dir = base_dir
         self.db_path = os.path.join(base_dir, "vinylflow.db")
+        self.hasher = hasher or default_hasher()
+        self.sessions = AUTH_SESSIONS
+        self._sweeper = None
+        self._sweeper_stop = None
+        # Called with every SQL statement run on this Database's connections (see query_plan_audit)
+        self.trace_callback = None
+        # Connections closed by the methods using them, ready for reuse on the same thread
+        self._local = threading.local()
         self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        """A connection to the database; every method goes through here.
+
+        Connections are reused on their thread: close() hands one back (see
+        PersistentConnection), so sqlite3's statement cache carries over from
+        call to call. A method calling another while its own connection is
+        open (delete_record -> get_record) takes a second one. One a method
+        never closes because it raised is not held here, and is closed when
+        it is garbage collected.
+        """
+        free = self._free_connections()
+        conn = free.pop() if free else self._open()
+        conn.pooled = False
+        conn.set_trace_callback(self.trace_callback)
+        return conn
+
+    def _free_connections(self) -> List[PersistentConnection]:
+        local = self._local
+        if not hasattr(local, 'free'):
+            local.free = []
+        return local.free
+
+    def _open(self) -> PersistentConnection:
+        conn = QUERY_STATS.connect(self.db_path, factory=PersistentConnection,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        conn.release = self._release
+        return conn
+
+    def _release(self, conn: PersistentConnection):
+        self._free_connections().append(conn)
     
     def init_database(self):
         """Initialize SQLite database with all necessary tables"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         # Enable foreign keys
@@ -44,6 +214,40 @@ class Database:
             cursor.execute("ALTER TABLE records ADD COLUMN deleted_at TIMESTAMP")
         if 'deleted_by' not in columns:
             cursor.execute("ALTER TABLE records ADD COLUMN deleted_by INTEGER")
+        if 'row_version' not in columns:
+            # Existing rows get their id as a starting version. The backfill is not a
+            # change worth logging; install_change_log below puts the triggers back.
+            cursor.execute("ALTER TABLE records ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0")
+            drop_change_log_triggers(cursor)
+            cursor.execute("UPDATE records SET row_version = id")
+        if 'updated_at' not in columns:
+            # The version triggers now also stamp updated_at; recreate them (and the
+            # change_log triggers, whose row JSON gains the column) after the backfill
+            cursor.execute("DROP TRIGGER IF EXISTS records_row_version_insert")
+            cursor.execute("DROP TRIGGER IF EXISTS records_row_version_update")
+            drop_change_log_triggers(cursor)
+            cursor.execute("ALTER TABLE records ADD COLUMN updated_at TIMESTAMP")
+            cursor.execute("UPDATE records SET updated_at = COALESCE(deleted_at, date_added)")
+
+        # Records soft-deleted long ago (see archive_deleted_records); rows keep their id and
+        # row_version so restore_record and delta sync still find them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS records_archive (
+                id INTEGER PRIMARY KEY,
+                artist TEXT NOT NULL,
+                album TEXT NOT NULL,
+                genre TEXT,
+                year INTEGER,
+                price REAL NOT NULL,
+                stock INTEGER DEFAULT 0,
+                date_added TIMESTAMP,
+                deleted_at TIMESTAMP NOT NULL,
+                deleted_by INTEGER,
+                row_version INTEGER NOT NULL,
+                updated_at TIMESTAMP,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
 
         # Customers table with role
         cursor.execute('''
@@ -138,6 +342,94 @@ class Database:
             )
         ''')
 
+        # Pre-aggregated sales for reporting, excluding cancelled sales: sales_daily has
+        # one row per day, sales_daily_records one per (record, day) and
+        # sales_record_totals one per record for all-time figures.
+        # report_watermarks holds the highest sale id already rolled up.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sales_daily (
+                day TEXT PRIMARY KEY,
+                orders INTEGER NOT NULL DEFAULT 0,
+                units INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sales_daily_records (
+                day TEXT NOT NULL,
+                record_id INTEGER NOT NULL,
+                genre TEXT,
+                units INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (record_id, day)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sales_record_totals (
+                record_id INTEGER PRIMARY KEY,
+                genre TEXT,
+                units INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS report_watermarks (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO report_watermarks (name, value) VALUES ('sales_daily', 0)")
+
+        # Time-limited stock holds for carts (holder = till/session id)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reservations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                holder TEXT NOT NULL,
+                record_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL CHECK (quantity > 0),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL,
+                UNIQUE(holder, record_id),
+                FOREIGN KEY (record_id) REFERENCES records(id)
+            )
+        ''')
+
+        # Low-stock thresholds (scope 'default', 'genre:<name>' or 'record:<id>'; the most
+        # specific applies) and the alerts the triggers below keep in step with stock
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_alerts'")
+        new_stock_alerts = cursor.fetchone() is None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_thresholds (
+                scope TEXT PRIMARY KEY,
+                threshold INTEGER NOT NULL CHECK (threshold >= 0)
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO stock_thresholds (scope, threshold) VALUES ('default', ?)",
+                       (self.DEFAULT_LOW_STOCK,))
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_alerts (
+                record_id INTEGER PRIMARY KEY,
+                level TEXT NOT NULL CHECK (level IN ('low', 'out')),
+                stock INTEGER NOT NULL,
+                threshold INTEGER NOT NULL,
+                raised_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                acknowledged_at TIMESTAMP,
+                FOREIGN KEY (record_id) REFERENCES records(id)
+            )
+        ''')
+
+        # Sales made by tills while offline that have been applied (op_id makes syncing idempotent)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS offline_sales (
+                op_id TEXT PRIMARY KEY,
+                sale_id INTEGER NOT NULL,
+                till_id TEXT,
+                conflicts TEXT,
+                synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (sale_id) REFERENCES sales(id)
+            )
+        ''')
+
         # Audit log
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS audit_log (
@@ -152,32 +444,113 @@ class Database:
             )
         ''')
 
-        # Indexes (now safe because deleted_at exists)
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_records_artist ON records(artist)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_records_genre ON records(genre)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_records_deleted ON records(deleted_at)')
+        # Indexes (now safe because deleted_at exists). Record indexes built before they were
+        # partial are replaced; idx_records_artist is covered by idx_records_live_order
+        cursor.execute('DROP INDEX IF EXISTS idx_records_artist')
+        rebuilt = False
+        for name, sql in RECORD_INDEXES.items():
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,))
+            existing = cursor.fetchone()
+            if existing and existing[0] == sql:
+                continue
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+            cursor.execute(sql)
+            rebuilt = True
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if rebuilt and cursor.fetchone():
+            # Without statistics for the new indexes the planner favours them even for
+            # whole-table aggregates, where a plain scan is faster
+            cursor.execute('ANALYZE records')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_artists_customer ON artists(customer_id)')
+        # Order history: a customer's sales newest first, and the items of one sale
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_customer_date ON sales(customer_id, sale_date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sale_items_sale ON sale_items(sale_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings(performance_date)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings(status)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_record ON reservations(record_id, expires_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_expiry ON reservations(expires_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_daily_records_day ON sales_daily_records(day)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_record_totals_units ON sales_record_totals(units)')
+        # Delta sync reads records by version; the triggers below look up the current maximum
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_records_row_version ON records(row_version)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_records_archive_row_version ON records_archive(row_version)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_alerts_open ON stock_alerts(acknowledged_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_alerts_level ON stock_alerts(level)')
+
+        # Every insert or update of a record (soft deletes and restores included) gives it the
+        # next row_version and stamps updated_at; inserts that bring their own version, such
+        # as restore replays, keep it
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS records_row_version_insert AFTER INSERT ON records
+            WHEN NEW.row_version = 0
+            BEGIN
+                UPDATE records SET row_version = (SELECT MAX(row_version) FROM records) + 1,
+                                   updated_at = CURRENT_TIMESTAMP
+                WHERE id = NEW.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS records_row_version_update AFTER UPDATE ON records
+            WHEN NEW.row_version IS OLD.row_version
+            BEGIN
+                UPDATE records SET row_version = (SELECT MAX(row_version) FROM records) + 1,
+                                   updated_at = CURRENT_TIMESTAMP
+                WHERE id = NEW.id;
+            END
+        ''')
+
+        # Raise, update or clear a record's stock alert whenever its stock, genre or deleted
+        # state changes, so nothing has to scan records for low stock
+        new_row_alert = self._stock_alert_upsert(
+            f"SELECT NEW.id AS id, NEW.stock AS stock, {self._threshold_sql('NEW')} AS threshold "
+            f"WHERE NEW.deleted_at IS NULL")
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS records_stock_alert_insert AFTER INSERT ON records
+            BEGIN
+                {new_row_alert};
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS records_stock_alert_update AFTER UPDATE OF stock, genre, deleted_at ON records
+            BEGIN
+                DELETE FROM stock_alerts WHERE record_id = NEW.id
+                    AND NOT (NEW.deleted_at IS NULL AND IFNULL(NEW.stock <= {self._threshold_sql('NEW')}, 0));
+                {new_row_alert};
+            END
+        ''')
+        if new_stock_alerts:
+            self._evaluate_stock_alerts(cursor)
+
+        # Row-level change capture for incremental backups
+        install_change_log(cursor)
 
         conn.commit()
+        # This connection is reused by the other methods (see _connect), which run without it
+        cursor.execute('PRAGMA foreign_keys = OFF')
         conn.close()
     
     def _hash_password(self, password: str) -> str:
-        return hashlib.sha256(password.encode()).hexdigest()
+        return self.hasher.hash(password)
     
     def log_audit(self, user_id: int, action: str, table_name: str, record_id: int = None,
                   old_data: dict = None, new_data: dict = None):
         """Log an action in the audit log"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO audit_log (user_id, action, table_name, record_id, old_data, new_data)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, action, table_name, record_id,
-              str(old_data) if old_data else None,
-              str(new_data) if new_data else None))
+        self._write_audit(cursor, [(user_id, action, table_name, record_id, old_data, new_data)])
         conn.commit()
         conn.close()
+
+    @staticmethod
+    def _write_audit(cursor, entries: List[tuple]):
+        """Insert (user_id, action, table_name, record_id, old_data, new_data) audit rows"""
+        cursor.executemany('''
+            INSERT INTO audit_log (user_id, action, table_name, record_id, old_data, new_data)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(user_id, action, table_name, record_id,
+               str(old_data) if old_data else None,
+               str(new_data) if new_data else None)
+              for user_id, action, table_name, record_id, old_data, new_data in entries])
     
     # ---------- Record methods (with soft delete) ----------
     def add_record(self, record: Dict, user_id: int = None) -> int:
@@ -187,13 +560,10 @@ class Database:
             if field not in record:
                 raise ValueError(f"Missing required field: {field}")
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO records (artist, album, genre, year, price, stock)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
+        cursor.execute(statement('records.insert'), (
             record['artist'],
             record['album'],
             record.get('genre', ''),
@@ -215,19 +585,18 @@ class Database:
         if not updates:
             return False
         
+        # Unknown columns are refused before anything is read
+        sql, values = update_statement('records', updates)
+        values.append(record_id)
+        
         # Get old data for audit
         old_data = self.get_record(record_id)
         if not old_data:
             return False
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
-        
-        set_clause = ', '.join([f"{k}=?" for k in updates.keys()])
-        values = list(updates.values())
-        values.append(record_id)
-        
-        cursor.execute(f'UPDATE records SET {set_clause} WHERE id=?', values)
+        cursor.execute(sql, values)
         rows_affected = cursor.rowcount
         
         conn.commit()
@@ -237,9 +606,56 @@ class Database:
             self.log_audit(user_id, 'UPDATE', 'records', record_id, old_data, updates)
         return rows_affected > 0
     
+    def bulk_update_records(self, record_ids: List[int], operation: str, value=None,
+                            user_id: int = None) -> List[Dict]:
+        """Apply one operation to many live records in a single transaction.
+
+        Operations are the keys of BULK_RECORD_OPERATIONS: price_percent (e.g. -10
+        for 10% off), set_stock, adjust_stock (never below zero), set_genre and
+        delete (soft). Returns the touched records as they are afterwards.
+        """
+        if operation not in BULK_RECORD_OPERATIONS:
+            raise ValueError(f"Unknown bulk operation: {operation}")
+        if operation == 'price_percent' and float(value) <= -100:
+            raise ValueError("A price change must leave prices above zero")
+        if operation == 'set_stock' and int(value) < 0:
+            raise ValueError("Stock cannot be negative")
+        if operation == 'delete':
+            value = user_id
+        if not record_ids:
+            return []
+        set_clause, action = BULK_RECORD_OPERATIONS[operation]
+        ids_json = id_list(record_ids)
+        
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(statement('records.live_by_ids'), (ids_json,))
+            old_rows = {row['id']: dict(row) for row in cursor.fetchall()}
+            cursor.execute(f'''
+                UPDATE records SET {set_clause}
+                WHERE id {ID_LIST} AND deleted_at IS NULL
+            ''', (value, ids_json))
+            cursor.execute(statement('records.by_ids'), (id_list(old_rows),))
+            new_rows = [dict(row) for row in cursor.fetchall()]
+            if user_id:
+                self._write_audit(cursor, [
+                    (user_id, action, 'records', row['id'], old_rows[row['id']],
+                     None if operation == 'delete' else {operation: value})
+                    for row in new_rows])
+            conn.commit()
+            return new_rows
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+    
     def delete_record(self, record_id: int, user_id: int = None) -> bool:
         """Soft delete a record"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Get old data for audit
@@ -248,10 +664,7 @@ class Database:
             conn.close()
             return False
         
-        cursor.execute('''
-            UPDATE records SET deleted_at = CURRENT_TIMESTAMP, deleted_by = ?
-            WHERE id = ?
-        ''', (user_id, record_id))
+        cursor.execute(statement('records.soft_delete'), (user_id, record_id))
         rows_affected = cursor.rowcount
         
         conn.commit()
@@ -262,85 +675,250 @@ class Database:
         return rows_affected > 0
     
     def restore_record(self, record_id: int, user_id: int = None) -> bool:
-        """Restore a soft‑deleted record"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE records SET deleted_at = NULL, deleted_by = NULL
-            WHERE id = ?
-        ''', (record_id,))
-        rows_affected = cursor.rowcount
-        
-        conn.commit()
-        conn.close()
+        """Restore a soft‑deleted record (see restore_records)"""
+        return bool(self.restore_records([record_id], user_id))
+
+    def restore_records(self, record_ids: List[int], user_id: int = None) -> List[int]:
+        """Restore soft-deleted records in one transaction; returns the ids restored.
+
+        Archived records move back from records_archive under their old ids.
+        Nothing is restored (ValueError) if an archived record's artist and
+        album have since been taken by another record.
+        """
+        if not record_ids:
+            return []
+        ids_json = id_list(record_ids)
         
-        if rows_affected > 0 and user_id:
-            self.log_audit(user_id, 'RESTORE', 'records', record_id, None, None)
-        return rows_affected > 0
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(statement('records_archive.conflicts'), (ids_json,))
+            conflicts = [str(row[0]) for row in cursor.fetchall()]
+            if conflicts:
+                raise ValueError(f"Cannot restore record{'s' if len(conflicts) > 1 else ''} "
+                                 f"{', '.join(conflicts)}: another record has the same artist and album")
+            cursor.execute(statement('records.restorable'), (ids_json, ids_json))
+            restored = [row[0] for row in cursor.fetchall()]
+            cursor.execute(statement('records.restore'), (ids_json,))
+            cursor.execute(statement('records.unarchive'), (ids_json,))
+            cursor.execute(statement('records_archive.delete'), (ids_json,))
+            if user_id:
+                self._write_audit(cursor, [(user_id, 'RESTORE', 'records', record_id, None, None)
+                                           for record_id in restored])
+            conn.commit()
+            return restored
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            raise ValueError("Cannot restore records that share an artist and album")
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
     
     def get_record(self, record_id: int) -> Optional[Dict]:
         """Get a single record by ID (excluding deleted)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM records WHERE id=? AND deleted_at IS NULL', (record_id,))
+        cursor.execute(statement('records.get'), (record_id,))
         row = cursor.fetchone()
         conn.close()
         return dict(row) if row else None
     
     def get_all_records(self, limit: int = None, offset: int = 0, include_deleted: bool = False) -> List[Dict]:
         """Get all records, optionally including deleted ones"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        query = 'SELECT * FROM records'
-        if not include_deleted:
-            query += ' WHERE deleted_at IS NULL'
-        query += ' ORDER BY artist, album'
+        name = 'records.list_all' if include_deleted else 'records.list_live'
         if limit:
-            query += f' LIMIT {limit} OFFSET {offset}'
-        
-        cursor.execute(query)
+            cursor.execute(statement(name + '_page'), (int(limit), int(offset)))
+        else:
+            cursor.execute(statement(name))
         rows = cursor.fetchall()
         conn.close()
         return [dict(row) for row in rows]
     
-    def get_deleted_records(self) -> List[Dict]:
-        """Get all soft‑deleted records"""
-        conn = sqlite3.connect(self.db_path)
+    def get_catalog_snapshot(self) -> CatalogSnapshot:
+        """Live records as a compact CatalogSnapshot, built straight from the cursor"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        # Version first: a change made during the read is fetched again by the next delta
+        cursor.execute(statement('records.version'))
+        version = cursor.fetchone()[0]
+        cursor.execute(f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM records WHERE deleted_at IS NULL ORDER BY id")
+        snapshot = CatalogSnapshot.from_rows(cursor, version)
+        conn.close()
+        return snapshot
+
+    @staticmethod
+    def _deleted_records_filter(search: str = None, deleted_from: str = None, deleted_to: str = None,
+                                after: tuple = None) -> tuple:
+        """WHERE clause and parameters shared by the records and records_archive halves"""
+        conditions, params = ['deleted_at IS NOT NULL'], []
+        if search:
+            conditions.append('(artist LIKE ? OR album LIKE ? OR genre LIKE ?)')
+            params.extend([f'%{search}%'] * 3)
+        for name, value, condition in (('deleted_from', deleted_from, 'deleted_at >= ?'),
+                                       ('deleted_to', deleted_to, "deleted_at < date(?, '+1 day')")):
+            if value:
+                try:
+                    datetime.strptime(value, '%Y-%m-%d')
+                except (TypeError, ValueError):
+                    raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+                conditions.append(condition)
+                params.append(value)
+        if after:
+            conditions.append('(deleted_at, id) < (?, ?)')
+            params.extend(after)
+        return ' AND '.join(conditions), params
+
+    def get_deleted_records(self, limit: int = None, after: tuple = None, search: str = None,
+                            deleted_from: str = None, deleted_to: str = None) -> List[Dict]:
+        """Soft‑deleted records, archived ones included (archived=1), most recently deleted first.
+
+        Pages are keyset-based like get_customer_sales: pass the (deleted_at, id)
+        of the last record of one page as `after`. `search` matches artist,
+        album or genre; `deleted_from` and `deleted_to` are inclusive dates
+        (YYYY-MM-DD).
+        """
+        where, params = self._deleted_records_filter(search, deleted_from, deleted_to, after)
+        columns = ', '.join(RECORD_COLUMNS)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM records WHERE deleted_at IS NOT NULL ORDER BY deleted_at DESC')
+        cursor.execute(f'''
+            SELECT {columns}, 0 AS archived FROM records WHERE {where}
+            UNION ALL
+            SELECT {columns}, 1 AS archived FROM records_archive WHERE {where}
+            ORDER BY deleted_at DESC, id DESC
+            LIMIT ?
+        ''', params + params + [limit if limit is not None else -1])
         rows = cursor.fetchall()
         conn.close()
         return [dict(row) for row in rows]
+
+    def count_deleted_records(self, search: str = None, deleted_from: str = None, deleted_to: str = None) -> int:
+        where, params = self._deleted_records_filter(search, deleted_from, deleted_to)
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT (SELECT COUNT(*) FROM records WHERE {where}) + (SELECT COUNT(*) FROM records_archive WHERE {where})
+        ''', params + params)
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
     
     def search_records(self, query: str, limit: int = 50) -> List[Dict]:
         """Search records by artist, album, or genre (excluding deleted)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         search_pattern = f'%{query}%'
-        cursor.execute('''
-            SELECT * FROM records 
-            WHERE (artist LIKE ? OR album LIKE ? OR genre LIKE ?)
-            AND deleted_at IS NULL
-            ORDER BY artist, album
-            LIMIT ?
-        ''', (search_pattern, search_pattern, search_pattern, limit))
+        cursor.execute(statement('records.search'), (search_pattern, search_pattern, search_pattern, limit))
         
         rows = cursor.fetchall()
         conn.close()
         return [dict(row) for row in rows]
     
+    def get_artist_names(self) -> List[str]:
+        """Get the distinct artist names in the catalog (excluding deleted)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT DISTINCT artist FROM records
+            WHERE deleted_at IS NULL AND artist != ''
+            ORDER BY artist
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return [row[0] for row in rows]
+
+    def get_change_version(self) -> int:
+        """Counter that moves on every change to records, sales, bookings, customers or stock alerts.
+
+        It is the change_log sequence, which never goes back even when the log is
+        trimmed, so equal versions mean the catalog has not changed.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def get_records_version(self) -> int:
+        """The highest row_version in records: a cheap "has the catalog changed" check"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(statement('records.version'))
+        version = cursor.fetchone()[0]
+        conn.close()
+        return version
+
+    def get_records_changed_since(self, version: int, limit: int = 1000) -> List[Dict]:
+        """Records with a row_version above `version`, oldest change first.
+
+        Soft-deleted records (archived ones too) are included with deleted_at set,
+        and restored ones with it cleared, so a caller holding a copy of the catalog
+        can apply the rows as they come. Pass the highest row_version seen so far
+        to get the next batch; fewer than `limit` rows means the caller is up to date.
+        """
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(statement('records.changed_since'), (version, version, limit))
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def archive_deleted_records(self, older_than_days: int = ARCHIVE_AFTER_DAYS, user_id: int = None) -> int:
+        """Move records soft-deleted more than `older_than_days` ago to records_archive.
+
+        Keeps records (and its indexes) down to the live catalog and recent
+        deletions. Runs in batches of ARCHIVE_BATCH_SIZE, one short transaction
+        each; returns how many records were archived.
+        """
+        archived = 0
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            while True:
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute(statement('records.archivable'), (f"-{int(older_than_days)} days", ARCHIVE_BATCH_SIZE))
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    conn.rollback()
+                    break
+                ids_json = id_list(ids)
+                cursor.execute(statement('records.archive'), (ids_json,))
+                # Holds and alerts only exist for live records; clear any left behind
+                cursor.execute(f'DELETE FROM reservations WHERE record_id {ID_LIST}', (ids_json,))
+                cursor.execute(f'DELETE FROM stock_alerts WHERE record_id {ID_LIST}', (ids_json,))
+                cursor.execute(statement('records.delete_archived'), (ids_json,))
+                if user_id:
+                    self._write_audit(cursor, [(user_id, 'ARCHIVE', 'records', record_id, None, None)
+                                               for record_id in ids])
+                conn.commit()
+                archived += len(ids)
+                if len(ids) < ARCHIVE_BATCH_SIZE:
+                    break
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+        return archived
+    
     # ---------- Artist methods ----------
     def register_artist(self, customer_id: int, artist_data: Dict) -> int:
         """Create an artist profile for an existing customer"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -361,7 +939,7 @@ class Database:
         return artist_id
     
     def get_artist_by_customer_id(self, customer_id: int) -> Optional[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM artists WHERE customer_id = ?', (customer_id,))
@@ -370,7 +948,7 @@ class Database:
         return dict(row) if row else None
     
     def get_artist_by_id(self, artist_id: int) -> Optional[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM artists WHERE id = ?', (artist_id,))
@@ -379,7 +957,7 @@ class Database:
         return dict(row) if row else None
     
     def get_all_artists(self) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('''
@@ -393,7 +971,7 @@ class Database:
         return [dict(row) for row in rows]
     
     def delete_artist(self, artist_id: int) -> bool:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('DELETE FROM artists WHERE id = ?', (artist_id,))
         rows = cursor.rowcount
@@ -428,7 +1006,7 @@ class Database:
         return available
     
     def get_booked_slots(self, from_date: datetime, to_date: datetime) -> List[datetime]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT performance_date FROM bookings
@@ -441,7 +1019,7 @@ class Database:
     
     def create_booking(self, artist_id: int, performance_date: datetime, duration_minutes: int = 60,
                        notes: str = "", user_id: int = None) -> int:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO bookings (artist_id, performance_date, duration_minutes, notes, status)
@@ -459,7 +1037,7 @@ class Database:
         return booking_id
     
     def get_artist_bookings(self, artist_id: int) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('''
@@ -472,7 +1050,7 @@ class Database:
         return [dict(row) for row in rows]
     
     def get_all_bookings(self) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('''
@@ -491,7 +1069,7 @@ class Database:
         if status not in allowed:
             raise ValueError(f"Invalid status. Choose from {allowed}")
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE bookings SET status = ?, updated_at = CURRENT_TIMESTAMP
@@ -512,7 +1090,7 @@ class Database:
         if self.get_customer_by_username(customer_data['username']):
             raise ValueError("Username already exists")
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -534,7 +1112,7 @@ class Database:
         return customer_id
     
     def get_customer_by_username(self, username: str) -> Optional[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM customers WHERE username = ?', (username,))
@@ -542,56 +1120,238 @@ class Database:
         conn.close()
         return dict(row) if row else None
     
+    def get_customer_by_id(self, customer_id: int) -> Optional[Dict]:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM customers WHERE id = ?', (customer_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
     def authenticate_customer(self, username: str, password: str) -> Optional[Dict]:
+        """Check a customer's password and return the customer with a session token.
+
+        Logins repeated within the session cache's lifetime skip the KDF. Hashes
+        in an older format or with a lower cost are upgraded on success.
+        """
         customer = self.get_customer_by_username(username)
         if not customer:
+            # Spend the same time as a real check so usernames can't be probed by timing
+            self.hasher.dummy_verify(password)
+            return None
+        stored_hash = customer.pop('password_hash', None) or ''
+        token = self.sessions.lookup(username, password, stored_hash)
+        if token is None:
+            if not self.hasher.verify(password, stored_hash):
+                return None
+            if self.hasher.needs_rehash(stored_hash):
+                stored_hash = self._rehash_password(customer['id'], password)
+            token = self.sessions.store(username, password, customer['id'], stored_hash)
+        customer['session_token'] = token
+        return customer
+    
+    def _rehash_password(self, customer_id: int, password: str) -> str:
+        """Store a fresh hash of a just-verified password"""
+        new_hash = self._hash_password(password)
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('UPDATE customers SET password_hash = ? WHERE id = ?', (new_hash, customer_id))
+        conn.commit()
+        conn.close()
+        return new_hash
+    
+    def resume_session(self, token: str) -> Optional[Dict]:
+        """Return the customer for a live session token without re-checking the password"""
+        session = self.sessions.resume(token)
+        if not session:
+            return None
+        customer = self.get_customer_by_id(session['customer_id'])
+        if not customer or customer.pop('password_hash', None) != session['password_hash']:
+            # Password changed (or account removed) since the session was issued
+            self.sessions.invalidate(token=token)
             return None
-        if customer['password_hash'] == self._hash_password(password):
-            customer.pop('password_hash', None)
-            return customer
+        customer['session_token'] = token
+        return customer
+    
+    def end_session(self, token: str):
+        """Log out: the token can no longer be resumed"""
+        if token:
+            self.sessions.invalidate(token=token)
+    
+    def authenticate_owner(self, username: str, password: str) -> Optional[Dict]:
+        """The owner user if the owner login matches, else None"""
+        if (hmac.compare_digest(username.encode(), OWNER_USERNAME.encode())
+                & hmac.compare_digest(password.encode(), OWNER_PASSWORD.encode())):
+            return dict(OWNER_USER)
         return None
     
-    # ---------- Sales methods (unchanged) ----------
+    # ---------- Reservation methods ----------
+    def reserve_stock(self, holder: str, record_id: int, quantity: int,
+                      ttl_seconds: int = RESERVATION_TTL_SECONDS) -> int:
+        """Add `quantity` to holder's hold on a record; returns the total now held.
+
+        Raises ValueError if that much stock is not available. Every hold of the
+        holder is extended, so an active cart does not expire piecemeal.
+        """
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            # IMMEDIATE takes the write lock up front, so two tills cannot both
+            # read the same available count and then both hold it
+            cursor.execute('BEGIN IMMEDIATE')
+            self._delete_expired_reservations(cursor)
+            cursor.execute('SELECT stock FROM records WHERE id=? AND deleted_at IS NULL', (record_id,))
+            row = cursor.fetchone()
+            if not row:
+                raise ValueError(f"Record {record_id} not found")
+            available = row[0] - self._held_quantity(cursor, record_id)
+            if quantity > available:
+                raise ValueError(f"Only {max(available, 0)} available for record {record_id}")
+
+            expires = f'+{int(ttl_seconds)} seconds'
+            cursor.execute('''
+                INSERT INTO reservations (holder, record_id, quantity, expires_at)
+                VALUES (?, ?, ?, datetime('now', ?))
+                ON CONFLICT(holder, record_id) DO UPDATE SET quantity = quantity + excluded.quantity
+            ''', (holder, record_id, quantity, expires))
+            cursor.execute("UPDATE reservations SET expires_at = datetime('now', ?) WHERE holder=?",
+                           (expires, holder))
+            cursor.execute('SELECT quantity FROM reservations WHERE holder=? AND record_id=?',
+                           (holder, record_id))
+            held = cursor.fetchone()[0]
+            conn.commit()
+            return held
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def release_reservations(self, holder: str, record_id: int = None) -> int:
+        """Drop holder's holds (all of them, or just one record's); returns rows removed"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        if record_id is None:
+            cursor.execute('DELETE FROM reservations WHERE holder=?', (holder,))
+        else:
+            cursor.execute('DELETE FROM reservations WHERE holder=? AND record_id=?', (holder, record_id))
+        removed = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return removed
+
+    def get_available_stock(self, record_id: int, holder: str = None) -> int:
+        """Stock minus active holds; holder's own holds are not subtracted if given"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT stock FROM records WHERE id=? AND deleted_at IS NULL', (record_id,))
+        row = cursor.fetchone()
+        available = row[0] - self._held_quantity(cursor, record_id, exclude_holder=holder) if row else 0
+        conn.close()
+        return max(available, 0)
+
+    def get_reservations(self, holder: str) -> List[Dict]:
+        """Active holds of one holder"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM reservations
+            WHERE holder=? AND expires_at > datetime('now')
+            ORDER BY created_at
+        ''', (holder,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def expire_reservations(self) -> int:
+        """Delete holds past their expiry; returns how many were released"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        removed = self._delete_expired_reservations(cursor)
+        conn.commit()
+        conn.close()
+        return removed
+
+    def start_reservation_sweeper(self, interval_seconds: float = 60):
+        """Expire stale holds (and hourly, archive old deletions and trim change_log) from a daemon thread until stopped"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._sweeper_stop = threading.Event()
+
+        def sweep(stop):
+            next_archive = 0.0
+            while not stop.wait(interval_seconds):
+                try:
+                    self.expire_reservations()
+                    if time.monotonic() >= next_archive:
+                        self.archive_deleted_records()
+                        self.trim_change_log()
+                        next_archive = time.monotonic() + ARCHIVE_INTERVAL_SECONDS
+                except sqlite3.Error:
+                    # Database busy or briefly unavailable; try again next round
+                    pass
+
+        self._sweeper = threading.Thread(target=sweep, args=(self._sweeper_stop,),
+                                         name="reservation-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_reservation_sweeper(self):
+        if self._sweeper_stop:
+            self._sweeper_stop.set()
+        self._sweeper = None
+
+    def checkout_reservations(self, holder: str, customer_id: int, items: List[Dict],
+                              shipping_address: str = "") -> int:
+        """Turn holder's cart into a sale and drop its holds, in one transaction.
+
+        Items whose hold has lapsed still go through if the stock is free.
+        """
+        if not items:
+            raise ValueError("Sale must contain at least one item")
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            self._delete_expired_reservations(cursor)
+            sale_id = self._insert_sale(cursor, customer_id, items, shipping_address, holder=holder)
+            cursor.execute('DELETE FROM reservations WHERE holder=?', (holder,))
+            conn.commit()
+            return sale_id
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _held_quantity(cursor, record_id: int, exclude_holder: str = None) -> int:
+        cursor.execute('''
+            SELECT COALESCE(SUM(quantity), 0) FROM reservations
+            WHERE record_id=? AND expires_at > datetime('now') AND holder IS NOT ?
+        ''', (record_id, exclude_holder))
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def _delete_expired_reservations(cursor) -> int:
+        cursor.execute("DELETE FROM reservations WHERE expires_at <= datetime('now')")
+        return cursor.rowcount
+
+    # ---------- Sales methods ----------
     def create_sale(self, customer_id: int, items: List[Dict], shipping_address: str = "") -> int:
-        # (same as before)
+        """Record a sale outside any cart; stock held by carts is not sold"""
         if not items:
             raise ValueError("Sale must contain at least one item")
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
-            cursor.execute('BEGIN TRANSACTION')
-            total_amount = 0
-            for item in items:
-                record_id = item['record_id']
-                quantity = item['quantity']
-                cursor.execute('SELECT price, stock FROM records WHERE id=?', (record_id,))
-                record = cursor.fetchone()
-                if not record:
-                    raise ValueError(f"Record {record_id} not found")
-                price, stock = record
-                if stock < quantity:
-                    raise ValueError(f"Insufficient stock for record {record_id}")
-                total_amount += price * quantity
-            
-            cursor.execute('''
-                INSERT INTO sales (customer_id, total_amount, shipping_address)
-                VALUES (?, ?, ?)
-            ''', (customer_id, total_amount, shipping_address))
-            sale_id = cursor.lastrowid
-            
-            for item in items:
-                record_id = item['record_id']
-                quantity = item['quantity']
-                cursor.execute('SELECT price FROM records WHERE id=?', (record_id,))
-                price = cursor.fetchone()[0]
-                cursor.execute('''
-                    INSERT INTO sale_items (sale_id, record_id, quantity, price_at_time)
-                    VALUES (?, ?, ?, ?)
-                ''', (sale_id, record_id, quantity, price))
-                cursor.execute('UPDATE records SET stock = stock - ? WHERE id=?', (quantity, record_id))
-            
+            cursor.execute('BEGIN IMMEDIATE')
+            sale_id = self._insert_sale(cursor, customer_id, items, shipping_address)
             conn.commit()
             return sale_id
         except Exception as e:
@@ -599,27 +1359,375 @@ class Database:
             raise e
         finally:
             conn.close()
-    
-    def get_customer_sales(self, customer_id: int) -> List[Dict]:
-        # (same as before)
-        conn = sqlite3.connect(self.db_path)
+
+    def _insert_sale(self, cursor, customer_id: int, items: List[Dict], shipping_address: str,
+                     holder: str = None) -> int:
+        """Check stock and write the sale, its items and the stock decrements (caller commits).
+
+        Holds of other holders are not for sale; `holder`'s own holds are.
+        """
+        total_amount = 0
+        prices = {}
+        genres = {}
+        for item in items:
+            record_id = item['record_id']
+            quantity = item['quantity']
+            cursor.execute('SELECT price, stock, genre FROM records WHERE id=?', (record_id,))
+            record = cursor.fetchone()
+            if not record:
+                raise ValueError(f"Record {record_id} not found")
+            price, stock, genres[record_id] = record
+            if stock - self._held_quantity(cursor, record_id, exclude_holder=holder) < quantity:
+                raise ValueError(f"Insufficient stock for record {record_id}")
+            prices[record_id] = price
+            total_amount += price * quantity
+        
+        cursor.execute('''
+            INSERT INTO sales (customer_id, total_amount, shipping_address)
+            VALUES (?, ?, ?)
+        ''', (customer_id, total_amount, shipping_address))
+        sale_id = cursor.lastrowid
+        
+        for item in items:
+            record_id = item['record_id']
+            quantity = item['quantity']
+            cursor.execute('''
+                INSERT INTO sale_items (sale_id, record_id, quantity, price_at_time)
+                VALUES (?, ?, ?, ?)
+            ''', (sale_id, record_id, quantity, prices[record_id]))
+            cursor.execute('UPDATE records SET stock = stock - ? WHERE id=?', (quantity, record_id))
+        self._roll_up_sale(cursor, sale_id, items, prices, genres)
+        return sale_id
+
+    def apply_offline_sales(self, sales: List[Dict], till_id: str = None) -> List[Dict]:
+        """Record sales a till made while it could not reach this database.
+
+        Each sale is {op_id, customer_id, items: [{record_id, quantity, price}],
+        shipping_address, sale_date}. The records have already left the shop, so
+        a sale is never refused for stock: it is recorded at the till's price and
+        date, stock is decremented but not below zero, and any shortfall (or a
+        record unknown here) is returned as a conflict and written to the audit
+        log as OFFLINE_OVERSELL. A sale whose op_id was applied before is not
+        applied again; its first outcome is returned.
+
+        Returns one {op_id, sale_id, conflicts} per sale, in order.
+        """
+        results = []
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for sale in sales:
+                cursor.execute('SELECT sale_id, conflicts FROM offline_sales WHERE op_id = ?', (sale['op_id'],))
+                applied = cursor.fetchone()
+                if applied:
+                    results.append({'op_id': sale['op_id'], 'sale_id': applied[0],
+                                    'conflicts': json.loads(applied[1] or '[]')})
+                    continue
+                sale_id, conflicts = self._insert_offline_sale(cursor, sale)
+                cursor.execute('INSERT INTO offline_sales (op_id, sale_id, till_id, conflicts) VALUES (?, ?, ?, ?)',
+                               (sale['op_id'], sale_id, till_id, json.dumps(conflicts)))
+                if conflicts:
+                    self._write_audit(cursor, [(None, 'OFFLINE_OVERSELL', 'sales', sale_id, None,
+                                                {'till_id': till_id, 'conflicts': conflicts})])
+                results.append({'op_id': sale['op_id'], 'sale_id': sale_id, 'conflicts': conflicts})
+            conn.commit()
+            return results
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def _insert_offline_sale(self, cursor, sale: Dict) -> tuple:
+        """Write one offline sale as it happened at the till; returns (sale_id, conflicts)"""
+        items, prices, genres, conflicts = [], {}, {}, []
+        for item in sale['items']:
+            record_id, quantity = item['record_id'], item['quantity']
+            cursor.execute('SELECT stock, genre, price FROM records WHERE id=?', (record_id,))
+            record = cursor.fetchone()
+            if not record:
+                conflicts.append({'record_id': record_id, 'requested': quantity, 'missing': quantity,
+                                  'reason': 'unknown record'})
+                continue
+            stock, genres[record_id], current_price = record
+            available = stock - self._held_quantity(cursor, record_id)
+            if available < quantity:
+                conflicts.append({'record_id': record_id, 'requested': quantity,
+                                  'missing': quantity - max(available, 0), 'reason': 'oversold'})
+            prices[record_id] = item.get('price', current_price)
+            items.append({'record_id': record_id, 'quantity': quantity})
+
+        total_amount = sum(prices[item['record_id']] * item['quantity'] for item in items)
+        cursor.execute('''
+            INSERT INTO sales (customer_id, sale_date, total_amount, shipping_address)
+            VALUES (?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?)
+        ''', (sale.get('customer_id'), sale.get('sale_date'), total_amount, sale.get('shipping_address', "")))
+        sale_id = cursor.lastrowid
+        for item in items:
+            cursor.execute('''
+                INSERT INTO sale_items (sale_id, record_id, quantity, price_at_time)
+                VALUES (?, ?, ?, ?)
+            ''', (sale_id, item['record_id'], item['quantity'], prices[item['record_id']]))
+            cursor.execute('UPDATE records SET stock = MAX(stock - ?, 0) WHERE id=?',
+                           (item['quantity'], item['record_id']))
+        self._roll_up_sale(cursor, sale_id, items, prices, genres)
+        return sale_id, conflicts
+
+    # ---------- Sales reporting ----------
+    def _roll_up_sale(self, cursor, sale_id: int, items: List[Dict], prices: Dict, genres: Dict):
+        """Add a new sale to the daily rollups if every earlier sale is already in them.
+
+        Otherwise the sale is left for refresh_sales_rollup, which works from the watermark.
+        """
+        cursor.execute("SELECT value FROM report_watermarks WHERE name = 'sales_daily'")
+        watermark = cursor.fetchone()[0]
+        cursor.execute('SELECT MAX(id) FROM sales WHERE id < ?', (sale_id,))
+        previous = cursor.fetchone()[0] or 0
+        if previous > watermark:
+            return
+        cursor.execute('SELECT date(sale_date) FROM sales WHERE id=?', (sale_id,))
+        day = cursor.fetchone()[0]
+        units = sum(item['quantity'] for item in items)
+        revenue = sum(prices[item['record_id']] * item['quantity'] for item in items)
+        cursor.execute('''
+            INSERT INTO sales_daily (day, orders, units, revenue) VALUES (?, 1, ?, ?)
+            ON CONFLICT(day) DO UPDATE SET orders = orders + 1, units = units + excluded.units,
+                                           revenue = revenue + excluded.revenue
+        ''', (day, units, revenue))
+        rows = [(day, item['record_id'], genres[item['record_id']], item['quantity'],
+                 prices[item['record_id']] * item['quantity']) for item in items]
+        cursor.executemany('''
+            INSERT INTO sales_daily_records (day, record_id, genre, units, revenue) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(record_id, day) DO UPDATE SET units = units + excluded.units,
+                                                      revenue = revenue + excluded.revenue
+        ''', rows)
+        cursor.executemany('''
+            INSERT INTO sales_record_totals (record_id, genre, units, revenue) VALUES (?, ?, ?, ?)
+            ON CONFLICT(record_id) DO UPDATE SET units = units + excluded.units,
+                                                 revenue = revenue + excluded.revenue
+        ''', [row[1:] for row in rows])
+        cursor.execute("UPDATE report_watermarks SET value = ? WHERE name = 'sales_daily'", (sale_id,))
+
+    def refresh_sales_rollup(self) -> int:
+        """Catch-up job: roll up every sale past the watermark; returns how many were added"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute("SELECT value FROM report_watermarks WHERE name = 'sales_daily'")
+            watermark = cursor.fetchone()[0]
+            cursor.execute('SELECT MAX(id), COUNT(*) FROM sales WHERE id > ?', (watermark,))
+            upper, pending = cursor.fetchone()
+            if not upper:
+                conn.rollback()
+                return 0
+            self._roll_up_sales(cursor, watermark, upper)
+            conn.commit()
+            return pending
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def _roll_up_sales(self, cursor, watermark: int, upper: int):
+        """Add the sales with watermark < id <= upper to the rollups and move the watermark to upper"""
+        cursor.execute('''
+            INSERT INTO sales_daily (day, orders, units, revenue)
+            SELECT date(s.sale_date), COUNT(DISTINCT s.id), SUM(si.quantity), SUM(si.quantity * si.price_at_time)
+            FROM sales s JOIN sale_items si ON si.sale_id = s.id
+            WHERE s.id > ? AND s.id <= ? AND s.status != 'cancelled'
+            GROUP BY date(s.sale_date)
+            ON CONFLICT(day) DO UPDATE SET orders = orders + excluded.orders, units = units + excluded.units,
+                                           revenue = revenue + excluded.revenue
+        ''', (watermark, upper))
+        cursor.execute('''
+            INSERT INTO sales_daily_records (day, record_id, genre, units, revenue)
+            SELECT date(s.sale_date), si.record_id, r.genre, SUM(si.quantity), SUM(si.quantity * si.price_at_time)
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            LEFT JOIN records r ON r.id = si.record_id
+            WHERE s.id > ? AND s.id <= ? AND s.status != 'cancelled'
+            GROUP BY date(s.sale_date), si.record_id
+            ON CONFLICT(record_id, day) DO UPDATE SET units = units + excluded.units,
+                                                      revenue = revenue + excluded.revenue
+        ''', (watermark, upper))
+        cursor.execute('''
+            INSERT INTO sales_record_totals (record_id, genre, units, revenue)
+            SELECT si.record_id, r.genre, SUM(si.quantity), SUM(si.quantity * si.price_at_time)
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            LEFT JOIN records r ON r.id = si.record_id
+            WHERE s.id > ? AND s.id <= ? AND s.status != 'cancelled'
+            GROUP BY si.record_id
+            ON CONFLICT(record_id) DO UPDATE SET units = units + excluded.units,
+                                                 revenue = revenue + excluded.revenue
+        ''', (watermark, upper))
+        cursor.execute("UPDATE report_watermarks SET value = ? WHERE name = 'sales_daily'", (upper,))
+
+    def _rebuild_derived_tables(self, cursor):
+        """Recompute stock alerts and sales rollups from scratch (a restored copy's are not replayed)"""
+        self._evaluate_stock_alerts(cursor)
+        for table in ('sales_daily', 'sales_daily_records', 'sales_record_totals'):
+            cursor.execute(f'DELETE FROM {table}')
+        cursor.execute("UPDATE report_watermarks SET value = 0 WHERE name = 'sales_daily'")
+        cursor.execute('SELECT MAX(id) FROM sales')
+        upper = cursor.fetchone()[0]
+        if upper:
+            self._roll_up_sales(cursor, 0, upper)
+
+    def get_revenue_report(self, period: str = 'day', start: str = None, end: str = None) -> List[Dict]:
+        """Orders, units and revenue per day, week (starting Monday) or month between two dates"""
+        buckets = {
+            'day': 'day',
+            'week': "date(day, 'weekday 0', '-6 days')",
+            'month': "substr(day, 1, 7)",
+        }
+        if period not in buckets:
+            raise ValueError(f"Unknown period: {period}")
+        self.refresh_sales_rollup()
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {buckets[period]} as period, SUM(orders) as orders, SUM(units) as units,
+                   ROUND(SUM(revenue), 2) as revenue
+            FROM sales_daily
+            WHERE day >= ? AND day <= ?
+            GROUP BY 1 ORDER BY 1
+        ''', (start or '0000-00-00', end or '9999-12-31'))
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _record_rollup(start: str = None, end: str = None):
+        """Per-record (genre, units, revenue) source for a date range, plus its parameters.
+
+        With no range the all-time totals are read directly instead of summing days.
+        """
+        if start is None and end is None:
+            return 'sales_record_totals', ()
+        return ('''(SELECT record_id, MAX(genre) as genre, SUM(units) as units, SUM(revenue) as revenue
+                     FROM sales_daily_records WHERE day >= ? AND day <= ? GROUP BY record_id)''',
+                (start or '0000-00-00', end or '9999-12-31'))
+
+    def get_top_sellers(self, start: str = None, end: str = None, limit: int = 10) -> List[Dict]:
+        """Records ranked by units sold between two dates"""
+        self.refresh_sales_rollup()
+        source, params = self._record_rollup(start, end)
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT t.record_id, COALESCE(r.artist, a.artist) as artist, COALESCE(r.album, a.album) as album,
+                   COALESCE(r.genre, a.genre) as genre, t.units, ROUND(t.revenue, 2) as revenue
+            FROM (SELECT record_id, units, revenue FROM {source} ORDER BY units DESC LIMIT ?) t
+            LEFT JOIN records r ON r.id = t.record_id
+            LEFT JOIN records_archive a ON a.id = t.record_id
+            ORDER BY t.units DESC
+        ''', params + (limit,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def get_units_by_genre(self, start: str = None, end: str = None) -> List[Dict]:
+        """Units and revenue per genre (as at the time of sale) between two dates"""
+        self.refresh_sales_rollup()
+        source, params = self._record_rollup(start, end)
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT COALESCE(NULLIF(genre, ''), 'Unknown') as genre, SUM(units) as units,
+                   ROUND(SUM(revenue), 2) as revenue
+            FROM {source}
+            GROUP BY 1 ORDER BY units DESC
+        ''', params)
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def get_sell_through(self, start: str = None, end: str = None, limit: int = 20) -> Dict:
+        """Sell-through (units sold / (units sold + stock on hand)) overall and for the best records"""
+        self.refresh_sales_rollup()
+        source, params = self._record_rollup(start, end)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT s.*, COUNT(si.id) as item_count
+            SELECT (SELECT COALESCE(SUM(units), 0) FROM sales_daily WHERE day >= ? AND day <= ?) as sold,
+                   (SELECT COALESCE(SUM(stock), 0) FROM records WHERE deleted_at IS NULL) as on_hand
+        ''', (start or '0000-00-00', end or '9999-12-31'))
+        totals = cursor.fetchone()
+        cursor.execute(f'''
+            SELECT t.record_id, r.artist, r.album, t.units as sold, r.stock,
+                   ROUND(1.0 * t.units / (t.units + MAX(r.stock, 0)), 4) as rate
+            FROM {source} t
+            JOIN records r ON r.id = t.record_id
+            WHERE r.deleted_at IS NULL
+            ORDER BY rate DESC, t.units DESC LIMIT ?
+        ''', params + (limit,))
+        rows = cursor.fetchall()
+        conn.close()
+        sold, on_hand = totals['sold'], totals['on_hand']
+        return {
+            'units_sold': sold,
+            'stock_on_hand': on_hand,
+            'rate': sold / (sold + on_hand) if sold + on_hand else 0.0,
+            'records': [dict(row) for row in rows],
+        }
+    
+    def get_units_sold_by_record(self, start: str = None, end: str = None) -> Dict[int, int]:
+        """Units sold per record between two dates (all time if neither is given)"""
+        self.refresh_sales_rollup()
+        source, params = self._record_rollup(start, end)
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT record_id, units FROM {source} WHERE units > 0', params)
+        units = dict(cursor.fetchall())
+        conn.close()
+        return units
+    
+    def get_customer_sales(self, customer_id: int, limit: int = None, after: tuple = None) -> List[Dict]:
+        """A customer's orders, newest first.
+
+        Pages are keyset-based: pass the (sale_date, id) of the last order of
+        one page as `after` to get the next, so deep pages cost the same as
+        the first.
+        """
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        conditions = ['s.customer_id = ?']
+        params = [customer_id]
+        if after:
+            conditions.append('(s.sale_date, s.id) < (?, ?)')
+            params.extend(after)
+        params.append(limit if limit is not None else -1)
+        cursor.execute(f'''
+            SELECT s.*,
+                   (SELECT COUNT(*) FROM sale_items si WHERE si.sale_id = s.id) as item_count
             FROM sales s
-            LEFT JOIN sale_items si ON s.id = si.sale_id
-            WHERE s.customer_id = ?
-            GROUP BY s.id
-            ORDER BY s.sale_date DESC
-        ''', (customer_id,))
+            WHERE {' AND '.join(conditions)}
+            ORDER BY s.sale_date DESC, s.id DESC
+            LIMIT ?
+        ''', params)
         rows = cursor.fetchall()
         conn.close()
         return [dict(row) for row in rows]
     
+    def count_customer_sales(self, customer_id: int) -> int:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM sales WHERE customer_id = ?', (customer_id,))
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    
     def get_sale_details(self, sale_id: int) -> Dict:
-        # (same as before)
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM sales WHERE id=?', (sale_id,))
@@ -628,9 +1736,11 @@ class Database:
             conn.close()
             return {}
         cursor.execute('''
-            SELECT si.*, r.artist, r.album, r.genre
+            SELECT si.*, COALESCE(r.artist, a.artist) as artist, COALESCE(r.album, a.album) as album,
+                   COALESCE(r.genre, a.genre) as genre
             FROM sale_items si
-            JOIN records r ON si.record_id = r.id
+            LEFT JOIN records r ON si.record_id = r.id
+            LEFT JOIN records_archive a ON si.record_id = a.id
             WHERE si.sale_id = ?
         ''', (sale_id,))
         items = cursor.fetchall()
@@ -639,10 +1749,178 @@ class Database:
         result['items'] = [dict(item) for item in items]
         return result
     
+    # ---------- Stock alerts ----------
+    DEFAULT_LOW_STOCK = 5
+
+    @staticmethod
+    def _threshold_sql(row: str) -> str:
+        """The threshold that applies to a records row (NEW in a trigger, or a table alias)"""
+        return f'''COALESCE(
+            (SELECT threshold FROM stock_thresholds WHERE scope = 'record:' || {row}.id),
+            (SELECT threshold FROM stock_thresholds WHERE scope = 'genre:' || {row}.genre),
+            (SELECT threshold FROM stock_thresholds WHERE scope = 'default'))'''
+
+    @staticmethod
+    def _stock_alert_upsert(rows_sql: str) -> str:
+        """INSERT raising (or updating) alerts for the rows of `rows_sql` (id, stock, threshold) at or below threshold.
+
+        A change of level (low <-> out) counts as a new alert: raised_at is reset and
+        any acknowledgement cleared.
+        """
+        return f'''
+            INSERT INTO stock_alerts (record_id, level, stock, threshold)
+            SELECT id, CASE WHEN stock <= 0 THEN 'out' ELSE 'low' END, stock, threshold
+            FROM ({rows_sql})
+            WHERE stock <= threshold
+            ON CONFLICT(record_id) DO UPDATE SET
+                stock = excluded.stock,
+                threshold = excluded.threshold,
+                raised_at = CASE WHEN level = excluded.level THEN raised_at ELSE CURRENT_TIMESTAMP END,
+                acknowledged_at = CASE WHEN level = excluded.level THEN acknowledged_at END,
+                level = excluded.level'''
+
+    def _evaluate_stock_alerts(self, cursor, condition: str = '1', params: tuple = ()):
+        """Bring the alerts of the records matching `condition` (on alias r) in line with their thresholds"""
+        cursor.execute(f'''
+            DELETE FROM stock_alerts WHERE record_id IN (
+                SELECT r.id FROM stock_alerts a CROSS JOIN records r ON r.id = a.record_id
+                WHERE {condition} AND NOT (r.deleted_at IS NULL AND IFNULL(r.stock <= {self._threshold_sql('r')}, 0)))
+        ''', params)
+        cursor.execute(self._stock_alert_upsert(
+            f"SELECT r.id AS id, r.stock AS stock, {self._threshold_sql('r')} AS threshold "
+            f"FROM records r WHERE r.deleted_at IS NULL AND {condition}"), params)
+
+    @staticmethod
+    def _threshold_scope(record_id: int = None, genre: str = None) -> str:
+        if record_id is not None and genre is not None:
+            raise ValueError("A threshold applies to a record or a genre, not both")
+        if record_id is not None:
+            return f"record:{int(record_id)}"
+        if genre is not None:
+            if not genre.strip():
+                raise ValueError("Genre cannot be empty")
+            return f"genre:{genre.strip()}"
+        return 'default'
+
+    def set_stock_threshold(self, threshold: int, record_id: int = None, genre: str = None,
+                            user_id: int = None):
+        """Alert when stock falls to `threshold` for one record, one genre, or (neither given) by default"""
+        threshold = int(threshold)
+        if threshold < 0:
+            raise ValueError("Threshold cannot be negative")
+        scope = self._threshold_scope(record_id, genre)
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                INSERT INTO stock_thresholds (scope, threshold) VALUES (?, ?)
+                ON CONFLICT(scope) DO UPDATE SET threshold = excluded.threshold
+            ''', (scope, threshold))
+            self._reevaluate_scope(cursor, record_id, genre)
+            if user_id:
+                self._write_audit(cursor, [(user_id, 'SET_STOCK_THRESHOLD', 'stock_thresholds', record_id, None,
+                                            {'scope': scope, 'threshold': threshold})])
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def clear_stock_threshold(self, record_id: int = None, genre: str = None, user_id: int = None) -> bool:
+        """Remove a record or genre threshold so the next broader one applies"""
+        scope = self._threshold_scope(record_id, genre)
+        if scope == 'default':
+            raise ValueError("The default threshold can be changed but not removed")
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('DELETE FROM stock_thresholds WHERE scope = ?', (scope,))
+            removed = cursor.rowcount > 0
+            if removed:
+                self._reevaluate_scope(cursor, record_id, genre)
+                if user_id:
+                    self._write_audit(cursor, [(user_id, 'CLEAR_STOCK_THRESHOLD', 'stock_thresholds', record_id,
+                                                {'scope': scope}, None)])
+            conn.commit()
+            return removed
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def _reevaluate_scope(self, cursor, record_id: int = None, genre: str = None):
+        if record_id is not None:
+            self._evaluate_stock_alerts(cursor, 'r.id = ?', (record_id,))
+        elif genre is not None:
+            self._evaluate_stock_alerts(cursor, 'r.genre = ?', (genre.strip(),))
+        else:
+            self._evaluate_stock_alerts(cursor)
+
+    def get_stock_thresholds(self) -> List[Dict]:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT scope, threshold FROM stock_thresholds ORDER BY scope')
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def get_stock_alerts(self, include_acknowledged: bool = False, level: str = None) -> List[Dict]:
+        """Current alerts with their record, out-of-stock first"""
+        conditions, params = [], []
+        if not include_acknowledged:
+            conditions.append('a.acknowledged_at IS NULL')
+        if level:
+            conditions.append('a.level = ?')
+            params.append(level)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT a.record_id, a.level, a.stock, a.threshold, a.raised_at, a.acknowledged_at,
+                   r.artist, r.album, r.genre, r.price
+            FROM stock_alerts a JOIN records r ON r.id = a.record_id
+            {where}
+            ORDER BY a.level = 'low', a.stock, a.record_id
+        ''', params)
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def count_stock_alerts(self) -> int:
+        """Unacknowledged alerts (for the owner's header badge)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM stock_alerts WHERE acknowledged_at IS NULL')
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+
+    def acknowledge_stock_alerts(self, record_ids: List[int] = None) -> int:
+        """Mark alerts (all open ones by default) as seen; they stay until stock recovers"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        if record_ids is None:
+            cursor.execute('UPDATE stock_alerts SET acknowledged_at = CURRENT_TIMESTAMP WHERE acknowledged_at IS NULL')
+        else:
+            cursor.execute(f'''
+                UPDATE stock_alerts SET acknowledged_at = CURRENT_TIMESTAMP
+                WHERE acknowledged_at IS NULL AND record_id {ID_LIST}
+            ''', (id_list(record_ids),))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+    
     # ---------- Statistics (unchanged) ----------
     def get_statistics(self) -> Dict:
         # (same as before, but now ignoring deleted records)
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -666,10 +1944,12 @@ class Database:
         ''')
         stats['genre_distribution'] = {row['genre']: row['count'] for row in cursor.fetchall()}
         
-        # Low stock (stock <=5 and >0)
-        cursor.execute('SELECT * FROM records WHERE stock > 0 AND stock <= 5 AND deleted_at IS NULL')
+        # Low and out of stock, as maintained in stock_alerts by the records triggers
+        cursor.execute('SELECT r.* FROM stock_alerts a JOIN records r ON r.id = a.record_id WHERE a.level = ?',
+                       ('low',))
         stats['low_stock'] = [dict(row) for row in cursor.fetchall()]
-        cursor.execute('SELECT * FROM records WHERE stock = 0 AND deleted_at IS NULL')
+        cursor.execute('SELECT r.* FROM stock_alerts a JOIN records r ON r.id = a.record_id WHERE a.level = ?',
+                       ('out',))
         stats['out_of_stock'] = [dict(row) for row in cursor.fetchall()]
         
         cursor.execute('SELECT * FROM records WHERE deleted_at IS NULL ORDER BY price DESC LIMIT 1')
@@ -693,80 +1973,86 @@ class Database:
         conn.close()
         return stats
     
+    # ---------- Batching ----------
+    def call_batch(self, calls: List[tuple], return_exceptions: bool = False) -> List:
+        """Run (method name, args, kwargs) calls in order and return their results.
+
+        Callers group calls the same way whichever backend they hold;
+        api_client.ApiDatabase sends the whole group in one request. With
+        return_exceptions a failing call's exception takes its place in the results.
+        """
+        results = []
+        for name, args, kwargs in calls:
+            try:
+                results.append(getattr(self, name)(*args, **kwargs))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
     # ---------- Export / Import / Backup ----------
-    def export_to_csv(self, filename: str, data_type: str = 'records'):
-        # (unchanged but works with current tables)
-        conn = sqlite3.connect(self.db_path)
+    EXPORT_QUERIES = {
+        'records': 'SELECT id, artist, album, genre, year, price, stock, date_added FROM records '
+                   'WHERE deleted_at IS NULL ORDER BY artist, album',
+        'customers': 'SELECT id, username, email, full_name, address, phone, registration_date, is_active, role '
+                     'FROM customers',
+        'sales': """
+            SELECT s.id, s.customer_id, s.sale_date, s.total_amount, s.status, s.shipping_address,
+                   c.username, c.email
+            FROM sales s
+            LEFT JOIN customers c ON s.customer_id = c.id
+            ORDER BY s.sale_date DESC
+        """,
+    }
+
+    def get_export_rows(self, data_type: str = 'records') -> List[Dict]:
+        """Rows export_to_csv writes, with the columns of EXPORT_FIELDS[data_type]"""
+        if data_type not in self.EXPORT_QUERIES:
+            raise ValueError(f"Unknown data type: {data_type}")
+        conn = self._connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        
-        if data_type == 'records':
-            cursor.execute('SELECT id, artist, album, genre, year, price, stock, date_added FROM records WHERE deleted_at IS NULL ORDER BY artist, album')
-            fieldnames = ['id', 'artist', 'album', 'genre', 'year', 'price', 'stock', 'date_added']
-        elif data_type == 'customers':
-            cursor.execute('SELECT id, username, email, full_name, address, phone, registration_date, is_active, role FROM customers')
-            fieldnames = ['id', 'username', 'email', 'full_name', 'address', 'phone', 'registration_date', 'is_active', 'role']
-        elif data_type == 'sales':
-            cursor.execute('''
-                SELECT s.*, c.username, c.email
-                FROM sales s
-                LEFT JOIN customers c ON s.customer_id = c.id
-                ORDER BY s.sale_date DESC
-            ''')
-            fieldnames = ['id', 'customer_id', 'sale_date', 'total_amount', 'status', 'shipping_address', 'username', 'email']
-        else:
-            conn.close()
-            raise ValueError(f"Unknown data type: {data_type}")
-        
+        cursor.execute(self.EXPORT_QUERIES[data_type])
         rows = cursor.fetchall()
         conn.close()
-        
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in rows:
-                writer.writerow(dict(row))
+        return [dict(row) for row in rows]
+
+    def export_to_csv(self, filename: str, data_type: str = 'records'):
+        write_csv_export(filename, data_type, self.get_export_rows(data_type))
     
     def import_from_csv(self, filename: str, data_type: str = 'records') -> int:
-        # (unchanged)
         imported_count = 0
-        with open(filename, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                try:
-                    if data_type == 'records':
-                        record = {
-                            'artist': row['artist'].strip(),
-                            'album': row['album'].strip(),
-                            'genre': row.get('genre', '').strip(),
-                            'year': int(row.get('year', 0)),
-                            'price': float(row['price']),
-                            'stock': int(row.get('stock', 0))
-                        }
-                        self.add_record(record)
-                        imported_count += 1
-                    elif data_type == 'customers':
-                        customer = {
-                            'username': row['username'].strip(),
-                            'password': row.get('password', 'default123'),
-                            'email': row.get('email', ''),
-                            'full_name': row.get('full_name', ''),
-                            'address': row.get('address', ''),
-                            'phone': row.get('phone', ''),
-                            'role': row.get('role', 'customer')
-                        }
-                        try:
-                            self.register_customer(customer)
-                            imported_count += 1
-                        except ValueError:
-                            continue
-                except (ValueError, KeyError):
-                    continue
+        for item in read_csv_import(filename, data_type):
+            try:
+                if data_type == 'records':
+                    self.add_record(item)
+                elif data_type == 'customers':
+                    self.register_customer(item)
+                imported_count += 1
+            except ValueError:
+                continue
         return imported_count
     
-    def backup_database(self, backup_path: str = None) -> str:
-        if backup_path is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = os.path.join(self.base_dir, f"vinylflow_backup_{timestamp}.db")
-        shutil.copy2(self.db_path, backup_path)
-        return backup_path
\ No newline at end of file
+    def backup_database(self, backup_path: str = None, compress: bool = False, keep: int = 10) -> str:
+        """Take an online, integrity-checked backup; keeps the newest `keep` backups"""
+        engine = BackupEngine(self.db_path, self.base_dir, compress=compress, keep=keep)
+        return engine.backup(backup_path)
+
+    def incremental_backup(self, full_every: int = 24, keep_chains: int = 3) -> Optional[str]:
+        """Write the changes since the last backup (or a new full base when one is due)"""
+        return IncrementalBackup(self.db_path, self.base_dir, full_every=full_every,
+                                 keep_chains=keep_chains).backup()
+
+    def restore_to_point_in_time(self, target_path: str, at: str = None) -> Dict:
+        """Rebuild the database as of `at` (UTC) from the incremental backups into target_path"""
+        return IncrementalBackup(self.db_path, self.base_dir).restore(target_path, at,
+                                                                    rebuild=self._rebuild_derived_tables)
+
+    def trim_change_log(self) -> int:
+        """Drop change_log rows no incremental backup still needs (run by the sweeper)"""
+        return IncrementalBackup(self.db_path, self.base_dir).trim_change_log()
+
+
+# Times every public method when VINYLFLOW_DB_STATS is set; leaves the class untouched otherwise
+QUERY_STATS.instrument_class(Database)
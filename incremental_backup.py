@@ -0,0 +1,396 @@
+"""
+Incremental backups and point-in-time restore for vinylflow.db.
+
+Triggers on records, records_archive, sales, sale_items, bookings,
+customers and stock_alerts append every inserted, updated or deleted row to
+a change_log table. (Python's sqlite3 module does not expose the session extension, so
+triggers are used.)
+
+A backup run then either
+  * takes a full base snapshot (through backup_engine) when there is no base
+    yet or `full_every` change-sets have been written since the last one, or
+  * writes only the change_log rows added since the previous run to a small
+    gzip'd JSON-lines change-set, then trims them from change_log,
+so backup I/O grows with the amount of change rather than the database size.
+
+The app trims change_log as it runs (trim_change_log, from the Database
+sweeper), so the log stays bounded whether or not backups are taken.
+
+restore() rebuilds the database as it was at any timestamp: it copies the
+newest base taken before that time and replays the change-sets on top.
+All timestamps are UTC, like SQLite's CURRENT_TIMESTAMP.
+
+Run:
+    python incremental_backup.py backup
+    python incremental_backup.py restore --at "2026-10-19 14:30:00" --out restored.db
+    python incremental_backup.py list
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from backup_engine import BackupEngine
+
+CHANGE_LOG_TABLES = ('records', 'records_archive', 'sales', 'sale_items', 'bookings', 'customers',
+                     'stock_alerts')
+# The key logged as row_id, for tables not keyed by id
+CHANGE_LOG_KEYS = {'stock_alerts': 'record_id'}
+MANIFEST_NAME = "vinylflow_incremental_manifest.json"
+# change_log retention: a day of changes when no backup chain reads the log; with one,
+# at most this many changes waiting for the next backup
+CHANGE_LOG_KEEP = '-1 day'
+CHANGE_LOG_MAX_ROWS = 200_000
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def install_change_log(cursor):
+    """Create the change_log table and (re)create its triggers if the tables' columns changed"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            row_data TEXT
+        )
+    ''')
+    for table in CHANGE_LOG_TABLES:
+        for name, sql in _trigger_sql(cursor, table).items():
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+            existing = cursor.fetchone()
+            if existing and existing[0] == sql:
+                continue
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(sql)
+
+
+def drop_change_log_triggers(cursor):
+    for table in CHANGE_LOG_TABLES:
+        for op in ('insert', 'update', 'delete'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {table}_changelog_{op}')
+
+
+def _table_columns(cursor, table: str) -> List[str]:
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [col[1] for col in cursor.fetchall()]
+
+
+def _trigger_sql(cursor, table: str) -> Dict[str, str]:
+    columns = _table_columns(cursor, table)
+    key = CHANGE_LOG_KEYS.get(table, 'id')
+    row_json = 'json_object(' + ', '.join(f"'{col}', NEW.{col}" for col in columns) + ')'
+    log = 'INSERT INTO change_log (table_name, op, row_id, row_data)'
+    insert_when = update_when = ''
+    if 'row_version' in columns:
+        # The row_version triggers follow every change with a version bump; log the
+        # row once, as it is after the bump
+        insert_when = 'WHEN NEW.row_version != 0 '
+        update_when = 'WHEN NEW.row_version IS NOT OLD.row_version '
+    return {
+        f'{table}_changelog_insert':
+            f"CREATE TRIGGER {table}_changelog_insert AFTER INSERT ON {table} {insert_when}"
+            f"BEGIN {log} VALUES ('{table}', 'I', NEW.{key}, {row_json}); END",
+        f'{table}_changelog_update':
+            f"CREATE TRIGGER {table}_changelog_update AFTER UPDATE ON {table} {update_when}"
+            f"BEGIN {log} VALUES ('{table}', 'U', NEW.{key}, {row_json}); END",
+        f'{table}_changelog_delete':
+            f"CREATE TRIGGER {table}_changelog_delete AFTER DELETE ON {table} "
+            f"BEGIN {log} VALUES ('{table}', 'D', OLD.{key}, NULL); END",
+    }
+
+
+def _utc_now() -> str:
+    return datetime.utcnow().strftime(TIMESTAMP_FORMAT)[:-3]
+
+
+def _last_seq(conn) -> int:
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+def _exported_seq(entries: List[Dict]) -> int:
+    """The last change_log seq the backup chain already holds"""
+    last = entries[-1]
+    return last['last_seq'] if last['type'] == 'full' else last['to_seq']
+
+
+class IncrementalBackup:
+    def __init__(self, db_path: str, backup_dir: str = None, full_every: int = 24,
+                 keep_chains: int = 3, compress: bool = True):
+        self.db_path = db_path
+        self.backup_dir = backup_dir or os.path.dirname(os.path.abspath(db_path))
+        self.full_every = full_every
+        self.keep_chains = keep_chains
+        self.compress = compress
+        self.manifest_path = os.path.join(self.backup_dir, MANIFEST_NAME)
+        self.engine = BackupEngine(db_path, self.backup_dir, compress=compress, keep=0)
+
+    def ensure_change_log(self):
+        """Install change capture on databases created before it existed"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            install_change_log(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---------- Manifest ----------
+    def load_manifest(self) -> Dict:
+        if not os.path.exists(self.manifest_path):
+            return {'entries': []}
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest: Dict):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    # ---------- Taking backups ----------
+    def backup(self) -> Optional[str]:
+        """Write a full base or a change-set, whichever is due; None if nothing changed"""
+        self.ensure_change_log()
+        manifest = self.load_manifest()
+        entries = manifest['entries']
+        fulls = [i for i, e in enumerate(entries) if e['type'] == 'full']
+        if not fulls or len(entries) - 1 - fulls[-1] >= self.full_every:
+            return self.full_backup()
+        # trim_change_log dropped changes no change-set holds; only a new base covers them
+        if manifest.get('trimmed_to_seq', 0) > _exported_seq(entries):
+            return self.full_backup()
+        return self.incremental_backup()
+
+    def full_backup(self) -> str:
+        """Snapshot the whole database as a new base"""
+        self.ensure_change_log()
+        created_at = _utc_now()
+        stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')
+        path = os.path.join(self.backup_dir, f"vinylflow_base_{stamp}.db" + ('.gz' if self.compress else ''))
+        snapshot = {}
+
+        def read_seq(snapshot_path):
+            conn = sqlite3.connect(snapshot_path)
+            try:
+                snapshot['last_seq'] = _last_seq(conn)
+            finally:
+                conn.close()
+
+        self.engine.backup(path, inspect=read_seq)
+
+        manifest = self.load_manifest()
+        manifest['entries'].append({
+            'type': 'full',
+            'file': os.path.basename(path),
+            'created_at': created_at,
+            'last_seq': snapshot['last_seq'],
+        })
+        self.save_manifest(manifest)
+        # Everything up to last_seq is inside the base now
+        self._trim_change_log(snapshot['last_seq'])
+        self._apply_retention()
+        return path
+
+    def incremental_backup(self) -> Optional[str]:
+        """Export change_log rows added since the last backup as a change-set"""
+        manifest = self.load_manifest()
+        exported = _exported_seq(manifest['entries'])
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute('''
+                SELECT seq, changed_at, table_name, op, row_id, row_data
+                FROM change_log WHERE seq > ? ORDER BY seq
+            ''', (exported,)).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return None
+
+        from_seq, to_seq = rows[0][0], rows[-1][0]
+        path = os.path.join(self.backup_dir, f"vinylflow_changes_{from_seq:010d}_{to_seq:010d}.jsonl.gz")
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            for seq, changed_at, table, op, row_id, row_data in rows:
+                data = json.loads(row_data) if row_data else None
+                f.write(json.dumps([seq, changed_at, table, op, row_id, data], separators=(',', ':')))
+                f.write('\n')
+
+        manifest['entries'].append({
+            'type': 'changes',
+            'file': os.path.basename(path),
+            'from_seq': from_seq,
+            'to_seq': to_seq,
+            'first_at': rows[0][1],
+            'last_at': rows[-1][1],
+        })
+        self.save_manifest(manifest)
+        self._trim_change_log(to_seq)
+        return path
+
+    def _trim_change_log(self, up_to_seq: int):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('DELETE FROM change_log WHERE seq <= ?', (up_to_seq,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def trim_change_log(self, max_rows: int = CHANGE_LOG_MAX_ROWS) -> int:
+        """Drop change_log rows no backup still needs; returns how many were dropped.
+
+        With no backup chain, changes older than CHANGE_LOG_KEEP go (the
+        sequence carries on, so Database.get_change_version() is unaffected).
+        With one, exported changes go, and past `max_rows` waiting changes the
+        oldest are dropped and recorded so the next backup() is a full base.
+        """
+        manifest = self.load_manifest()
+        entries = manifest['entries']
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if not entries:
+                removed = conn.execute("DELETE FROM change_log WHERE changed_at < strftime('%Y-%m-%d %H:%M:%f', "
+                                       "'now', ?)", (CHANGE_LOG_KEEP,)).rowcount
+                conn.commit()
+                return removed
+            removed = conn.execute('DELETE FROM change_log WHERE seq <= ?', (_exported_seq(entries),)).rowcount
+            cutoff = _last_seq(conn) - max_rows
+            if conn.execute('SELECT 1 FROM change_log WHERE seq <= ? LIMIT 1', (cutoff,)).fetchone():
+                # Recorded before the rows go, so a failure cannot leave an unnoticed gap
+                manifest['trimmed_to_seq'] = max(manifest.get('trimmed_to_seq', 0), cutoff)
+                self.save_manifest(manifest)
+                removed += conn.execute('DELETE FROM change_log WHERE seq <= ?', (cutoff,)).rowcount
+            conn.commit()
+            return removed
+        finally:
+            conn.close()
+
+    def _apply_retention(self):
+        """Keep the newest `keep_chains` bases and the change-sets that follow them"""
+        manifest = self.load_manifest()
+        entries = manifest['entries']
+        fulls = [i for i, e in enumerate(entries) if e['type'] == 'full']
+        if not self.keep_chains or len(fulls) <= self.keep_chains:
+            return
+        cut = fulls[-self.keep_chains]
+        for entry in entries[:cut]:
+            path = os.path.join(self.backup_dir, entry['file'])
+            if os.path.exists(path):
+                os.remove(path)
+        manifest['entries'] = entries[cut:]
+        self.save_manifest(manifest)
+
+    # ---------- Restoring ----------
+    def restore(self, target_path: str, at: str = None, rebuild=None) -> Dict:
+        """Rebuild the database as of `at` (UTC, 'YYYY-MM-DD HH:MM:SS[.fff]') into target_path.
+
+        With no `at`, everything that has been backed up is restored.
+        Replayed rows do not maintain derived tables, so `rebuild` (if given) is
+        called with a cursor on the restored database after the replay.
+        Returns a summary of the base used and the number of changes replayed.
+        """
+        if os.path.exists(target_path):
+            raise ValueError(f"Restore target already exists: {target_path}")
+        entries = self.load_manifest()['entries']
+        at = at or '9999-12-31 23:59:59.999'
+
+        base_index = None
+        for i, entry in enumerate(entries):
+            if entry['type'] == 'full' and entry['created_at'] <= at:
+                base_index = i
+        if base_index is None:
+            raise ValueError(f"No full backup was taken before {at}")
+        base = entries[base_index]
+
+        self.engine.restore(os.path.join(self.backup_dir, base['file']), target_path)
+
+        conn = sqlite3.connect(target_path)
+        replayed = 0
+        last_replayed = base['last_seq']
+        try:
+            cursor = conn.cursor()
+            drop_change_log_triggers(cursor)
+            columns = {table: set(_table_columns(cursor, table)) for table in CHANGE_LOG_TABLES}
+            for entry in entries[base_index + 1:]:
+                if entry['type'] == 'full':
+                    break
+                if entry['first_at'] > at:
+                    break
+                with gzip.open(os.path.join(self.backup_dir, entry['file']), 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        seq, changed_at, table, op, row_id, data = json.loads(line)
+                        if changed_at > at:
+                            break
+                        if seq <= last_replayed:
+                            continue
+                        self._replay(cursor, columns, table, op, row_id, data)
+                        last_replayed = seq
+                        replayed += 1
+            if rebuild:
+                rebuild(cursor)
+
+            # The restored database starts a fresh change_log that never reuses a seq
+            # already present in the manifest
+            cursor.execute('DELETE FROM change_log')
+            highest = max([e.get('to_seq', e.get('last_seq', 0)) for e in entries] + [last_replayed])
+            cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'change_log'", (highest,))
+            if cursor.rowcount == 0:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('change_log', ?)", (highest,))
+            install_change_log(cursor)
+            conn.commit()
+        finally:
+            conn.close()
+        return {'base': base['file'], 'base_created_at': base['created_at'],
+                'changes_replayed': replayed, 'last_seq': last_replayed}
+
+    @staticmethod
+    def _replay(cursor, columns: Dict, table: str, op: str, row_id: int, data: Optional[Dict]):
+        if table not in columns:
+            raise ValueError(f"Change-set refers to unknown table {table!r}")
+        if op == 'D':
+            cursor.execute(f'DELETE FROM {table} WHERE {CHANGE_LOG_KEYS.get(table, "id")} = ?', (row_id,))
+            return
+        # Only replay columns the table actually has (guards against crafted change-sets
+        # and columns dropped since)
+        names = [name for name in data if name in columns[table]]
+        placeholders = ', '.join('?' for _ in names)
+        cursor.execute(f'INSERT OR REPLACE INTO {table} ({", ".join(names)}) VALUES ({placeholders})',
+                       [data[name] for name in names])
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Incremental backups of vinylflow.db")
+    sub = parser.add_subparsers(dest='command', required=True)
+    backup = sub.add_parser('backup', help="write a change-set, or a full base when one is due")
+    backup.add_argument('--full', action='store_true', help="force a full base")
+    restore = sub.add_parser('restore', help="rebuild the database at a point in time")
+    restore.add_argument('--at', help="UTC timestamp, e.g. '2026-10-19 14:30:00' (default: latest)")
+    restore.add_argument('--out', required=True, help="path of the database to create")
+    sub.add_parser('list', help="show the backup chain")
+    args = parser.parse_args()
+
+    backups = IncrementalBackup(os.path.join(base_dir, "vinylflow.db"))
+    if args.command == 'backup':
+        path = backups.full_backup() if args.full else backups.backup()
+        print(f"Wrote {path}" if path else "No changes since the last backup")
+    elif args.command == 'restore':
+        # Through Database, which rebuilds the restored copy's stock alerts and sales rollups
+        from database import Database
+        summary = Database(base_dir).restore_to_point_in_time(args.out, args.at)
+        print(f"Restored {args.out} from {summary['base']} + {summary['changes_replayed']} changes")
+    else:
+        for entry in backups.load_manifest()['entries']:
+            if entry['type'] == 'full':
+                print(f"FULL     {entry['created_at']}  {entry['file']}")
+            else:
+                print(f"CHANGES  {entry['first_at']} .. {entry['last_at']}  "
+                      f"seq {entry['from_seq']}-{entry['to_seq']}  {entry['file']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Inventory analytics on NumPy arrays.
+
+get_statistics() answers a fixed set of questions with one SQL query each.
+InventoryAnalytics loads the live catalog (a CatalogSnapshot) and recent
+units sold into NumPy arrays once. Every metric after that is a vectorised
+pass over those arrays, so it takes milliseconds even for a million
+records:
+
+  * valuation (sum of price * stock), by genre and by decade,
+  * price percentiles,
+  * stock cover: days until a record sells out at its recent sales rate,
+  * reorder suggestions: records that will run out within the supplier
+    lead time, with the quantity needed to reach a target cover,
+  * what_if(): the same figures after a price or demand change, computed on
+    copies so the loaded data is untouched.
+
+refresh() keeps the arrays current. It applies only the records changed
+since the last load (Database.get_records_changed_since): edits are written
+in place, and additions and deletions are one np.insert / np.delete per
+batch. Units sold are re-read from the sales rollup tables.
+
+NumPy is optional for the rest of the app; this module raises RuntimeError
+on use when it is not installed (pip install numpy).
+
+    analytics = InventoryAnalytics.from_database(Database(base_dir))
+    analytics.valuation_by_genre()
+    analytics.reorder_suggestions(lead_time_days=10)
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from catalog_snapshot import CatalogSnapshot
+
+VELOCITY_DAYS = 90
+LEAD_TIME_DAYS = 14
+TARGET_COVER_DAYS = 60
+# Changed rows fetched per refresh() call
+REFRESH_BATCH_SIZE = 5000
+
+
+class InventoryAnalytics:
+    def __init__(self, snapshot: CatalogSnapshot, units_sold: Dict[int, int] = None,
+                 velocity_days: int = VELOCITY_DAYS, db=None):
+        """`units_sold` is units per record id over the last `velocity_days` days"""
+        if np is None:
+            raise RuntimeError("Inventory analytics needs NumPy: pip install numpy")
+        self.db = db
+        self.velocity_days = velocity_days
+        # Kept for artist/album labels; rows stay aligned with the arrays below
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        self.genre_names: List[Optional[str]] = []
+        self._genre_codes: Dict[Optional[str], int] = {}
+        self.ids = np.array(snapshot.ids, dtype=np.int64)
+        self.prices = np.array(snapshot.prices, dtype=np.float64)
+        self.stocks = np.array(snapshot.stocks, dtype=np.int64)
+        self.years = np.array(snapshot.years, dtype=np.int32)
+        self.genres = np.fromiter(map(self._genre_code, snapshot.genres), dtype=np.int32, count=len(snapshot))
+        self._set_units_sold(units_sold or {})
+
+    @classmethod
+    def from_database(cls, db, velocity_days: int = VELOCITY_DAYS) -> 'InventoryAnalytics':
+        return cls(db.get_catalog_snapshot(), cls._load_units_sold(db, velocity_days), velocity_days, db)
+
+    @staticmethod
+    def _load_units_sold(db, velocity_days: int) -> Dict[int, int]:
+        start = (date.today() - timedelta(days=velocity_days)).isoformat()
+        return db.get_units_sold_by_record(start)
+
+    def _genre_code(self, genre: Optional[str]) -> int:
+        code = self._genre_codes.get(genre)
+        if code is None:
+            code = self._genre_codes[genre] = len(self.genre_names)
+            self.genre_names.append(genre)
+        return code
+
+    def _set_units_sold(self, units_sold: Dict[int, int]):
+        # Kept by id (sorted) rather than by row, so it survives rows moving in refresh()
+        sold_ids = np.fromiter(units_sold.keys(), dtype=np.int64, count=len(units_sold))
+        order = np.argsort(sold_ids)
+        self._sold_ids = sold_ids[order]
+        self._sold_units = np.fromiter(units_sold.values(), dtype=np.float64, count=len(units_sold))[order]
+        self._rate = None
+
+    # ---------- Incremental refresh ----------
+    def refresh(self) -> int:
+        """Apply the records changed since the last load and re-read units sold; returns rows changed"""
+        if self.db is None:
+            raise RuntimeError("refresh() needs the analytics to be loaded with from_database()")
+        changed_total = 0
+        while True:
+            changed = self.db.get_records_changed_since(self.version, REFRESH_BATCH_SIZE)
+            self._apply_changes(changed)
+            changed_total += len(changed)
+            if len(changed) < REFRESH_BATCH_SIZE:
+                break
+        self._set_units_sold(self._load_units_sold(self.db, self.velocity_days))
+        return changed_total
+
+    def _apply_changes(self, records: List[Dict]):
+        if not records:
+            return
+        changed_ids = np.fromiter((record['id'] for record in records), dtype=np.int64, count=len(records))
+        positions = np.searchsorted(self.ids, changed_ids)
+        present = positions < len(self.ids)
+        present[present] = self.ids[positions[present]] == changed_ids[present]
+        live = np.fromiter((not record.get('deleted_at') for record in records), dtype=bool, count=len(records))
+
+        # Edits: overwrite in place
+        edited = present & live
+        for column, key in ((self.prices, 'price'), (self.stocks, 'stock'), (self.years, 'year')):
+            column[positions[edited]] = [records[i][key] or 0 for i in np.flatnonzero(edited)]
+        self.genres[positions[edited]] = [self._genre_code(records[i]['genre']) for i in np.flatnonzero(edited)]
+
+        # Deletions, then additions (positions recomputed against the shrunk arrays)
+        removed = positions[present & ~live]
+        added = np.flatnonzero(~present & live)
+        added = added[np.argsort(changed_ids[added])]
+        if len(removed):
+            self.ids, self.prices, self.stocks, self.years, self.genres = (
+                np.delete(column, removed) for column in (self.ids, self.prices, self.stocks, self.years,
+                                                          self.genres))
+        if len(added):
+            at = np.searchsorted(self.ids, changed_ids[added])
+            self.ids = np.insert(self.ids, at, changed_ids[added])
+            self.prices = np.insert(self.prices, at, [records[i]['price'] for i in added])
+            self.stocks = np.insert(self.stocks, at, [records[i]['stock'] or 0 for i in added])
+            self.years = np.insert(self.years, at, [records[i]['year'] or 0 for i in added])
+            self.genres = np.insert(self.genres, at, [self._genre_code(records[i]['genre']) for i in added])
+
+        self.snapshot.apply_changes(records)
+        self.version = max(self.version, self.snapshot.version)
+        self._rate = None
+
+    # ---------- Valuation ----------
+    def valuation(self) -> float:
+        """Stock value at current prices"""
+        return float(self.prices @ self.stocks)
+
+    def valuation_by_genre(self) -> Dict[Optional[str], float]:
+        values = np.bincount(self.genres, weights=self.prices * self.stocks, minlength=len(self.genre_names))
+        return {self.genre_names[code]: float(value) for code, value in enumerate(values) if value}
+
+    def valuation_by_decade(self) -> Dict[Optional[int], float]:
+        """Stock value per decade of release (None: year unknown)"""
+        # Bucket 0 collects unknown years; bucket n is the decade starting at year n * 10
+        buckets = np.bincount(np.where(self.years > 0, self.years // 10, 0), weights=self.prices * self.stocks)
+        return {(int(bucket) * 10 if bucket else None): float(buckets[bucket]) for bucket in np.flatnonzero(buckets)}
+
+    def price_percentiles(self, percentiles: Sequence[float] = (10, 25, 50, 75, 90)) -> Dict[float, float]:
+        if not len(self.prices):
+            return {}
+        return dict(zip(percentiles, (float(p) for p in np.percentile(self.prices, percentiles))))
+
+    # ---------- Sales velocity ----------
+    def daily_sales_rate(self, demand_factor: float = 1.0) -> 'np.ndarray':
+        """Units sold per day over the velocity window, per row"""
+        if self._rate is None:
+            # Lined up with the rows once per load or refresh
+            rate = np.zeros(len(self.ids))
+            if len(self._sold_ids):
+                at = np.minimum(np.searchsorted(self._sold_ids, self.ids), len(self._sold_ids) - 1)
+                found = self._sold_ids[at] == self.ids
+                rate[found] = self._sold_units[at[found]] / self.velocity_days
+            self._rate = rate
+        return self._rate * demand_factor
+
+    def stock_cover_days(self, demand_factor: float = 1.0) -> 'np.ndarray':
+        """Days until each row sells out at its recent rate (inf when it has not sold)"""
+        rate = self.daily_sales_rate(demand_factor)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(rate > 0, self.stocks / rate, np.inf)
+
+    def reorder_suggestions(self, lead_time_days: float = LEAD_TIME_DAYS,
+                            target_cover_days: float = TARGET_COVER_DAYS, limit: int = 50,
+                            demand_factor: float = 1.0) -> List[Dict]:
+        """Records that sell out within the lead time, soonest first, with the units to order"""
+        rate = self.daily_sales_rate(demand_factor)
+        cover = self.stock_cover_days(demand_factor)
+        due = np.flatnonzero(cover <= lead_time_days)
+        due = due[np.argsort(cover[due], kind='stable')][:limit]
+        order_units = np.ceil(rate[due] * target_cover_days - self.stocks[due]).astype(np.int64)
+        suggestions = []
+        for row, units in zip(due, order_units):
+            record = self.snapshot[int(row)]
+            suggestions.append({
+                'record_id': int(self.ids[row]),
+                'artist': record['artist'],
+                'album': record['album'],
+                'stock': int(self.stocks[row]),
+                'daily_rate': round(float(rate[row]), 3),
+                'cover_days': round(float(cover[row]), 1),
+                'order_units': max(int(units), 1),
+            })
+        return suggestions
+
+    # ---------- What-if ----------
+    def what_if(self, price_factor: float = 1.0, demand_factor: float = 1.0, genre: str = None,
+                lead_time_days: float = LEAD_TIME_DAYS) -> Dict:
+        """Valuation and reorder pressure if prices and/or demand changed (optionally one genre only)"""
+        if genre is None:
+            affected = np.ones(len(self.ids), dtype=bool)
+        else:
+            affected = self.genres == self._genre_codes.get(genre, -1)
+        prices = np.where(affected, self.prices * price_factor, self.prices)
+        rate = self.daily_sales_rate() * np.where(affected, demand_factor, 1.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cover = np.where(rate > 0, self.stocks / rate, np.inf)
+        valuation = float(prices @ self.stocks)
+        current = self.valuation()
+        return {
+            'valuation': valuation,
+            'valuation_change': valuation - current,
+            'records_affected': int(affected.sum()),
+            'reorders_due': int((cover <= lead_time_days).sum()),
+            'reorders_due_now': int((self.stock_cover_days() <= lead_time_days).sum()),
+            'units_sold_per_day': float(rate.sum()),
+        }
+
+    def summary(self) -> Dict:
+        return {
+            'total_records': int(len(self.ids)),
+            'total_stock': int(self.stocks.sum()),
+            'valuation': self.valuation(),
+            'avg_price': float(self.prices.mean()) if len(self.prices) else 0.0,
+            'out_of_stock': int((self.stocks == 0).sum()),
+        }
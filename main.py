@@ -1,15 +1,27 @@
-import tkinter as tk
+import argparse
 import os
+import socket
 import sys
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from auth_window import AuthWindow
-from record_store import RecordStoreApp
+# Imported first so the profiler (when enabled) sees every later import
+from startup_profiler import PROFILER
+
+with PROFILER.section("import tkinter"):
+    import tkinter as tk
+with PROFILER.section("import auth_window"):
+    from auth_window import AuthWindow
+from database import Database
+
+PROFILER.instrument(Database, '__init__', "Database init")
 
 class VinylFlowApp:
-    def __init__(self):
-        self.root = tk.Tk()
+    def __init__(self, backend=None):
+        # None: each window opens the local vinylflow.db; otherwise e.g. an api_client.ApiDatabase
+        self.backend = backend
+        with PROFILER.section("Tk root"):
+            self.root = tk.Tk()
         self.root.title("FirstPress Vinyl - Record Store Management")
         self.setup_window()
         self.current_app = None
@@ -31,12 +43,54 @@ class VinylFlowApp:
     def show_auth_window(self):
         for widget in self.root.winfo_children():
             widget.destroy()
-        self.current_app = AuthWindow(self.root, self.on_auth_success)
+        with PROFILER.section("AuthWindow build"):
+            self.current_app = AuthWindow(self.root, self.on_auth_success, db=self.backend)
+        self.root.after_idle(self.on_window_ready, "AuthWindow interactive")
     
     def on_auth_success(self, is_owner, user):
         for widget in self.root.winfo_children():
             widget.destroy()
-        self.current_app = RecordStoreApp(self.root, is_owner=is_owner, user=user, logout_callback=self.show_auth_window)
+        # The store UI is only needed after login, so its module is loaded on demand
+        with PROFILER.section("import record_store"):
+            from record_store import RecordStoreApp
+        with PROFILER.section("RecordStoreApp build"):
+            self.current_app = RecordStoreApp(self.root, is_owner=is_owner, user=user,
+                                              logout_callback=self.show_auth_window, db=self.backend)
+        self.root.after_idle(self.on_window_ready, "RecordStoreApp interactive")
+    
+    def on_window_ready(self, milestone):
+        PROFILER.mark(milestone)
+        PROFILER.report()
+
+def connect_backend(server_url: str, check: bool = True):
+    """ApiDatabase for a store server, checked to be reachable before the UI opens"""
+    from api_client import ApiDatabase
+    backend = ApiDatabase(server_url)
+    if not check:
+        return backend
+    try:
+        backend.server_health()
+    except OSError as e:
+        raise SystemExit(f"Cannot reach the store server at {server_url}: {e}")
+    return backend
+
+def offline_backend(primary, till_id: str):
+    """Wrap the backend so this till keeps selling from a local replica when it is unreachable"""
+    from offline_till import OfflineTill
+    primary = primary if primary is not None else Database(os.path.dirname(os.path.abspath(__file__)))
+    till = OfflineTill(primary, os.path.dirname(os.path.abspath(__file__)), till_id)
+    till.start_sync()
+    return till
 
 if __name__ == "__main__":
-    app = VinylFlowApp()
+    parser = argparse.ArgumentParser(description="FirstPress Vinyl record store")
+    parser.add_argument('--server', default=os.environ.get('VINYLFLOW_SERVER'),
+                        help="store server URL (see api_server.py); default: the local vinylflow.db")
+    parser.add_argument('--offline', action='store_true',
+                        help="keep selling from a local replica when the server or database is unreachable")
+    parser.add_argument('--till-id', default=socket.gethostname(), help="name of this till (default: host name)")
+    args = parser.parse_args()
+    backend = connect_backend(args.server, check=not args.offline) if args.server else None
+    if args.offline:
+        backend = offline_backend(backend, args.till_id)
+    app = VinylFlowApp(backend)
@@ -0,0 +1,505 @@
+"""
+Offline-first till: keeps selling when the store server or shared database is unreachable.
+
+OfflineTill wraps the till's real backend (Database or api_client.ApiDatabase)
+and has the same interface. While the primary answers, every call goes to
+it. When a call fails because the primary cannot be reached, the till
+switches to a local SQLite replica for `retry_after` seconds (then tries
+the primary again):
+
+  * catalog reads (get_all_records, search_records, get_record,
+    get_available_stock) come from the replica's copy of records;
+  * cart holds are kept in the replica;
+  * checkout_reservations / create_sale write the sale to a durable outbox
+    in the replica and return a provisional id ("pending-...");
+  * authenticate_customer / authenticate_owner check the password against
+    the replica's copy of the last successful login with that username.
+    An offline login has no server session, so after the primary is back,
+    calls that need one are refused until the user logs in again.
+
+sync() pushes queued sales to the primary in batches through
+Database.apply_offline_sales, which never refuses a sale that already left
+the shop: shortfalls are reported back as conflicts and audited as
+OFFLINE_OVERSELL. Each sale carries an op_id, so a batch that is sent twice
+is applied once. A pushed sale is still subtracted from the replica's stock
+until a pull has brought in the primary's stock after it. sync() then pulls the records that changed since the
+replica's last row_version (Database.get_records_changed_since), so
+refreshing the replica costs only the changes. start_sync() runs sync() on a
+background thread.
+
+Run with the app:
+    python main.py --offline [--server http://store:8765]
+"""
+import http.client
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from password_hasher import default_hasher
+
+RETRY_AFTER_SECONDS = 10
+SYNC_BATCH_SIZE = 50
+PULL_BATCH_SIZE = 1000
+REPLICA_COLUMNS = ('id', 'artist', 'album', 'genre', 'year', 'price', 'stock', 'date_added',
+                   'deleted_at', 'deleted_by', 'row_version')
+
+
+def is_unreachable(error: Exception) -> bool:
+    """Whether an error means the primary could not be reached (rather than refused the call)"""
+    if isinstance(error, (OSError, http.client.HTTPException)):
+        return True
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return 'unable to open' in message or 'disk i/o' in message
+    return False
+
+
+class OfflineTill:
+    def __init__(self, primary, replica_dir: str, till_id: str, retry_after: float = RETRY_AFTER_SECONDS):
+        self.primary = primary
+        self.till_id = till_id
+        self.retry_after = retry_after
+        self.replica_path = os.path.join(replica_dir, f"vinylflow_till_{till_id}.db")
+        self._offline_until = 0.0
+        self._sync_lock = threading.Lock()
+        self._syncer = None
+        self._syncer_stop = None
+        self.init_replica()
+
+    def __getattr__(self, name: str):
+        # Everything without an offline fallback goes straight to the primary
+        return getattr(self.primary, name)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.replica_path)
+        # Queued sales must survive a power cut
+        conn.execute('PRAGMA synchronous = FULL')
+        return conn
+
+    def init_replica(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog (
+                id INTEGER PRIMARY KEY,
+                artist TEXT NOT NULL,
+                album TEXT NOT NULL,
+                genre TEXT,
+                year INTEGER,
+                price REAL NOT NULL,
+                stock INTEGER DEFAULT 0,
+                date_added TIMESTAMP,
+                deleted_at TIMESTAMP,
+                deleted_by INTEGER,
+                row_version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS holds (
+                holder TEXT NOT NULL,
+                record_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL CHECK (quantity > 0),
+                PRIMARY KEY (holder, record_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                op_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                customer_id INTEGER,
+                shipping_address TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                sale_id INTEGER,
+                conflicts TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                synced_at TEXT,
+                applied_version INTEGER
+            )
+        ''')
+        if 'applied_version' not in [row[1] for row in cursor.execute('PRAGMA table_info(outbox)')]:
+            cursor.execute('ALTER TABLE outbox ADD COLUMN applied_version INTEGER')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox_items (
+                op_id TEXT NOT NULL REFERENCES outbox(op_id),
+                record_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                price REAL NOT NULL,
+                PRIMARY KEY (op_id, record_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS logins (
+                kind TEXT NOT NULL,
+                username TEXT NOT NULL,
+                password_hash TEXT NOT NULL,
+                user TEXT NOT NULL,
+                PRIMARY KEY (kind, username)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_catalog_live_order ON catalog(deleted_at, artist, album)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, created_at)')
+        # The replica's stock as the till sees it: the primary's last known stock minus sales
+        # still waiting in the outbox, and minus pushed ones whose effect (the primary's records
+        # version right after the push) has not been pulled yet
+        cursor.execute('DROP VIEW IF EXISTS local_catalog')
+        cursor.execute('''
+            CREATE VIEW local_catalog AS
+            SELECT c.id, c.artist, c.album, c.genre, c.year, c.price,
+                   c.stock - COALESCE(p.quantity, 0) AS stock,
+                   c.date_added, c.deleted_at, c.deleted_by, c.row_version
+            FROM catalog c
+            LEFT JOIN (SELECT i.record_id, SUM(i.quantity) AS quantity
+                       FROM outbox_items i JOIN outbox o ON o.op_id = i.op_id
+                       WHERE o.status = 'pending'
+                          OR o.applied_version > (SELECT value FROM sync_state WHERE name = 'records_version')
+                       GROUP BY i.record_id) p ON p.record_id = c.id
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO sync_state (name, value) VALUES ('records_version', 0)")
+        conn.commit()
+        conn.close()
+
+    # ---------- Connectivity ----------
+    @property
+    def online(self) -> bool:
+        return time.monotonic() >= self._offline_until
+
+    def _call_primary(self, name: str, *args, **kwargs):
+        """(True, result) from the primary, or (False, None) if it cannot be reached"""
+        if not self.online:
+            return False, None
+        try:
+            return True, getattr(self.primary, name)(*args, **kwargs)
+        except Exception as e:
+            if not is_unreachable(e):
+                raise
+            self._offline_until = time.monotonic() + self.retry_after
+            return False, None
+
+    # ---------- Catalog reads ----------
+    def get_all_records(self, limit: int = None, offset: int = 0, include_deleted: bool = False) -> List[Dict]:
+        ok, records = self._call_primary('get_all_records', limit, offset, include_deleted)
+        if ok:
+            return records
+        query = 'SELECT * FROM local_catalog'
+        if not include_deleted:
+            query += ' WHERE deleted_at IS NULL'
+        query += ' ORDER BY artist, album'
+        if limit:
+            query += f' LIMIT {int(limit)} OFFSET {int(offset)}'
+        return self._replica_rows(query)
+
+    def search_records(self, query: str, limit: int = 50) -> List[Dict]:
+        ok, records = self._call_primary('search_records', query, limit)
+        if ok:
+            return records
+        pattern = f'%{query}%'
+        return self._replica_rows('''
+            SELECT * FROM local_catalog
+            WHERE (artist LIKE ? OR album LIKE ? OR genre LIKE ?) AND deleted_at IS NULL
+            ORDER BY artist, album
+            LIMIT ?
+        ''', (pattern, pattern, pattern, limit))
+
+    def get_record(self, record_id: int) -> Optional[Dict]:
+        ok, record = self._call_primary('get_record', record_id)
+        if ok:
+            return record
+        rows = self._replica_rows('SELECT * FROM local_catalog WHERE id=? AND deleted_at IS NULL', (record_id,))
+        return rows[0] if rows else None
+
+    def get_available_stock(self, record_id: int, holder: str = None) -> int:
+        ok, available = self._call_primary('get_available_stock', record_id, holder)
+        if ok:
+            return available
+        conn = self._connect()
+        try:
+            return self._local_available(conn.cursor(), record_id, holder)
+        finally:
+            conn.close()
+
+    def get_records_version(self) -> int:
+        return self._versioned_call('get_records_version')
+
+    def get_records_changed_since(self, version: int, limit: int = 1000) -> List[Dict]:
+        return self._versioned_call('get_records_changed_since', version, limit)
+
+    def _versioned_call(self, name: str, *args):
+        # The replica's stock includes queued sales, which row_version knows nothing about,
+        # so offline callers are told to fall back to a full read
+        ok, result = self._call_primary(name, *args)
+        if not ok:
+            raise ConnectionError("Store server unreachable; record versions are only available from it")
+        return result
+
+    def _replica_rows(self, query: str, params: tuple = ()) -> List[Dict]:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _local_available(cursor, record_id: int, holder: str = None) -> int:
+        cursor.execute('SELECT stock FROM local_catalog WHERE id=? AND deleted_at IS NULL', (record_id,))
+        row = cursor.fetchone()
+        if not row:
+            return 0
+        cursor.execute('SELECT COALESCE(SUM(quantity), 0) FROM holds WHERE record_id=? AND holder IS NOT ?',
+                       (record_id, holder))
+        return max(row[0] - cursor.fetchone()[0], 0)
+
+    # ---------- Cart ----------
+    def reserve_stock(self, holder: str, record_id: int, quantity: int, **kwargs) -> int:
+        ok, held = self._call_primary('reserve_stock', holder, record_id, quantity, **kwargs)
+        if ok:
+            return held
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            available = self._local_available(cursor, record_id)
+            if quantity > available:
+                raise ValueError(f"Only {available} available for record {record_id}")
+            cursor.execute('''
+                INSERT INTO holds (holder, record_id, quantity) VALUES (?, ?, ?)
+                ON CONFLICT(holder, record_id) DO UPDATE SET quantity = quantity + excluded.quantity
+            ''', (holder, record_id, quantity))
+            cursor.execute('SELECT quantity FROM holds WHERE holder=? AND record_id=?', (holder, record_id))
+            held = cursor.fetchone()[0]
+            conn.commit()
+            return held
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def release_reservations(self, holder: str, record_id: int = None) -> int:
+        removed = self._release_local(holder, record_id)
+        ok, released = self._call_primary('release_reservations', holder, record_id)
+        return removed + (released if ok else 0)
+
+    def _release_local(self, holder: str, record_id: int = None) -> int:
+        conn = self._connect()
+        if record_id is None:
+            removed = conn.execute('DELETE FROM holds WHERE holder=?', (holder,)).rowcount
+        else:
+            removed = conn.execute('DELETE FROM holds WHERE holder=? AND record_id=?', (holder, record_id)).rowcount
+        conn.commit()
+        conn.close()
+        return removed
+
+    def get_reservations(self, holder: str) -> List[Dict]:
+        ok, holds = self._call_primary('get_reservations', holder)
+        local = self._replica_rows('SELECT holder, record_id, quantity FROM holds WHERE holder=?', (holder,))
+        return (holds if ok else []) + local
+
+    def checkout_reservations(self, holder: str, customer_id: int, items: List[Dict],
+                              shipping_address: str = ""):
+        """Sale id from the primary, or a provisional "pending-..." id when queued offline"""
+        if not items:
+            raise ValueError("Sale must contain at least one item")
+        ok, sale_id = self._call_primary('checkout_reservations', holder, customer_id, items, shipping_address)
+        if not ok:
+            sale_id = self._queue_sale(customer_id, items, shipping_address, holder)
+        self._release_local(holder)
+        return sale_id
+
+    def create_sale(self, customer_id: int, items: List[Dict], shipping_address: str = ""):
+        if not items:
+            raise ValueError("Sale must contain at least one item")
+        ok, sale_id = self._call_primary('create_sale', customer_id, items, shipping_address)
+        return sale_id if ok else self._queue_sale(customer_id, items, shipping_address)
+
+    # ---------- Logins ----------
+    def authenticate_customer(self, username: str, password: str) -> Optional[Dict]:
+        return self._login('authenticate_customer', username, password)
+
+    def authenticate_owner(self, username: str, password: str) -> Optional[Dict]:
+        return self._login('authenticate_owner', username, password)
+
+    def _login(self, name: str, username: str, password: str) -> Optional[Dict]:
+        """Log in on the primary and remember the login; offline, check it against what was remembered"""
+        ok, user = self._call_primary(name, username, password)
+        hasher = default_hasher()
+        if ok:
+            if user:
+                cached = {k: v for k, v in user.items() if k not in ('session_token', 'password_hash')}
+                conn = self._connect()
+                conn.execute('INSERT OR REPLACE INTO logins (kind, username, password_hash, user) VALUES (?, ?, ?, ?)',
+                             (name, username, hasher.hash(password), json.dumps(cached, default=str)))
+                conn.commit()
+                conn.close()
+            return user
+        rows = self._replica_rows('SELECT password_hash, user FROM logins WHERE kind=? AND username=?',
+                                  (name, username))
+        if not rows:
+            hasher.dummy_verify(password)
+            return None
+        if not hasher.verify(password, rows[0]['password_hash']):
+            return None
+        return json.loads(rows[0]['user'])
+
+    # ---------- Outbox ----------
+    def _queue_sale(self, customer_id: int, items: List[Dict], shipping_address: str,
+                    holder: str = None) -> str:
+        """Write the sale to the outbox in one durable transaction; returns its provisional id"""
+        op_id = uuid.uuid4().hex
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            rows = []
+            for item in items:
+                record_id, quantity = item['record_id'], item['quantity']
+                cursor.execute('SELECT price FROM local_catalog WHERE id=?', (record_id,))
+                record = cursor.fetchone()
+                if not record:
+                    raise ValueError(f"Record {record_id} not found")
+                if self._local_available(cursor, record_id, holder) < quantity:
+                    raise ValueError(f"Insufficient stock for record {record_id}")
+                rows.append((op_id, record_id, quantity, record[0]))
+            # UTC, like the primary's CURRENT_TIMESTAMP
+            cursor.execute('''
+                INSERT INTO outbox (op_id, created_at, customer_id, shipping_address)
+                VALUES (?, ?, ?, ?)
+            ''', (op_id, datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), customer_id, shipping_address))
+            cursor.executemany('INSERT INTO outbox_items (op_id, record_id, quantity, price) VALUES (?, ?, ?, ?)',
+                               rows)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+        return f"pending-{op_id[:8]}"
+
+    def get_outbox(self, status: str = None) -> List[Dict]:
+        """Queued sales (optionally only one status: pending or synced), oldest first"""
+        query = 'SELECT * FROM outbox'
+        params = ()
+        if status:
+            query += ' WHERE status = ?'
+            params = (status,)
+        sales = self._replica_rows(query + ' ORDER BY created_at', params)
+        for sale in sales:
+            sale['conflicts'] = json.loads(sale['conflicts'] or '[]')
+            sale['items'] = self._replica_rows('SELECT record_id, quantity, price FROM outbox_items WHERE op_id=?',
+                                               (sale['op_id'],))
+        return sales
+
+    # ---------- Sync ----------
+    def sync(self) -> Dict:
+        """Push queued sales, then pull catalog changes; stops early if the primary is unreachable"""
+        with self._sync_lock:
+            summary = {'pushed': 0, 'conflicts': [], 'pulled': 0, 'online': True}
+            try:
+                self._push_outbox(summary)
+                self._pull_catalog(summary)
+            except Exception as e:
+                if not is_unreachable(e):
+                    raise
+                self._offline_until = time.monotonic() + self.retry_after
+                summary['online'] = False
+            else:
+                # The primary answered, so stop waiting out the retry interval
+                self._offline_until = 0.0
+            return summary
+
+    def _push_outbox(self, summary: Dict):
+        while True:
+            batch = self._replica_rows('''
+                SELECT op_id, customer_id, shipping_address, created_at AS sale_date FROM outbox
+                WHERE status = 'pending' ORDER BY created_at LIMIT ?
+            ''', (SYNC_BATCH_SIZE,))
+            if not batch:
+                return
+            for sale in batch:
+                sale['items'] = self._replica_rows(
+                    'SELECT record_id, quantity, price FROM outbox_items WHERE op_id=?', (sale['op_id'],))
+            try:
+                results = self.primary.apply_offline_sales(batch, till_id=self.till_id)
+                # Covers the stock these sales took; until a pull reaches it they stay subtracted locally
+                applied_version = self.primary.get_records_version()
+            except Exception as e:
+                self._record_push_failure([sale['op_id'] for sale in batch], e)
+                raise
+            conn = self._connect()
+            conn.executemany('''
+                UPDATE outbox SET status = 'synced', sale_id = ?, conflicts = ?, attempts = attempts + 1,
+                                  last_error = NULL, synced_at = ?, applied_version = ?
+                WHERE op_id = ?
+            ''', [(result['sale_id'], json.dumps(result['conflicts']),
+                   datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), applied_version, result['op_id'])
+                  for result in results])
+            conn.commit()
+            conn.close()
+            summary['pushed'] += len(results)
+            summary['conflicts'].extend(conflict for result in results for conflict in result['conflicts'])
+
+    def _record_push_failure(self, op_ids: List[str], error: Exception):
+        conn = self._connect()
+        conn.executemany('UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE op_id = ?',
+                         [(str(error), op_id) for op_id in op_ids])
+        conn.commit()
+        conn.close()
+
+    def _pull_catalog(self, summary: Dict):
+        conn = self._connect()
+        version = conn.execute("SELECT value FROM sync_state WHERE name = 'records_version'").fetchone()[0]
+        conn.close()
+        while True:
+            records = self.primary.get_records_changed_since(version, PULL_BATCH_SIZE)
+            if not records:
+                return
+            version = max(record['row_version'] for record in records)
+            conn = self._connect()
+            conn.executemany(
+                f"INSERT OR REPLACE INTO catalog ({', '.join(REPLICA_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in REPLICA_COLUMNS)})",
+                [tuple(record.get(column) for column in REPLICA_COLUMNS) for record in records])
+            conn.execute("UPDATE sync_state SET value = ? WHERE name = 'records_version'", (version,))
+            conn.commit()
+            conn.close()
+            summary['pulled'] += len(records)
+            if len(records) < PULL_BATCH_SIZE:
+                return
+
+    def start_sync(self, interval_seconds: float = 30):
+        """Sync from a background daemon thread until stopped (the first run starts at once)"""
+        if self._syncer and self._syncer.is_alive():
+            return
+        self._syncer_stop = threading.Event()
+
+        def run(stop):
+            while True:
+                try:
+                    self.sync()
+                except Exception:
+                    # Refused by the primary or replica busy; try again next round
+                    pass
+                if stop.wait(interval_seconds):
+                    return
+
+        self._syncer = threading.Thread(target=run, args=(self._syncer_stop,), name="offline-till-sync",
+                                        daemon=True)
+        self._syncer.start()
+
+    def stop_sync(self):
+        if self._syncer_stop:
+            self._syncer_stop.set()
+        self._syncer = None
@@ -0,0 +1,233 @@
+"""
+Password hashing for customer accounts.
+
+Hashes are stored as self-describing strings, so the algorithm or its cost
+can change without a schema migration:
+
+    pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+    scrypt$<n>$<r>$<p>$<salt hex>$<hash hex>
+
+Unsalted SHA-256 hex digests written by older versions are still accepted,
+and needs_rehash() flags them (and hashes made with a lower cost) so they can
+be upgraded on the next successful login.
+
+The hasher is picked from the environment by default_hasher():
+    VINYLFLOW_PASSWORD_HASHER   pbkdf2 (default) or scrypt
+    VINYLFLOW_HASH_COST         PBKDF2 iterations, or log2(n) for scrypt
+"""
+import abc
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_PBKDF2_ITERATIONS = 600_000
+DEFAULT_SCRYPT_LOG_N = 14
+
+
+def _is_legacy_sha256(encoded: str) -> bool:
+    return len(encoded) == 64 and '$' not in encoded
+
+
+class PasswordHasher(abc.ABC):
+    """Base class for the salted KDF hashers below; subclasses must implement both hooks"""
+    algorithm = ''
+
+    def __init__(self, salt_bytes: int = 16):
+        self.salt_bytes = salt_bytes
+        self._dummy_hash = None
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(self.salt_bytes)
+        return self._encode(salt, self._derive(password, salt, self._params()))
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """Check a password against any supported encoding in constant time"""
+        if not encoded:
+            return False
+        if _is_legacy_sha256(encoded):
+            digest = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(digest, encoded)
+        algorithm = encoded.split('$', 1)[0]
+        hasher = HASHERS.get(algorithm)
+        if hasher is None:
+            return False
+        try:
+            params, salt, expected = hasher._decode(encoded)
+        except ValueError:
+            return False
+        return hmac.compare_digest(hasher._derive(password, salt, params), expected)
+
+    def dummy_verify(self, password: str):
+        """Do the work of one verification, for logins with an unknown username"""
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(secrets.token_hex(16))
+        self.verify(password, self._dummy_hash)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        """True if the hash uses another algorithm or a different cost than this hasher"""
+        if not encoded or not encoded.startswith(self.algorithm + '$'):
+            return True
+        try:
+            params, salt, _ = self._decode(encoded)
+        except ValueError:
+            return True
+        return params != self._params() or len(salt) < self.salt_bytes
+
+    # Subclass hooks
+    @abc.abstractmethod
+    def _params(self) -> tuple:
+        """The cost parameters stored in the hash, e.g. (iterations,)"""
+
+    @abc.abstractmethod
+    def _derive(self, password: str, salt: bytes, params: tuple) -> bytes:
+        """The derived key for a password, salt and cost parameters"""
+
+    def _encode(self, salt: bytes, derived: bytes) -> str:
+        fields = [self.algorithm] + [str(p) for p in self._params()] + [salt.hex(), derived.hex()]
+        return '$'.join(fields)
+
+    def _decode(self, encoded: str):
+        parts = encoded.split('$')
+        count = len(self._params())
+        if len(parts) != count + 3 or parts[0] != self.algorithm:
+            raise ValueError("Malformed password hash")
+        params = tuple(int(p) for p in parts[1:1 + count])
+        return params, bytes.fromhex(parts[-2]), bytes.fromhex(parts[-1])
+
+
+class Pbkdf2Hasher(PasswordHasher):
+    algorithm = 'pbkdf2_sha256'
+
+    def __init__(self, iterations: int = DEFAULT_PBKDF2_ITERATIONS, salt_bytes: int = 16):
+        super().__init__(salt_bytes)
+        self.iterations = iterations
+
+    def _params(self) -> tuple:
+        return (self.iterations,)
+
+    def _derive(self, password: str, salt: bytes, params: tuple) -> bytes:
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params[0])
+
+
+class ScryptHasher(PasswordHasher):
+    algorithm = 'scrypt'
+
+    def __init__(self, n: int = 2 ** DEFAULT_SCRYPT_LOG_N, r: int = 8, p: int = 1, salt_bytes: int = 16):
+        super().__init__(salt_bytes)
+        self.n, self.r, self.p = n, r, p
+
+    def _params(self) -> tuple:
+        return (self.n, self.r, self.p)
+
+    def _derive(self, password: str, salt: bytes, params: tuple) -> bytes:
+        n, r, p = params
+        # scrypt needs about 128 * n * r * p bytes; leave headroom over hashlib's 32 MiB default
+        maxmem = 2 * 128 * n * r * p + 1024 * 1024
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=32)
+
+
+# Used by verify() to check hashes written by any configured hasher
+HASHERS = {
+    Pbkdf2Hasher.algorithm: Pbkdf2Hasher(),
+    ScryptHasher.algorithm: ScryptHasher(),
+}
+
+
+def default_hasher() -> PasswordHasher:
+    """Build the hasher configured through the environment"""
+    name = os.environ.get('VINYLFLOW_PASSWORD_HASHER', 'pbkdf2').lower()
+    cost = os.environ.get('VINYLFLOW_HASH_COST')
+    if name == 'scrypt':
+        return ScryptHasher(n=2 ** int(cost)) if cost else ScryptHasher()
+    return Pbkdf2Hasher(iterations=int(cost)) if cost else Pbkdf2Hasher()
+
+
+class AuthSessionCache:
+    """Remembers recent successful logins so repeat logins skip the slow KDF.
+
+    Entries are keyed by an HMAC of username and password under a random
+    per-process key, so neither the password nor anything usable offline is
+    kept in memory. An entry only matches while the customer's stored password
+    hash is unchanged. Each entry also carries a session token that can be
+    exchanged for the customer id until it expires.
+    """
+
+    def __init__(self, ttl_seconds: float = 900, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._key = secrets.token_bytes(32)
+        self._by_credentials: Dict[bytes, Dict] = {}
+        self._by_token: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _credential_key(self, username: str, password: str) -> bytes:
+        message = username.encode() + b'\0' + password.encode()
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def lookup(self, username: str, password: str, password_hash: str) -> Optional[str]:
+        """Return the session token for a cached login, or None on a miss"""
+        key = self._credential_key(username, password)
+        with self._lock:
+            entry = self._by_credentials.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] < time.monotonic() or \
+                    not hmac.compare_digest(entry['password_hash'], password_hash or ''):
+                self._drop(entry)
+                return None
+            return entry['token']
+
+    def store(self, username: str, password: str, customer_id: int, password_hash: str) -> str:
+        """Cache a verified login and return its session token"""
+        key = self._credential_key(username, password)
+        entry = {
+            'key': key,
+            'token': secrets.token_urlsafe(32),
+            'customer_id': customer_id,
+            'password_hash': password_hash,
+            'expires': time.monotonic() + self.ttl_seconds,
+        }
+        with self._lock:
+            old = self._by_credentials.get(key)
+            if old:
+                self._drop(old)
+            if len(self._by_credentials) >= self.max_entries:
+                # Evict the entry closest to expiry
+                self._drop(min(self._by_credentials.values(), key=lambda e: e['expires']))
+            self._by_credentials[key] = entry
+            self._by_token[entry['token']] = entry
+        return entry['token']
+
+    def resume(self, token: str) -> Optional[Dict]:
+        """Return {'customer_id', 'password_hash'} for a live token, else None"""
+        with self._lock:
+            entry = self._by_token.get(token)
+            if entry is None:
+                return None
+            if entry['expires'] < time.monotonic():
+                self._drop(entry)
+                return None
+            return {'customer_id': entry['customer_id'], 'password_hash': entry['password_hash']}
+
+    def invalidate(self, token: str = None, customer_id: int = None):
+        """Forget one token, every session of a customer, or (no arguments) everything"""
+        with self._lock:
+            if token is None and customer_id is None:
+                self._by_credentials.clear()
+                self._by_token.clear()
+                return
+            for entry in list(self._by_token.values()):
+                if entry['token'] == token or (customer_id is not None and entry['customer_id'] == customer_id):
+                    self._drop(entry)
+
+    def _drop(self, entry: Dict):
+        self._by_credentials.pop(entry['key'], None)
+        self._by_token.pop(entry['token'], None)
+
+
+# Shared by every Database in the process (the auth screen and the store UI each make one)
+AUTH_SESSIONS = AuthSessionCache()
@@ -0,0 +1,270 @@
+"""
+EXPLAIN QUERY PLAN audit of every statement Database issues.
+
+Runs a workload that calls each public Database method against a copy of a
+large database (by default the one seed_demo_data.py --generate builds),
+captures every SQL statement through Database.trace_callback, and runs
+EXPLAIN QUERY PLAN on each distinct statement. Plans that scan a whole
+table or index (SCAN ...) or sort through a temporary B-tree
+(USE TEMP B-TREE ...) are flagged.
+
+Flagged plans that are accepted (small tables, aggregate queries) are kept
+in query_plan_baseline.json. Any flagged plan that is not in the baseline
+is a regression: it is reported and the script exits with status 1, so it
+can gate CI. Plans depend on the data and its ANALYZE statistics, so keep
+the baseline in step with the generator's defaults.
+
+Run:
+    python seed_demo_data.py --generate          # once, builds generated/vinylflow.db
+    python query_plan_audit.py [--verbose]
+    python query_plan_audit.py --update-baseline # accept the current plans
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from database import Database
+from query_stats import normalize_sql
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_DIR = os.path.join(BASE_DIR, "generated")
+DEFAULT_BASELINE = os.path.join(BASE_DIR, "query_plan_baseline.json")
+DATABASE_FILE = os.path.join(BASE_DIR, "database.py")
+AUDITED_VERBS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+def flag_plan(plan: List[str]) -> List[str]:
+    """The plan steps worth flagging: full scans and temp B-tree sorts"""
+    flagged = []
+    for detail in plan:
+        # json_each walks the bound id list, not a table
+        if detail.startswith(('SCAN CONSTANT ROW', 'SCAN json_each')):
+            continue
+        if detail.startswith('SCAN '):
+            flagged.append(detail)
+        elif 'TEMP B-TREE' in detail:
+            flagged.append(detail)
+    return flagged
+
+
+class StatementCapture:
+    """Trace callback that records each distinct statement and the Database method that ran it"""
+
+    def __init__(self):
+        self.statements: Dict[str, Dict] = {}
+
+    def __call__(self, sql: str):
+        if sql.startswith('--') or not sql.lstrip().upper().startswith(AUDITED_VERBS):
+            return
+        method = self._calling_method()
+        key = f"{method}: {normalize_sql(sql)}"
+        entry = self.statements.setdefault(key, {'method': method, 'sql': sql, 'calls': 0})
+        entry['calls'] += 1
+
+    @staticmethod
+    def _calling_method() -> str:
+        frame = sys._getframe(2)
+        while frame is not None:
+            code = frame.f_code
+            if os.path.abspath(code.co_filename) == DATABASE_FILE and code.co_name != '_connect':
+                return code.co_name
+            frame = frame.f_back
+        return '<unknown>'
+
+
+def run_workload(db: Database, work_dir: str):
+    """Call every public Database method that touches SQL with realistic arguments"""
+    conn = sqlite3.connect(db.db_path)
+    record_id = conn.execute('SELECT id FROM records WHERE deleted_at IS NULL ORDER BY id LIMIT 1').fetchone()[0]
+    deleted_id = conn.execute('SELECT id FROM records WHERE deleted_at IS NOT NULL LIMIT 1').fetchone()
+    customer = conn.execute('SELECT id, username FROM customers ORDER BY id LIMIT 1').fetchone()
+    artist_id = conn.execute('SELECT id FROM artists ORDER BY id LIMIT 1').fetchone()[0]
+    booking_id = conn.execute('SELECT id FROM bookings ORDER BY id LIMIT 1').fetchone()[0]
+    sale_id = conn.execute('SELECT id FROM sales ORDER BY id DESC LIMIT 1').fetchone()[0]
+    conn.close()
+    customer_id, username = customer
+    now = datetime.now()
+
+    # Reads
+    db.get_record(record_id)
+    db.get_all_records()
+    db.get_all_records(limit=100, offset=200)
+    db.get_all_records(limit=100, include_deleted=True)
+    db.get_deleted_records()
+    deleted_page = db.get_deleted_records(50)
+    if deleted_page:
+        db.get_deleted_records(50, (deleted_page[-1]['deleted_at'], deleted_page[-1]['id']))
+    db.get_deleted_records(50, search='blue', deleted_from='2024-01-01', deleted_to='2025-12-31')
+    db.count_deleted_records()
+    db.count_deleted_records('blue', '2024-01-01', '2025-12-31')
+    db.search_records('blue')
+    db.get_artist_names()
+    db.get_change_version()
+    db.get_records_version()
+    db.get_catalog_snapshot()
+    db.get_records_changed_since(0, 100)
+    db.get_artist_by_customer_id(customer_id)
+    db.get_artist_by_id(artist_id)
+    db.get_all_artists()
+    db.get_available_slots(now, now + timedelta(days=7))
+    db.get_booked_slots(now, now + timedelta(days=7))
+    db.get_artist_bookings(artist_id)
+    db.get_all_bookings()
+    db.get_customer_by_username(username)
+    db.get_customer_by_id(customer_id)
+    db.get_customer_sales(customer_id)
+    db.get_sale_details(sale_id)
+    db.get_statistics()
+    db.get_available_stock(record_id)
+    for period in ('day', 'week', 'month'):
+        db.get_revenue_report(period, '2025-01-01', '2025-12-31')
+    for bounds in ((), ('2025-01-01', '2025-03-31')):
+        db.get_top_sellers(*bounds)
+        db.get_units_by_genre(*bounds)
+        db.get_sell_through(*bounds)
+        db.get_units_sold_by_record(*bounds)
+    db.export_to_csv(os.path.join(work_dir, 'records.csv'), 'records')
+    db.export_to_csv(os.path.join(work_dir, 'sales.csv'), 'sales')
+
+    # Writes
+    new_id = db.add_record({'artist': 'Plan Audit', 'album': 'Explain', 'genre': 'Rock',
+                            'year': 2024, 'price': 20.0, 'stock': 5}, user_id=1)
+    db.update_record(new_id, {'price': 21.0}, user_id=1)
+    db.bulk_update_records([record_id, new_id], 'adjust_stock', 1, user_id=1)
+    db.delete_record(new_id, user_id=1)
+    db.restore_record(deleted_id[0] if deleted_id else new_id, user_id=1)
+    db.archive_deleted_records(0, user_id=1)
+    archived = [record for record in db.get_deleted_records() if record['archived']]
+    if archived:
+        db.restore_record(archived[0]['id'], user_id=1)
+        db.restore_records([record['id'] for record in archived[1:20]], user_id=1)
+    new_customer = db.register_customer({'username': 'plan_audit_user', 'password': 'audit-pass',
+                                         'email': 'audit@example.com', 'full_name': 'Plan Audit'})
+    db.authenticate_customer('plan_audit_user', 'audit-pass')
+    new_artist = db.register_artist(new_customer, {'stage_name': 'Plan Audit', 'genre': 'Rock'})
+    new_booking = db.create_booking(new_artist, now + timedelta(days=3), 60, "audit", user_id=1)
+    db.update_booking_status(new_booking, 'confirmed', user_id=1)
+    db.update_booking_status(booking_id, 'confirmed', user_id=1)
+    db.delete_artist(new_artist)
+    db.reserve_stock('plan-audit', record_id, 1)
+    db.get_reservations('plan-audit')
+    db.checkout_reservations('plan-audit', customer_id, [{'record_id': record_id, 'quantity': 1}], "Audit")
+    db.reserve_stock('plan-audit', record_id, 1)
+    db.release_reservations('plan-audit', record_id)
+    db.release_reservations('plan-audit')
+    db.expire_reservations()
+    db.create_sale(customer_id, [{'record_id': record_id, 'quantity': 1}], "Audit")
+    db.set_stock_threshold(3, record_id=record_id, user_id=1)
+    db.set_stock_threshold(8, genre='Rock', user_id=1)
+    db.set_stock_threshold(5, user_id=1)
+    db.clear_stock_threshold(record_id=record_id, user_id=1)
+    db.get_stock_thresholds()
+    db.get_stock_alerts()
+    db.get_stock_alerts(include_acknowledged=True, level='out')
+    db.count_stock_alerts()
+    db.acknowledge_stock_alerts([record_id])
+    db.acknowledge_stock_alerts()
+    offline_sale = {'op_id': 'plan-audit-op', 'customer_id': customer_id, 'shipping_address': "Audit",
+                    'sale_date': '2025-06-01 12:00:00', 'items': [{'record_id': record_id, 'quantity': 10 ** 6}]}
+    db.apply_offline_sales([offline_sale], till_id='plan-audit')
+    db.apply_offline_sales([offline_sale], till_id='plan-audit')
+
+
+def explain(db_path: str, statements: Dict[str, Dict]) -> Dict[str, Dict]:
+    conn = sqlite3.connect(db_path)
+    results = {}
+    for key, entry in sorted(statements.items()):
+        try:
+            plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + entry['sql'])]
+        except sqlite3.Error as e:
+            plan = [f"<could not explain: {e}>"]
+        results[key] = dict(entry, plan=plan, flagged=flag_plan(plan))
+    conn.close()
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, List[str]]):
+    """Split flagged plans into regressions (not in the baseline) and fixed baseline entries"""
+    regressions, fixed = {}, {}
+    for key, result in results.items():
+        new = [f for f in result['flagged'] if f not in baseline.get(key, [])]
+        if new:
+            regressions[key] = new
+    for key, accepted in baseline.items():
+        gone = [f for f in accepted if f not in results.get(key, {}).get('flagged', [])]
+        if gone and key in results:
+            fixed[key] = gone
+    return regressions, fixed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit the query plans of every Database statement")
+    parser.add_argument('--db-dir', default=DEFAULT_DB_DIR,
+                        help="directory holding the vinylflow.db to audit against (copied, never modified)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help="accept the current flagged plans")
+    parser.add_argument('--json-out', help="save every statement and plan as JSON")
+    parser.add_argument('--verbose', action='store_true', help="print every plan, not just flagged ones")
+    args = parser.parse_args()
+
+    source = os.path.join(args.db_dir, "vinylflow.db")
+    if not os.path.exists(source):
+        raise SystemExit(f"{source} not found; build it with: python seed_demo_data.py --generate")
+
+    with tempfile.TemporaryDirectory(prefix="vinylflow_plans_") as work_dir:
+        shutil.copy2(source, os.path.join(work_dir, "vinylflow.db"))
+        db = Database(work_dir)
+        capture = StatementCapture()
+        db.trace_callback = capture
+        run_workload(db, work_dir)
+        db.trace_callback = None
+        results = explain(db.db_path, capture.statements)
+
+    flagged = {key: r['flagged'] for key, r in results.items() if r['flagged']}
+    print(f"Audited {len(results)} distinct statements; {len(flagged)} have flagged plans")
+    if args.verbose:
+        for key, result in results.items():
+            print(f"\n{key}")
+            for detail in result['plan']:
+                print(f"    {'!' if detail in result['flagged'] else ' '} {detail}")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(flagged, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions, fixed = compare(results, baseline)
+
+    for key, details in fixed.items():
+        print(f"\nIMPROVED (remove from baseline with --update-baseline): {key}")
+        for detail in details:
+            print(f"    - {detail}")
+    for key, details in regressions.items():
+        print(f"\nREGRESSION: {key}")
+        for detail in details:
+            print(f"    ! {detail}")
+
+    if regressions:
+        print(f"\n{len(regressions)} statement(s) have full scans or temp B-tree sorts not in the baseline")
+        return 1
+    print("No query plan regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
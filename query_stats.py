@@ -0,0 +1,349 @@
+"""
+Opt-in latency instrumentation for the Database layer.
+
+When enabled, every public Database method and every SQL statement run on
+Database connections is timed. Per method and per statement it keeps the
+call count, total/avg/p95 time and rows returned. Statements slower than
+a threshold are appended to a slow-query log together with the SQL and
+the shape of its bound parameters (types only, never values).
+
+Enable with environment variables:
+    VINYLFLOW_DB_STATS=1                  turn instrumentation on
+    VINYLFLOW_SLOW_QUERY_MS=50            slow-query threshold in ms
+    VINYLFLOW_SLOW_QUERY_LOG=path         slow-query log (default vinylflow_slow_queries.log)
+    VINYLFLOW_DB_STATS_OUT=path           stats saved here at exit (default vinylflow_db_stats.json)
+
+The numbers show in the owner's Diagnostics tab while enabled. A saved
+dump can be printed with:
+    python query_stats.py [vinylflow_db_stats.json]
+
+When disabled nothing is wrapped: Database methods are the plain
+functions and connections are plain sqlite3 connections.
+"""
+import atexit
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import wraps
+from typing import Dict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLES_KEPT = 1000
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement text with literals replaced by ? and whitespace collapsed"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def parameter_shape(parameters) -> str:
+    """Types of bound parameters, e.g. '(int, str)' or '{name: str}'"""
+    if parameters is None:
+        return '()'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + '}'
+    return '(' + ', '.join(type(v).__name__ for v in parameters) + ')'
+
+
+class _Timing:
+    """Counters for one method or statement"""
+    __slots__ = ('calls', 'total_ms', 'max_ms', 'rows', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=SAMPLES_KEPT)
+
+    def add(self, ms: float, rows: int = 0):
+        self.calls += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.rows += rows
+        self.samples.append(ms)
+
+    def summary(self) -> Dict:
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else 0.0
+        return {
+            'calls': self.calls,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'p95_ms': round(p95, 3),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+        }
+
+
+class _StatementCall:
+    """One execution of a statement, closed when its cursor moves on or is closed"""
+    __slots__ = ('sql', 'shape', 'method', 'ms', 'rows')
+
+    def __init__(self, sql, shape, method):
+        self.sql = sql
+        self.shape = shape
+        self.method = method
+        self.ms = 0.0
+        self.rows = 0
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times execute and the fetches that follow it (SQLite does most of a query's work while fetching)"""
+
+    def execute(self, sql, parameters=()):
+        return self._timed_execute(super().execute, sql, parameters, parameter_shape(parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        shape = f"{len(seq_of_parameters)} x {parameter_shape(seq_of_parameters[0]) if seq_of_parameters else '()'}"
+        return self._timed_execute(super().executemany, sql, seq_of_parameters, shape)
+
+    def _timed_execute(self, run, sql, parameters, shape):
+        self._finish()
+        stats = self.connection.stats
+        call = _StatementCall(sql, shape, stats.current_method())
+        start = time.perf_counter()
+        try:
+            return run(sql, parameters)
+        finally:
+            call.ms = (time.perf_counter() - start) * 1000
+            self._call = call
+            self.connection.open_cursors.add(self)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone, single=True)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(lambda: super(InstrumentedCursor, self).fetchmany(size or self.arraysize))
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def _timed_fetch(self, fetch, single=False):
+        start = time.perf_counter()
+        result = fetch()
+        call = getattr(self, '_call', None)
+        if call is not None:
+            call.ms += (time.perf_counter() - start) * 1000
+            call.rows += (result is not None) if single else len(result)
+        return result
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _finish(self):
+        call = getattr(self, '_call', None)
+        if call is not None:
+            self._call = None
+            if call.rows == 0 and self.rowcount > 0:
+                # INSERT/UPDATE/DELETE: rows affected
+                call.rows = self.rowcount
+            self.connection.stats.record_statement(call)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    stats = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.open_cursors = set()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def close(self):
+        for cursor in list(self.open_cursors):
+            cursor._finish()
+        self.open_cursors.clear()
+        super().close()
+
+
+class QueryStats:
+    def __init__(self, enabled: bool = False, slow_ms: float = 50.0, slow_log_path: str = None,
+                 output_path: str = None):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.slow_log_path = slow_log_path
+        self.output_path = output_path
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.methods: Dict[str, _Timing] = {}
+        self.statements: Dict[str, _Timing] = {}
+        self.slow_queries = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Each QueryStats gets its own connection class so connections know where to report
+        self._connection_class = type('StatsConnection', (InstrumentedConnection,), {'stats': self})
+        self._factories = {}
+        if enabled and output_path:
+            atexit.register(self.save)
+
+    # ---------- Hooks used by Database ----------
+    def connect(self, db_path: str, factory=sqlite3.Connection, **kwargs) -> sqlite3.Connection:
+        """sqlite3.connect, returning an instrumented connection while enabled.
+
+        A custom connection `factory` keeps its own behaviour; while enabled it
+        is combined with the instrumented class.
+        """
+        if not self.enabled:
+            return sqlite3.connect(db_path, factory=factory, **kwargs)
+        return sqlite3.connect(db_path, factory=self._instrumented(factory), **kwargs)
+
+    def _instrumented(self, factory):
+        if factory is sqlite3.Connection:
+            return self._connection_class
+        with self._lock:
+            combined = self._factories.get(factory)
+            if combined is None:
+                # Instrumentation first in the MRO, so its close() runs before the factory's
+                combined = self._factories[factory] = type(
+                    f'Stats{factory.__name__}', (self._connection_class, factory), {})
+        return combined
+
+    def instrument_class(self, cls):
+        """Wrap every public method of cls so its calls are timed (no-op while disabled)"""
+        if not self.enabled:
+            return cls
+        for name, func in list(vars(cls).items()):
+            if not name.startswith('_') and callable(func):
+                setattr(cls, name, self._timed_method(cls.__name__, name, func))
+        return cls
+
+    def _timed_method(self, owner: str, name: str, func):
+        label = f"{owner}.{name}"
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            stack = self._method_stack()
+            stack.append(name)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                ms = (time.perf_counter() - start) * 1000
+                stack.pop()
+                rows = len(result) if isinstance(result, list) else int(result is not None)
+                with self._lock:
+                    self.methods.setdefault(label, _Timing()).add(ms, rows)
+
+        return timed
+
+    def _method_stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_method(self) -> str:
+        stack = self._method_stack()
+        return stack[-1] if stack else '<none>'
+
+    def record_statement(self, call: _StatementCall):
+        key = normalize_sql(call.sql)
+        with self._lock:
+            self.statements.setdefault(key, _Timing()).add(call.ms, call.rows)
+        if call.ms >= self.slow_ms:
+            self._log_slow(call, key)
+
+    def _log_slow(self, call: _StatementCall, key: str):
+        entry = {
+            'at': datetime.now().isoformat(timespec='milliseconds'),
+            'ms': round(call.ms, 3),
+            'method': call.method,
+            'rows': call.rows,
+            'sql': key,
+            'params': call.shape,
+        }
+        self.slow_queries.append(entry)
+        if not self.slow_log_path:
+            return
+        try:
+            with self._lock, open(self.slow_log_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            print(f"Could not write slow-query log: {e}", file=sys.stderr)
+
+    # ---------- Reporting ----------
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'slow_ms': self.slow_ms,
+                'methods': {k: t.summary() for k, t in self.methods.items()},
+                'statements': {k: t.summary() for k, t in self.statements.items()},
+                'slow_queries': list(self.slow_queries),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.methods.clear()
+            self.statements.clear()
+            self.slow_queries.clear()
+            self.started_at = datetime.now().isoformat(timespec='seconds')
+
+    def save(self, path: str = None):
+        path = path or self.output_path
+        if not path or not (self.methods or self.statements):
+            return
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.snapshot(), f, indent=2)
+        except OSError as e:
+            print(f"Could not save database stats: {e}", file=sys.stderr)
+
+
+def format_report(snapshot: Dict, top: int = 20) -> str:
+    lines = [f"Database stats since {snapshot['started_at']} (slow threshold {snapshot['slow_ms']} ms)"]
+    for title, rows in (("Methods", snapshot['methods']), ("Statements", snapshot['statements'])):
+        lines.append(f"\n{title} (by total time):")
+        lines.append(f"  {'calls':>7} {'total ms':>10} {'avg ms':>8} {'p95 ms':>8} {'rows':>9}  name")
+        ordered = sorted(rows.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:top]
+        for name, s in ordered:
+            lines.append(f"  {s['calls']:>7} {s['total_ms']:>10.2f} {s['avg_ms']:>8.3f} "
+                         f"{s['p95_ms']:>8.3f} {s['rows']:>9}  {name[:110]}")
+    slow = snapshot['slow_queries']
+    lines.append(f"\nSlow queries ({len(slow)} most recent):")
+    for entry in slow[-top:]:
+        lines.append(f"  {entry['at']} {entry['ms']:>9.2f} ms {entry['method']}: {entry['sql'][:90]} {entry['params']}")
+    return '\n'.join(lines)
+
+
+def _stats_from_environment() -> QueryStats:
+    enabled = os.environ.get('VINYLFLOW_DB_STATS', '') not in ('', '0')
+    return QueryStats(
+        enabled=enabled,
+        slow_ms=float(os.environ.get('VINYLFLOW_SLOW_QUERY_MS', 50)),
+        slow_log_path=os.environ.get('VINYLFLOW_SLOW_QUERY_LOG',
+                                     os.path.join(BASE_DIR, "vinylflow_slow_queries.log")),
+        output_path=os.environ.get('VINYLFLOW_DB_STATS_OUT', os.path.join(BASE_DIR, "vinylflow_db_stats.json")),
+    )
+
+
+QUERY_STATS = _stats_from_environment()
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(BASE_DIR, "vinylflow_db_stats.json")
+    if not os.path.exists(path):
+        raise SystemExit(f"{path} not found; run the app with VINYLFLOW_DB_STATS=1 first")
+    with open(path) as f:
+        print(format_report(json.load(f)))
+
+
+if __name__ == '__main__':
+    main()
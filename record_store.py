@@ -5,11 +5,19 @@ import json
 import os
 from datetime import datetime, timedelta
 import csv
-from config import COLORS, FONTS, LIGHT_COLORS, DARK_COLORS
+import uuid
+import time
+from config import COLORS, FONTS, THEMES, set_theme
+from catalog_snapshot import CatalogSnapshot
 from database import Database
+from query_stats import QUERY_STATS
+from theme_registry import THEME_REGISTRY, next_theme
+
+# Theme button icon: the theme a click switches to
+THEME_ICONS = {'dark': "🌙", 'light': "☀️", 'vinyl': "💿"}
 
 class RecordStoreApp:
-    def __init__(self, root, is_owner=False, user=None, logout_callback=None):
+    def __init__(self, root, is_owner=False, user=None, logout_callback=None, db=None):
         self.root = root
         self.is_owner = is_owner
         self.user = user or {}
@@ -17,28 +25,40 @@ class RecordStoreApp:
         self.user_role = self.user.get('role', 'guest')
         self.logout_callback = logout_callback
         
-        # Initialize database
+        # Local database unless a backend (e.g. api_client.ApiDatabase) is passed in
         self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        self.db = Database(self.base_dir)
+        self.db = db if db is not None else Database(self.base_dir)
         
-        # Shopping cart
+        # Shopping cart; its stock is held in the database under this till's id
         self.cart = []
         self.cart_total = 0.0
+        self.till_id = f"till-{uuid.uuid4().hex[:12]}"
         # UI helpers
         self.tag_configured = False
         # Sorting state for catalog/tree views
         self.catalog_sort_by = 'Album'
         self.catalog_sort_reverse = False
-
-        # Theme
-        self.dark_mode = False
+        # Lazily built notebook tabs (key -> tab info) and tabs needing a reload
+        self.lazy_tabs = {}
+        self.stale_tabs = set()
+        # Bumped on every records refresh so stale batch inserts stop early
+        self.records_generation = 0
+        # Live records (a CatalogSnapshot); later refreshes only fetch the rows changed since
+        self.catalog_cache = None
+        # Artist names for autocomplete, fetched on first use
+        self.artist_list = None
+
+        # Theme; widgets built from here on are recoloured in place when it changes
+        self.theme = 'light'
         self.load_theme()
+        THEME_REGISTRY.install(self.root)
         
         # Setup GUI
         self.setup_window()
         self.create_styles()
         self.create_widgets()
-        self.load_data()
+        # Populate after the first paint so the window is interactive straight away
+        self.root.after_idle(self.load_data)
     
     def setup_window(self):
         self.root.configure(bg=COLORS['bg'])
@@ -49,25 +69,27 @@ class RecordStoreApp:
             if os.path.exists(config_file):
                 with open(config_file, 'r') as f:
                     config = json.load(f)
-                    self.dark_mode = config.get('dark_mode', False)
-                    if self.dark_mode:
-                        COLORS.update(DARK_COLORS)
-                    else:
-                        COLORS.update(LIGHT_COLORS)
+                    # Files from before the vinyl theme only have dark_mode
+                    theme = config.get('theme', 'dark' if config.get('dark_mode') else 'light')
+                    self.theme = theme if theme in THEMES else 'light'
         except:
-            self.dark_mode = False
+            self.theme = 'light'
+        set_theme(self.theme)
+        THEME_REGISTRY.theme = self.theme
     
     def save_theme(self):
         try:
             config_file = os.path.join(self.base_dir, 'theme_config.json')
             with open(config_file, 'w') as f:
-                json.dump({'dark_mode': self.dark_mode}, f)
+                json.dump({'theme': self.theme, 'dark_mode': self.theme == 'dark'}, f)
         except:
             pass
     
     def create_styles(self):
         self.style = ttk.Style()
-        self.style.theme_use('clam')
+        # Setting the theme again makes every ttk widget lay itself out again; restyling is enough
+        if self.style.theme_use() != 'clam':
+            self.style.theme_use('clam')
         
         self.style.configure('.', background=COLORS['bg'], foreground=COLORS['fg'])
         self.style.configure('TFrame', background=COLORS['bg'])
@@ -108,20 +130,28 @@ class RecordStoreApp:
                                  ('!disabled', COLORS['primary'])])
     
     def toggle_theme(self):
-        self.dark_mode = not self.dark_mode
-        if self.dark_mode:
-            COLORS.update(DARK_COLORS)
-        else:
-            COLORS.update(LIGHT_COLORS)
+        """Cycle dark -> light -> vinyl, recolouring the existing widgets in place"""
+        self.apply_theme(next_theme(self.theme))
         self.save_theme()
-        self.root.configure(bg=COLORS['bg'])
+    
+    def apply_theme(self, theme):
+        """Switch to `theme` and return THEME_REGISTRY.last_switch with the time to repaint (total_ms)"""
+        start = time.perf_counter()
+        self.theme = theme
+        stats = THEME_REGISTRY.switch(theme)
         self.create_styles()
         self.refresh_widget_styles()
+        # Time until Tk has redrawn with the new colours, not only until they were set
+        self.root.update_idletasks()
+        stats['total_ms'] = (time.perf_counter() - start) * 1000
+        return stats
     
     def refresh_widget_styles(self):
-        # For simplicity, we'll just refresh the whole interface
-        # (A more thorough approach would reconfigure existing widgets)
-        pass
+        """Colours THEME_REGISTRY does not track: Treeview row tags and the theme button's icon"""
+        if self.tag_configured:
+            self.tree.tag_configure('odd', background=COLORS['tree_bg'])
+            self.tree.tag_configure('even', background=COLORS['light_gray'])
+        self.theme_btn.config(text=THEME_ICONS[next_theme(self.theme)])
     
     def create_widgets(self):
         self.root.grid_rowconfigure(0, weight=0)
@@ -140,61 +170,98 @@ class RecordStoreApp:
         else:
             self.create_customer_interface(main_container)
 
+    # Records shown before the whole catalog has been read
+    FIRST_SCREEN_RECORDS = 100
+
     def load_data(self):
         """Populate UI with initial data from the database.
 
-        This method is defensive: each refresh call is wrapped so that missing
-        pieces of the UI or unexpected DB errors won't crash initialization.
+        Only the records list and cart are loaded here; every other tab loads
+        its own data when it is first opened (see add_lazy_tab). The records
+        list starts with one page and the full catalog follows on a later
+        event-loop turn. Each refresh call is wrapped so that unexpected DB
+        errors won't crash initialization.
         """
-        # Records
+        # Records: the first page now, the rest once it is on screen
         try:
-            self.refresh_records()
+            self.populate_records_tree(self.db.get_all_records(limit=self.FIRST_SCREEN_RECORDS))
         except Exception:
             pass
+        self.root.after_idle(self.load_remaining_records)
 
-        # Artists and bookings (owner views)
+        # Cart
         try:
-            if hasattr(self, 'refresh_artists_list'):
-                self.refresh_artists_list()
+            if hasattr(self, 'cart_tree'):
+                self.update_cart_display()
         except Exception:
             pass
 
+    def load_remaining_records(self):
+        """Replace the first page with the whole (sorted) catalog"""
         try:
-            if hasattr(self, 'refresh_bookings_list'):
-                self.refresh_bookings_list()
+            if self.tree.winfo_exists():
+                self.refresh_records()
         except Exception:
             pass
 
-        # Deleted records
-        try:
-            if hasattr(self, 'refresh_deleted_records'):
-                self.refresh_deleted_records()
-        except Exception:
-            pass
+    # ---------- Lazy notebook tabs ----------
+    def add_lazy_tab(self, notebook, key, text, builder, refresher=None):
+        """Add an empty tab whose content is built by `builder` on first view.
 
-        # Cart
-        try:
-            if hasattr(self, 'update_cart_display'):
-                self.update_cart_display()
-        except Exception:
-            pass
+        `refresher` is called instead of `builder` when a built tab has been
+        marked stale with mark_tabs_stale.
+        """
+        tab = ttk.Frame(notebook)
+        notebook.add(tab, text=text)
+        tab.grid_rowconfigure(0, weight=1)
+        tab.grid_columnconfigure(0, weight=1)
+        self.lazy_tabs[key] = {
+            'frame': tab,
+            'builder': builder,
+            'refresher': refresher,
+            'built': False,
+        }
+        return tab
+
+    def watch_lazy_tabs(self, notebook):
+        """Build the selected tab now and the others on <<NotebookTabChanged>>."""
+        notebook.bind('<<NotebookTabChanged>>', lambda e: self.on_lazy_tab_changed(notebook))
+        self.on_lazy_tab_changed(notebook)
+
+    def on_lazy_tab_changed(self, notebook):
+        selected = str(notebook.select())
+        for key, tab in self.lazy_tabs.items():
+            if str(tab['frame']) == selected:
+                self.show_lazy_tab(key)
+                break
 
-        # Artist-specific slots/bookings
-        try:
-            if hasattr(self, 'refresh_available_slots'):
-                self.refresh_available_slots()
-        except Exception:
-            pass
+    def show_lazy_tab(self, key):
+        """Build a tab on first view, or reload it if its content is stale."""
+        tab = self.lazy_tabs[key]
         try:
-            if hasattr(self, 'refresh_artist_bookings'):
-                self.refresh_artist_bookings()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, 'refresh_events'):
-                self.refresh_events()
-        except Exception:
-            pass
+            if not tab['built']:
+                self.stale_tabs.discard(key)
+                tab['builder'](tab['frame'])
+                # Only now: a builder that failed is run again the next time the tab is shown
+                tab['built'] = True
+            elif key in self.stale_tabs:
+                self.stale_tabs.discard(key)
+                if tab['refresher']:
+                    tab['refresher']()
+        except Exception as e:
+            import sys
+            print(f"Error loading tab '{key}': {e}", file=sys.stderr)
+            if not tab['built']:
+                # Clear what the failed builder left so the retry starts from an empty tab
+                for widget in tab['frame'].winfo_children():
+                    widget.destroy()
+
+    def mark_tabs_stale(self, *keys):
+        """Flag built tabs whose cached content no longer matches the database."""
+        for key in keys:
+            tab = self.lazy_tabs.get(key)
+            if tab and tab['built']:
+                self.stale_tabs.add(key)
     
     def create_header(self):
         self.header = tk.Frame(self.root, bg=COLORS['primary'], height=70)
@@ -238,8 +305,22 @@ class RecordStoreApp:
         user_frame = tk.Frame(self.header, bg=COLORS['primary'])
         user_frame.grid(row=0, column=2, sticky="e", padx=20)
         
+        if self.is_owner:
+            # Open stock alerts; click for the list
+            self.alert_badge = tk.Button(user_frame,
+                                         text="🔔",
+                                         font=FONTS['button'],
+                                         bg=COLORS['primary_dark'],
+                                         fg=COLORS['white'],
+                                         relief='flat',
+                                         command=self.show_stock_alerts,
+                                         cursor='hand2',
+                                         padx=10)
+            self.alert_badge.pack(side='left', padx=5)
+            self.poll_stock_alerts()
+
         self.theme_btn = tk.Button(user_frame,
-                                  text="🌙" if not self.dark_mode else "☀️",
+                                  text=THEME_ICONS[next_theme(self.theme)],
                                   font=('Arial', 14),
                                   bg=COLORS['primary_dark'],
                                   fg=COLORS['white'],
@@ -269,6 +350,106 @@ class RecordStoreApp:
                              pady=5)
         logout_btn.pack(side='left', padx=5)
     
+    # Milliseconds between checks of the open stock alert count
+    STOCK_ALERT_POLL_MS = 15000
+
+    def poll_stock_alerts(self):
+        """Refresh the alert badge now and then every STOCK_ALERT_POLL_MS.
+
+        Each check is a count of open rows in stock_alerts (kept current by
+        triggers), not a scan of the catalog.
+        """
+        if getattr(self, 'alert_poll_id', None):
+            self.root.after_cancel(self.alert_poll_id)
+        self.alert_poll_id = None
+        if not self.alert_badge.winfo_exists():
+            return
+        self.update_alert_badge()
+        self.alert_poll_id = self.root.after(self.STOCK_ALERT_POLL_MS, self.poll_stock_alerts)
+
+    def update_alert_badge(self):
+        if not getattr(self, 'alert_badge', None) or not self.alert_badge.winfo_exists():
+            return
+        try:
+            count = self.db.count_stock_alerts()
+        except Exception:
+            # Store server unreachable; keep the last count
+            return
+        self.alert_badge.config(text=f"🔔 {count}" if count else "🔔",
+                                bg=COLORS['danger'] if count else COLORS['primary_dark'])
+
+    def show_stock_alerts(self):
+        """Open stock alerts, with acknowledge and threshold controls."""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Stock Alerts")
+        dialog.configure(bg=COLORS['bg'])
+        dialog.transient(self.root)
+        dialog.grid_rowconfigure(0, weight=1)
+        dialog.grid_columnconfigure(0, weight=1)
+
+        columns = ("Level", "ID", "Album", "Artist", "Stock", "Threshold", "Raised")
+        tree = ttk.Treeview(dialog, columns=columns, show='headings', height=12)
+        for col, width in zip(columns, (60, 60, 220, 180, 60, 80, 140)):
+            tree.heading(col, text=col)
+            tree.column(col, width=width, anchor='w')
+        tree.grid(row=0, column=0, sticky='nsew', padx=15, pady=(15, 5))
+        scrollbar = ttk.Scrollbar(dialog, orient='vertical', command=tree.yview)
+        scrollbar.grid(row=0, column=1, sticky='ns', pady=(15, 5))
+        tree.configure(yscrollcommand=scrollbar.set)
+
+        def reload():
+            tree.delete(*tree.get_children())
+            for alert in self.db.get_stock_alerts():
+                tree.insert('', 'end', iid=str(alert['record_id']), values=(
+                    "OUT" if alert['level'] == 'out' else "Low", alert['record_id'], alert['album'],
+                    alert['artist'], alert['stock'], alert['threshold'], alert['raised_at']))
+            self.update_alert_badge()
+
+        def acknowledge():
+            selected = [int(iid) for iid in tree.selection()]
+            self.db.acknowledge_stock_alerts(selected or None)
+            reload()
+
+        def set_record_threshold():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("No Selection", "Select an alert to set its record's threshold", parent=dialog)
+                return
+            threshold = simpledialog.askinteger("Record Threshold", "Alert when stock falls to:",
+                                                parent=dialog, minvalue=0)
+            if threshold is None:
+                return
+            for iid in selected:
+                self.db.set_stock_threshold(threshold, record_id=int(iid), user_id=self.user_id)
+            reload()
+
+        def set_genre_threshold():
+            genre = simpledialog.askstring("Genre Threshold", "Genre (leave empty for the default):", parent=dialog)
+            if genre is None:
+                return
+            threshold = simpledialog.askinteger("Genre Threshold", "Alert when stock falls to:",
+                                                parent=dialog, minvalue=0)
+            if threshold is None:
+                return
+            try:
+                self.db.set_stock_threshold(threshold, genre=genre.strip() or None, user_id=self.user_id)
+            except ValueError as e:
+                messagebox.showerror("Validation Error", str(e), parent=dialog)
+                return
+            reload()
+
+        btn_frame = tk.Frame(dialog, bg=COLORS['bg'])
+        btn_frame.grid(row=1, column=0, columnspan=2, padx=15, pady=15, sticky='ew')
+        for i, (text, command, color) in enumerate((
+                ("Acknowledge", acknowledge, 'primary'),
+                ("Record Threshold…", set_record_threshold, 'secondary'),
+                ("Genre Threshold…", set_genre_threshold, 'secondary'),
+                ("Close", dialog.destroy, 'secondary'))):
+            btn_frame.grid_columnconfigure(i, weight=1)
+            tk.Button(btn_frame, text=text, font=FONTS['button_small'], bg=COLORS[color], fg=COLORS['white'],
+                      relief='flat', command=command, cursor='hand2').grid(row=0, column=i, sticky='ew', padx=3)
+        reload()
+    
     def logout(self):
         """Logout the current user and return to the auth window.
 
@@ -298,29 +479,21 @@ class RecordStoreApp:
         parent.grid_rowconfigure(0, weight=1)
         parent.grid_columnconfigure(0, weight=1)
         
-        inventory_tab = ttk.Frame(notebook)
-        statistics_tab = ttk.Frame(notebook)
-        artist_tab = ttk.Frame(notebook)          # New
-        deleted_tab = ttk.Frame(notebook)         # New
-        
-        notebook.add(inventory_tab, text="📦 Inventory")
-        notebook.add(statistics_tab, text="📊 Statistics")
-        notebook.add(artist_tab, text="🎤 Artist Management")
-        notebook.add(deleted_tab, text="🗑️ Deleted Records")
-        
-        inventory_tab.grid_rowconfigure(0, weight=1)
-        inventory_tab.grid_columnconfigure(0, weight=1)
-        statistics_tab.grid_rowconfigure(0, weight=1)
-        statistics_tab.grid_columnconfigure(0, weight=1)
-        artist_tab.grid_rowconfigure(0, weight=1)
-        artist_tab.grid_columnconfigure(0, weight=1)
-        deleted_tab.grid_rowconfigure(0, weight=1)
-        deleted_tab.grid_columnconfigure(0, weight=1)
-        
-        self.create_inventory_section(inventory_tab)
-        self.create_enhanced_statistics_section(statistics_tab)
-        self.create_artist_management_tab(artist_tab)
-        self.create_deleted_records_tab(deleted_tab)
+        # Tabs are built on first view; only the inventory is needed at login
+        self.add_lazy_tab(notebook, 'inventory', "📦 Inventory", self.create_inventory_section)
+        self.add_lazy_tab(notebook, 'statistics', "📊 Statistics",
+                          self.create_enhanced_statistics_section, self.refresh_statistics)
+        self.add_lazy_tab(notebook, 'artists', "🎤 Artist Management",
+                          self.create_artist_management_tab, self.refresh_artist_management)
+        self.add_lazy_tab(notebook, 'deleted', "🗑️ Deleted Records",
+                          self.create_deleted_records_tab, self.refresh_deleted_records)
+        # Only shown while database instrumentation is switched on (VINYLFLOW_DB_STATS)
+        if QUERY_STATS.enabled:
+            self.add_lazy_tab(notebook, 'diagnostics', "🩺 Diagnostics",
+                              self.create_diagnostics_tab, self.refresh_diagnostics)
+        self.watch_lazy_tabs(notebook)
+        # Also archives old deletions and keeps change_log trimmed (see Database)
+        self.db.start_reservation_sweeper()
     
     def create_inventory_section(self, parent):
         parent.grid_rowconfigure(0, weight=1)
@@ -424,10 +597,12 @@ class RecordStoreApp:
             btn.grid(row=0, column=i, sticky="ew", padx=2)
     
     def setup_artist_autocomplete(self):
-        """Fetch all distinct artists from the database and set up autocomplete"""
-        records = self.db.get_all_records()
-        artists = sorted(set(r['artist'] for r in records if r['artist']))
-        self.artist_list = artists
+        """Set up artist autocomplete; the artist names are fetched on first use"""
+        self.artist_list = None
+        
+        def on_focusin(event):
+            entry = self.form_entries['artist_entry']
+            entry['values'] = self.get_artist_list()
         
         def on_keyrelease(event):
             entry = self.form_entries['artist_entry']
@@ -435,7 +610,7 @@ class RecordStoreApp:
             if typed == '':
                 entry['values'] = []
             else:
-                matches = [a for a in artists if typed.lower() in a.lower()]
+                matches = [a for a in self.get_artist_list() if typed.lower() in a.lower()]
                 entry['values'] = matches
         
         # Replace artist entry with a Combobox for autocomplete
@@ -447,12 +622,18 @@ class RecordStoreApp:
         old_entry.destroy()
         
         new_entry = ttk.Combobox(parent,
-                                 values=artists,
                                  font=FONTS['entry'])
         new_entry.grid(row=row, column=column, sticky="ew", pady=5, ipady=5)
+        new_entry.bind('<FocusIn>', on_focusin)
         new_entry.bind('<KeyRelease>', on_keyrelease)
         self.form_entries['artist_entry'] = new_entry
     
+    def get_artist_list(self):
+        """Return the cached artist names, loading them from the database if needed"""
+        if self.artist_list is None:
+            self.artist_list = self.db.get_artist_names()
+        return self.artist_list
+    
     def create_records_list(self, parent, is_owner=False):
         parent.grid_rowconfigure(0, weight=0)
         parent.grid_rowconfigure(1, weight=1)
@@ -544,6 +725,9 @@ class RecordStoreApp:
             ("📤 Export CSV", self.export_to_csv, 'success'),
             ("📥 Import CSV", self.import_from_csv, 'warning')
         ]
+        if is_owner:
+            action_frame.grid_columnconfigure(3, weight=1)
+            action_buttons.append(("✏️ Bulk Edit", self.open_bulk_edit_dialog, 'primary'))
         
         for i, (text, command, style) in enumerate(action_buttons):
             btn = tk.Button(action_frame,
@@ -558,51 +742,105 @@ class RecordStoreApp:
                           pady=8)
             btn.grid(row=0, column=i, sticky="ew", padx=2)
     
+    # Rows inserted into a records tree per event-loop turn
+    RECORD_BATCH_SIZE = 500
+
     def refresh_records(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        records = self.db.get_all_records()
+        catalog = self.load_catalog()
         # Apply catalog sorting if set (defaults to Album alphabetical for customer view)
         sort_col = getattr(self, 'catalog_sort_by', None)
         sort_rev = getattr(self, 'catalog_sort_reverse', False)
         if sort_col:
-            try:
-                records = sorted(records, key=lambda r: self._record_sort_key(r, sort_col), reverse=sort_rev)
-            except Exception:
-                # fallback: no sort
-                pass
-        for idx, record in enumerate(records):
-            item_id = self.tree.insert('', 'end', values=(
-                record.get('id', ''),
-                record.get('album', ''),
-                record.get('artist', ''),
-                record.get('genre', ''),
-                record.get('year', ''),
-                f"£{record.get('price', 0):.2f}",
-                record.get('stock', 0)
-            ))
-            # Apply tag for alternating colors
-            if not self.tag_configured:
-                self.tree.tag_configure('odd', background=COLORS['tree_bg'])
-                self.tree.tag_configure('even', background=COLORS['light_gray'])
-                self.tag_configured = True
-            tag = 'even' if idx % 2 == 0 else 'odd'
-            self.tree.item(item_id, tags=(tag,))
-
-    def _record_sort_key(self, record, col_name):
-        """Return a sortable key for a record based on the column name."""
-        col_map = {
-            'ID': lambda r: int(r.get('id') or 0),
-            'Album': lambda r: (r.get('album') or '').lower(),
-            'Artist': lambda r: (r.get('artist') or '').lower(),
-            'Genre': lambda r: (r.get('genre') or '').lower(),
-            'Year': lambda r: int(r.get('year') or 0),
-            'Price': lambda r: float(r.get('price') or 0.0),
-            'Stock': lambda r: int(r.get('stock') or 0)
-        }
-        fn = col_map.get(col_name, lambda r: (r.get('album') or '').lower())
-        return fn(record)
+            order = catalog.sorted_indices(self.CATALOG_SORT_COLUMNS.get(sort_col, 'album'), sort_rev)
+        else:
+            order = catalog.sorted_indices('artist')
+        self.populate_records_tree(catalog.rows(order))
+
+    # Changed rows fetched per delta call
+    CATALOG_DELTA_BATCH = 1000
+
+    def load_catalog(self):
+        """Live records as a CatalogSnapshot; after the first load only changed rows are fetched."""
+        try:
+            if self.catalog_cache is None:
+                get_snapshot = getattr(self.db, 'get_catalog_snapshot', None)
+                if get_snapshot is not None:
+                    # Built straight from the cursor, without a dict per record
+                    self.catalog_cache = get_snapshot()
+                else:
+                    # Backends without it (API, offline till): read the version first, so a change
+                    # made during the full read is fetched again next time
+                    version = self.db.get_records_version()
+                    self.catalog_cache = CatalogSnapshot.from_records(self.db.get_all_records(), version)
+            else:
+                self._apply_catalog_changes()
+        except Exception:
+            # No version tracking behind this backend (e.g. an offline till on its replica)
+            self.catalog_cache = None
+            return CatalogSnapshot.from_records(self.db.get_all_records())
+        return self.catalog_cache
+
+    def _apply_catalog_changes(self):
+        while True:
+            changed = self.db.get_records_changed_since(self.catalog_cache.version, self.CATALOG_DELTA_BATCH)
+            self.catalog_cache.apply_changes(changed)
+            if len(changed) < self.CATALOG_DELTA_BATCH:
+                return
+
+    def populate_records_tree(self, records):
+        """Replace the records tree contents, inserting rows in batches.
+
+        The first batch is inserted immediately; the rest follow on later
+        event-loop turns so large catalogs don't freeze the window.
+        """
+        self.tree.delete(*self.tree.get_children())
+        # Apply tag for alternating colors
+        if not self.tag_configured:
+            self.tree.tag_configure('odd', background=COLORS['tree_bg'])
+            self.tree.tag_configure('even', background=COLORS['light_gray'])
+            self.tag_configured = True
+        self.records_generation += 1
+        self._insert_record_batch(records, 0, self.records_generation)
+
+    def _insert_record_batch(self, records, start, generation):
+        # A newer refresh (or a destroyed tree) supersedes this one
+        if generation != self.records_generation or not self.tree.winfo_exists():
+            return
+        end = min(start + self.RECORD_BATCH_SIZE, len(records))
+        for idx in range(start, end):
+            record = records[idx]
+            # Row iid is the record id so single rows can be updated in place
+            self.tree.insert('', 'end', iid=str(record['id']), values=self._record_row_values(record),
+                             tags=('even' if idx % 2 == 0 else 'odd',))
+        if end < len(records):
+            self.root.after(1, self._insert_record_batch, records, end, generation)
+
+    @staticmethod
+    def _record_row_values(record):
+        return (
+            record.get('id', ''),
+            record.get('album', ''),
+            record.get('artist', ''),
+            record.get('genre', ''),
+            record.get('year', ''),
+            f"£{record.get('price', 0):.2f}",
+            record.get('stock', 0)
+        )
+
+    def update_record_rows(self, records):
+        """Refresh just these records' rows; soft-deleted ones are removed from the tree."""
+        for record in records:
+            iid = str(record['id'])
+            if not self.tree.exists(iid):
+                continue
+            if record.get('deleted_at'):
+                self.tree.delete(iid)
+            else:
+                self.tree.item(iid, values=self._record_row_values(record))
+
+    # Treeview heading -> CatalogSnapshot column
+    CATALOG_SORT_COLUMNS = {'ID': 'id', 'Album': 'album', 'Artist': 'artist', 'Genre': 'genre',
+                            'Year': 'year', 'Price': 'price', 'Stock': 'stock'}
 
     def sort_by_column(self, col_name):
         """Toggle sorting by a column and refresh the view."""
@@ -633,22 +871,7 @@ class RecordStoreApp:
             return
         
         results = self.db.search_records(query)
-        
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        for idx, record in enumerate(results):
-            item_id = self.tree.insert('', 'end', values=(
-                record.get('id', ''),
-                record.get('album', ''),
-                record.get('artist', ''),
-                record.get('genre', ''),
-                record.get('year', ''),
-                f"£{record.get('price', 0):.2f}",
-                record.get('stock', 0)
-            ))
-            tag = 'even' if idx % 2 == 0 else 'odd'
-            self.tree.item(item_id, tags=(tag,))
+        self.populate_records_tree(results)
     
     def on_record_select(self, event):
         selection = self.tree.selection()
@@ -713,9 +936,11 @@ class RecordStoreApp:
         try:
             record_id = self.db.add_record(data, self.user_id)
             self.refresh_records()
+            self.mark_tabs_stale('statistics')
+            self.update_alert_badge()
             self.clear_form()
             messagebox.showinfo("Success", f"Record added successfully! (ID: {record_id})")
-            self.setup_artist_autocomplete()  # Update artist list
+            self.artist_list = None  # Update artist list
         except Exception as e:
             messagebox.showerror("Error", f"Failed to add record: {str(e)}")
     
@@ -747,7 +972,9 @@ class RecordStoreApp:
         
         if self.db.update_record(record_id, updates, self.user_id):
             self.refresh_records()
-            self.setup_artist_autocomplete()
+            self.mark_tabs_stale('statistics')
+            self.update_alert_badge()
+            self.artist_list = None
             messagebox.showinfo("Success", "Record updated successfully!")
         else:
             messagebox.showerror("Error", "Failed to update record")
@@ -764,11 +991,104 @@ class RecordStoreApp:
         record_id = self.tree.item(selection[0])['values'][0]
         if self.db.delete_record(record_id, self.user_id):
             self.refresh_records()
+            self.mark_tabs_stale('statistics', 'deleted')
+            self.update_alert_badge()
             self.clear_form()
             messagebox.showinfo("Success", "Record deleted (soft delete). It can be restored from the Deleted Records tab.")
         else:
             messagebox.showerror("Error", "Failed to delete record")
     
+    # Bulk edit dialog choices: label -> (operation, value prompt)
+    BULK_EDIT_CHOICES = {
+        "Change price by %": ('price_percent', "Percent (e.g. -10 for 10% off):"),
+        "Set stock": ('set_stock', "New stock level:"),
+        "Adjust stock by": ('adjust_stock', "Units to add (negative to remove):"),
+        "Change genre": ('set_genre', "New genre:"),
+        "Delete (soft)": ('delete', None),
+    }
+
+    def open_bulk_edit_dialog(self):
+        """Apply one change to every selected record."""
+        if not self.is_owner:
+            return
+        record_ids = [int(iid) for iid in self.tree.selection()]
+        if not record_ids:
+            messagebox.showwarning("No Selection", "Select one or more records (Ctrl/Shift-click) to bulk edit")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Bulk Edit")
+        dialog.configure(bg=COLORS['bg'])
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+
+        tk.Label(dialog, text=f"{len(record_ids)} record{'s' if len(record_ids) != 1 else ''} selected",
+                font=FONTS['h4'], bg=COLORS['bg'], fg=COLORS['fg']).grid(row=0, column=0, columnspan=2, padx=15, pady=(15, 10), sticky='w')
+
+        choice_var = tk.StringVar(value=next(iter(self.BULK_EDIT_CHOICES)))
+        prompt_label = tk.Label(dialog, font=FONTS['label'], bg=COLORS['bg'], fg=COLORS['fg'])
+        value_entry = tk.Entry(dialog, font=FONTS['entry'], bg=COLORS['entry_bg'], fg=COLORS['fg'], relief='solid', borderwidth=1)
+
+        def on_choice(*_):
+            prompt = self.BULK_EDIT_CHOICES[choice_var.get()][1]
+            if prompt:
+                prompt_label.config(text=prompt)
+                prompt_label.grid(row=2, column=0, padx=15, pady=5, sticky='w')
+                value_entry.grid(row=2, column=1, padx=15, pady=5, sticky='ew')
+            else:
+                prompt_label.grid_remove()
+                value_entry.grid_remove()
+
+        combo = ttk.Combobox(dialog, textvariable=choice_var, values=list(self.BULK_EDIT_CHOICES), state='readonly', width=28)
+        combo.grid(row=1, column=0, columnspan=2, padx=15, pady=5, sticky='ew')
+        combo.bind('<<ComboboxSelected>>', on_choice)
+        on_choice()
+
+        def apply():
+            operation, prompt = self.BULK_EDIT_CHOICES[choice_var.get()]
+            raw = value_entry.get().strip()
+            try:
+                if operation == 'price_percent':
+                    value = float(raw)
+                elif operation in ('set_stock', 'adjust_stock'):
+                    value = int(raw)
+                elif operation == 'set_genre':
+                    if not raw:
+                        raise ValueError("Genre cannot be empty")
+                    value = raw
+                else:
+                    value = None
+            except ValueError as e:
+                messagebox.showerror("Validation Error", str(e) if operation == 'set_genre' else "Please enter a number", parent=dialog)
+                return
+            if operation == 'delete' and not messagebox.askyesno(
+                    "Confirm Delete", f"Move {len(record_ids)} records to Deleted Records?", parent=dialog):
+                return
+            try:
+                updated = self.db.bulk_update_records(record_ids, operation, value, self.user_id)
+            except Exception as e:
+                messagebox.showerror("Error", f"Bulk edit failed: {str(e)}", parent=dialog)
+                return
+            dialog.destroy()
+            self.update_record_rows(updated)
+            self.mark_tabs_stale('statistics')
+            self.update_alert_badge()
+            if operation == 'delete':
+                self.mark_tabs_stale('deleted')
+                self.clear_form()
+            messagebox.showinfo("Bulk Edit", f"Updated {len(updated)} record{'s' if len(updated) != 1 else ''}.")
+
+        btn_frame = tk.Frame(dialog, bg=COLORS['bg'])
+        btn_frame.grid(row=3, column=0, columnspan=2, padx=15, pady=15, sticky='ew')
+        btn_frame.grid_columnconfigure(0, weight=1)
+        btn_frame.grid_columnconfigure(1, weight=1)
+        tk.Button(btn_frame, text="Apply", font=FONTS['button_small'], bg=COLORS['primary'], fg=COLORS['white'],
+                  relief='flat', command=apply, cursor='hand2').grid(row=0, column=0, sticky='ew', padx=(0, 5))
+        tk.Button(btn_frame, text="Cancel", font=FONTS['button_small'], bg=COLORS['secondary'], fg=COLORS['white'],
+                  relief='flat', command=dialog.destroy, cursor='hand2').grid(row=0, column=1, sticky='ew', padx=(5, 0))
+        dialog.grab_set()
+        value_entry.focus_set()
+
     def clear_form(self):
         if not self.is_owner:
             return
@@ -799,6 +1119,9 @@ class RecordStoreApp:
             imported_count = self.db.import_from_csv(filename, 'records')
             if imported_count > 0:
                 self.refresh_records()
+                self.mark_tabs_stale('statistics')
+                self.update_alert_badge()
+                self.artist_list = None
                 messagebox.showinfo("Import Successful", f"Imported {imported_count} records")
             else:
                 messagebox.showwarning("No Data", "No valid records found in the file")
@@ -807,6 +1130,7 @@ class RecordStoreApp:
     
     def create_enhanced_statistics_section(self, parent):
         """Create a detailed statistics dashboard."""
+        self.statistics_tab = parent
         # Main container with scrollbar for large content
         canvas = tk.Canvas(parent, bg=COLORS['bg'], highlightthickness=0)
         scrollbar = ttk.Scrollbar(parent, orient="vertical", command=canvas.yview)
@@ -888,10 +1212,12 @@ class RecordStoreApp:
             tk.Label(genre_frame, text="No genre data available.",
                     bg=COLORS['bg'], fg=COLORS['secondary']).pack()
 
+        self.create_sales_trends_section(scrollable_frame)
+
         # Low stock items
         low_stock = stats.get('low_stock', [])
         if low_stock:
-            low_frame = ttk.LabelFrame(scrollable_frame, text=" ⚠️ Low Stock (≤5) ", padding=10)
+            low_frame = ttk.LabelFrame(scrollable_frame, text=" ⚠️ Low Stock ", padding=10)
             low_frame.pack(fill='x', pady=10)
 
             tree = ttk.Treeview(low_frame, columns=("ID", "Album", "Artist", "Stock"), show='headings', height=5)
@@ -916,6 +1242,56 @@ class RecordStoreApp:
             for rec in out_of_stock:
                 tree.insert('', 'end', values=(rec['id'], rec['album'], rec['artist']))
             tree.pack(fill='x')
+    
+    def create_sales_trends_section(self, parent):
+        """Monthly revenue, top sellers and sell-through, read from the sales rollups."""
+        trends_frame = ttk.LabelFrame(parent, text=" Sales Trends ", padding=10)
+        trends_frame.pack(fill='x', pady=10)
+
+        # One round trip when the backend is a store server
+        months, sell_through, top_sellers = self.db.call_batch([
+            ('get_revenue_report', ('month',), {}),
+            ('get_sell_through', (), {'limit': 0}),
+            ('get_top_sellers', (), {'limit': 5}),
+        ])
+        months = months[-12:]
+        if not months:
+            tk.Label(trends_frame, text="No sales yet.",
+                    bg=COLORS['bg'], fg=COLORS['secondary']).pack()
+            return
+
+        top_revenue = max(m['revenue'] or 0 for m in months) or 1
+        for month in months:
+            row = tk.Frame(trends_frame, bg=COLORS['bg'])
+            row.pack(fill='x', pady=2)
+            tk.Label(row, text=month['period'], width=10, anchor='w',
+                    bg=COLORS['bg'], fg=COLORS['fg']).pack(side='left')
+            tk.Label(row, text=f"£{month['revenue'] or 0:,.2f}", width=12, anchor='e',
+                    bg=COLORS['bg'], fg=COLORS['fg']).pack(side='left')
+            bar = tk.Frame(row, bg=COLORS['primary'], height=20,
+                           width=int(200 * (month['revenue'] or 0) / top_revenue))
+            bar.pack(side='left', padx=5)
+
+        tk.Label(trends_frame,
+                text=f"Sell-through: {sell_through['rate'] * 100:.1f}% "
+                     f"({sell_through['units_sold']:,} sold, {sell_through['stock_on_hand']:,} on hand)",
+                font=FONTS['caption'],
+                bg=COLORS['bg'],
+                fg=COLORS['secondary']).pack(anchor='w', pady=(10, 5))
+
+        columns = ("Album", "Artist", "Units", "Revenue")
+        tree = ttk.Treeview(trends_frame, columns=columns, show='headings', height=5)
+        for col in columns:
+            tree.heading(col, text=col)
+        for rec in top_sellers:
+            tree.insert('', 'end', values=(rec['album'], rec['artist'], rec['units'], f"£{rec['revenue']:,.2f}"))
+        tree.pack(fill='x')
+
+    def refresh_statistics(self):
+        """Rebuild the statistics dashboard from fresh figures."""
+        for widget in self.statistics_tab.winfo_children():
+            widget.destroy()
+        self.create_enhanced_statistics_section(self.statistics_tab)
         
     # New: Artist Management Tab (Owner only)
     def create_artist_management_tab(self, parent):
@@ -1023,7 +1399,11 @@ class RecordStoreApp:
         complete_btn.grid(row=0, column=2, padx=5, sticky="ew")
         
         # Load data
+        self.refresh_artist_management()
+    
+    def refresh_artist_management(self):
         self.refresh_artists_list()
+        self.refresh_bookings_list()
     
     def refresh_artists_list(self):
         for item in self.artist_tree.get_children():
@@ -1102,17 +1482,60 @@ class RecordStoreApp:
             self.refresh_bookings_list()
     
     # New: Deleted Records Tab
+    DELETED_PAGE_SIZE = 100
+
     def create_deleted_records_tab(self, parent):
-        parent.grid_rowconfigure(0, weight=1)
+        parent.grid_rowconfigure(1, weight=1)
         parent.grid_columnconfigure(0, weight=1)
         
+        # Filters run on the server; Enter in any field applies them
+        filter_frame = tk.Frame(parent, bg=COLORS['bg'])
+        filter_frame.grid(row=0, column=0, sticky="ew", padx=10, pady=(10, 0))
+        filter_frame.grid_columnconfigure(1, weight=1)
+        self.deleted_search_var = tk.StringVar()
+        self.deleted_from_var = tk.StringVar()
+        self.deleted_to_var = tk.StringVar()
+        for column, (label, var, width) in enumerate((("🔍 Search:", self.deleted_search_var, None),
+                                                      ("Deleted from:", self.deleted_from_var, 11),
+                                                      ("to:", self.deleted_to_var, 11))):
+            tk.Label(filter_frame,
+                    text=label,
+                    font=FONTS['label'],
+                    bg=COLORS['bg'],
+                    fg=COLORS['fg']).grid(row=0, column=column * 2, sticky="w", padx=(0 if column == 0 else 10, 5))
+            entry = tk.Entry(filter_frame,
+                            textvariable=var,
+                            font=FONTS['entry'],
+                            bg=COLORS['entry_bg'],
+                            fg=COLORS['fg'],
+                            relief='solid',
+                            borderwidth=1,
+                            **({'width': width} if width else {}))
+            entry.grid(row=0, column=column * 2 + 1, sticky="ew", ipady=5)
+            entry.bind('<Return>', lambda e: self.refresh_deleted_records())
+        apply_btn = tk.Button(filter_frame,
+                             text="Apply",
+                             font=FONTS['button_small'],
+                             bg=COLORS['primary'],
+                             fg=COLORS['white'],
+                             relief='flat',
+                             command=self.refresh_deleted_records,
+                             cursor='hand2',
+                             padx=15)
+        apply_btn.grid(row=0, column=6, padx=(10, 0))
+        tk.Label(filter_frame,
+                text="Dates as YYYY-MM-DD",
+                font=FONTS['caption'],
+                bg=COLORS['bg'],
+                fg=COLORS['secondary']).grid(row=1, column=2, columnspan=4, sticky="w", padx=(10, 0))
+        
         tree_frame = ttk.LabelFrame(parent, text=" Soft-Deleted Records ", padding=10)
-        tree_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
+        tree_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
         tree_frame.grid_rowconfigure(0, weight=1)
         tree_frame.grid_columnconfigure(0, weight=1)
         
-        columns = ("ID", "Artist", "Album", "Genre", "Year", "Price", "Stock", "Deleted At")
-        self.deleted_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
+        columns = ("ID", "Artist", "Album", "Genre", "Year", "Price", "Stock", "Deleted At", "Archived")
+        self.deleted_tree = ttk.Treeview(tree_frame, columns=columns, show='headings', selectmode='extended')
         for col in columns:
             self.deleted_tree.heading(col, text=col)
             self.deleted_tree.column(col, width=100)
@@ -1120,11 +1543,14 @@ class RecordStoreApp:
         self.deleted_tree.configure(yscrollcommand=vscroll.set)
         self.deleted_tree.grid(row=0, column=0, sticky="nsew")
         vscroll.grid(row=0, column=1, sticky="ns")
+        self.deleted_count_label = tk.Label(tree_frame, text="", font=FONTS['caption'])
+        self.deleted_count_label.grid(row=1, column=0, sticky="w", pady=(5, 0))
         
         btn_frame = tk.Frame(parent, bg=COLORS['bg'])
-        btn_frame.grid(row=1, column=0, sticky="ew", pady=10)
+        btn_frame.grid(row=2, column=0, sticky="ew", pady=10)
         btn_frame.grid_columnconfigure(0, weight=1)
         btn_frame.grid_columnconfigure(1, weight=1)
+        btn_frame.grid_columnconfigure(2, weight=1)
         
         restore_btn = tk.Button(btn_frame,
                                text="Restore Selected",
@@ -1136,6 +1562,16 @@ class RecordStoreApp:
                                cursor='hand2')
         restore_btn.grid(row=0, column=0, padx=5, sticky="ew")
         
+        self.deleted_more_btn = tk.Button(btn_frame,
+                                         text="Load More",
+                                         font=FONTS['button_small'],
+                                         bg=COLORS['primary'],
+                                         fg=COLORS['white'],
+                                         relief='flat',
+                                         command=self.load_more_deleted_records,
+                                         cursor='hand2')
+        self.deleted_more_btn.grid(row=0, column=1, padx=5, sticky="ew")
+        
         refresh_btn = tk.Button(btn_frame,
                                text="Refresh",
                                font=FONTS['button_small'],
@@ -1144,14 +1580,37 @@ class RecordStoreApp:
                                relief='flat',
                                command=self.refresh_deleted_records,
                                cursor='hand2')
-        refresh_btn.grid(row=0, column=1, padx=5, sticky="ew")
+        refresh_btn.grid(row=0, column=2, padx=5, sticky="ew")
         
         self.refresh_deleted_records()
     
+    def _deleted_records_filters(self):
+        return {'search': self.deleted_search_var.get().strip() or None,
+                'deleted_from': self.deleted_from_var.get().strip() or None,
+                'deleted_to': self.deleted_to_var.get().strip() or None}
+
     def refresh_deleted_records(self):
-        for item in self.deleted_tree.get_children():
-            self.deleted_tree.delete(item)
-        records = self.db.get_deleted_records()
+        """Reload the first page of deleted records matching the filters."""
+        self.deleted_tree.delete(*self.deleted_tree.get_children())
+        self.deleted_after = None
+        # Load More pages through these filters, not whatever the fields hold by then
+        self.deleted_filters = self._deleted_records_filters()
+        try:
+            total = self.db.count_deleted_records(**self.deleted_filters)
+        except ValueError as e:
+            messagebox.showerror("Invalid Filter", str(e))
+            return
+        self.deleted_count_label.config(text=f"{total} deleted record{'s' if total != 1 else ''}")
+        self.load_more_deleted_records()
+
+    def load_more_deleted_records(self):
+        """Append the next page after the last deleted record shown."""
+        try:
+            records = self.db.get_deleted_records(self.DELETED_PAGE_SIZE, self.deleted_after,
+                                                  **self.deleted_filters)
+        except ValueError as e:
+            messagebox.showerror("Invalid Filter", str(e))
+            return
         for rec in records:
             self.deleted_tree.insert('', 'end', values=(
                 rec['id'],
@@ -1161,19 +1620,108 @@ class RecordStoreApp:
                 rec['year'],
                 f"£{rec['price']:.2f}",
                 rec['stock'],
-                rec['deleted_at']
+                rec['deleted_at'],
+                "Yes" if rec['archived'] else ""
             ))
+        if records:
+            self.deleted_after = (records[-1]['deleted_at'], records[-1]['id'])
+        if len(records) < self.DELETED_PAGE_SIZE:
+            self.deleted_more_btn.grid_remove()
+        else:
+            self.deleted_more_btn.grid()
+    
+    def create_diagnostics_tab(self, parent):
+        parent.grid_rowconfigure(0, weight=1)
+        parent.grid_rowconfigure(1, weight=1)
+        parent.grid_rowconfigure(2, weight=1)
+        parent.grid_columnconfigure(0, weight=1)
+        
+        self.diagnostics_trees = {}
+        sections = (
+            ('methods', " Database Methods ", ("Method", "Calls", "Total ms", "Avg ms", "p95 ms", "Rows")),
+            ('statements', " SQL Statements ", ("Statement", "Calls", "Total ms", "Avg ms", "p95 ms", "Rows")),
+            ('slow', " Slow Queries ", ("At", "ms", "Method", "Rows", "Statement", "Params")),
+        )
+        for row, (key, title, columns) in enumerate(sections):
+            frame = ttk.LabelFrame(parent, text=title, padding=10)
+            frame.grid(row=row, column=0, sticky="nsew", padx=10, pady=(10, 0))
+            frame.grid_rowconfigure(0, weight=1)
+            frame.grid_columnconfigure(0, weight=1)
+            tree = ttk.Treeview(frame, columns=columns, show='headings', height=6)
+            for col in columns:
+                tree.heading(col, text=col)
+                wide = col in ("Method", "Statement")
+                tree.column(col, width=420 if wide else 80, anchor="w" if wide else "center")
+            vscroll = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+            tree.configure(yscrollcommand=vscroll.set)
+            tree.grid(row=0, column=0, sticky="nsew")
+            vscroll.grid(row=0, column=1, sticky="ns")
+            self.diagnostics_trees[key] = tree
+        
+        btn_frame = tk.Frame(parent, bg=COLORS['bg'])
+        btn_frame.grid(row=3, column=0, sticky="ew", pady=10)
+        btn_frame.grid_columnconfigure(0, weight=1)
+        btn_frame.grid_columnconfigure(1, weight=1)
+        
+        refresh_btn = tk.Button(btn_frame,
+                               text="Refresh",
+                               font=FONTS['button_small'],
+                               bg=COLORS['secondary'],
+                               fg=COLORS['white'],
+                               relief='flat',
+                               command=self.refresh_diagnostics,
+                               cursor='hand2')
+        refresh_btn.grid(row=0, column=0, padx=5, sticky="ew")
+        
+        reset_btn = tk.Button(btn_frame,
+                             text="Reset Counters",
+                             font=FONTS['button_small'],
+                             bg=COLORS['warning'],
+                             fg=COLORS['white'],
+                             relief='flat',
+                             command=self.reset_diagnostics,
+                             cursor='hand2')
+        reset_btn.grid(row=0, column=1, padx=5, sticky="ew")
+        
+        self.refresh_diagnostics()
+    
+    def refresh_diagnostics(self):
+        snapshot = QUERY_STATS.snapshot()
+        for key in ('methods', 'statements'):
+            tree = self.diagnostics_trees[key]
+            tree.delete(*tree.get_children())
+            ordered = sorted(snapshot[key].items(), key=lambda item: item[1]['total_ms'], reverse=True)
+            for name, s in ordered:
+                tree.insert('', 'end', values=(name, s['calls'], f"{s['total_ms']:.1f}",
+                                               f"{s['avg_ms']:.2f}", f"{s['p95_ms']:.2f}", s['rows']))
+        tree = self.diagnostics_trees['slow']
+        tree.delete(*tree.get_children())
+        for entry in reversed(snapshot['slow_queries']):
+            tree.insert('', 'end', values=(entry['at'][11:], f"{entry['ms']:.1f}", entry['method'],
+                                           entry['rows'], entry['sql'], entry['params']))
+    
+    def reset_diagnostics(self):
+        QUERY_STATS.reset()
+        self.refresh_diagnostics()
     
     def restore_record(self):
         selection = self.deleted_tree.selection()
         if not selection:
-            messagebox.showwarning("No Selection", "Please select a record to restore")
+            messagebox.showwarning("No Selection", "Please select records to restore")
+            return
+        record_ids = [self.deleted_tree.item(iid)['values'][0] for iid in selection]
+        try:
+            # All or nothing, in one transaction
+            restored = self.db.restore_records(record_ids, self.user_id)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
-        record_id = self.deleted_tree.item(selection[0])['values'][0]
-        if self.db.restore_record(record_id, self.user_id):
+        if restored:
             self.refresh_deleted_records()
             self.refresh_records()
-            messagebox.showinfo("Success", "Record restored.")
+            self.mark_tabs_stale('statistics')
+            self.update_alert_badge()
+            messagebox.showinfo("Success", f"{len(restored)} record{'s' if len(restored) != 1 else ''} restored.")
         else:
             messagebox.showerror("Error", "Failed to restore record")
     
@@ -1185,39 +1733,24 @@ class RecordStoreApp:
         parent.grid_rowconfigure(0, weight=1)
         parent.grid_columnconfigure(0, weight=1)
 
-        # Catalog tab
-        catalog_tab = ttk.Frame(notebook)
-        notebook.add(catalog_tab, text="📀 Catalog")
-        catalog_tab.grid_rowconfigure(0, weight=1)
-        catalog_tab.grid_columnconfigure(0, weight=1)
+        # Catalog and cart are needed straight away; the rest load on first view
+        self.add_lazy_tab(notebook, 'catalog', "📀 Catalog", self.create_catalog_section)
+        self.add_lazy_tab(notebook, 'cart', "🛒 Cart", self.create_cart_section)
+        self.show_lazy_tab('cart')
+        # Frees holds left behind by abandoned carts on any till
+        self.db.start_reservation_sweeper()
 
-        # Cart tab
-        cart_tab = ttk.Frame(notebook)
-        notebook.add(cart_tab, text="🛒 Cart")
-        cart_tab.grid_rowconfigure(0, weight=1)
-        cart_tab.grid_columnconfigure(0, weight=1)
+        # Order history (not for the shared guest account)
+        if self.user.get('id') is not None and self.user.get('username') != 'guest':
+            self.add_lazy_tab(notebook, 'orders', "📦 My Orders", self.create_orders_tab, self.refresh_orders)
 
         # Events tab (public facing list of upcoming artist bookings)
-        events_tab = ttk.Frame(notebook)
-        notebook.add(events_tab, text="📅 Events")
-        events_tab.grid_rowconfigure(0, weight=1)
-        events_tab.grid_columnconfigure(0, weight=1)
-
-        # Build catalog section inside catalog_tab
-        self.create_catalog_section(catalog_tab)
-        # Build cart section inside cart_tab
-        self.create_cart_section(cart_tab)
-
-        # Build events section inside events_tab
-        self.create_events_tab(events_tab)
+        self.add_lazy_tab(notebook, 'events', "📅 Events", self.create_events_tab, self.refresh_events)
 
         # If user is an artist, add artist portal tab
         if self.user_role == 'artist':
-            artist_tab = ttk.Frame(notebook)
-            notebook.add(artist_tab, text="🎤 Artist Portal")
-            artist_tab.grid_rowconfigure(0, weight=1)
-            artist_tab.grid_columnconfigure(0, weight=1)
-            self.create_artist_portal_tab(artist_tab)
+            self.add_lazy_tab(notebook, 'artist_portal', "🎤 Artist Portal", self.create_artist_portal_tab)
+        self.watch_lazy_tabs(notebook)
     
     def create_catalog_section(self, parent):
         parent.grid_rowconfigure(0, weight=0)
@@ -1320,15 +1853,7 @@ class RecordStoreApp:
                                cursor='hand2',
                                pady=10)
         add_cart_btn.grid(row=0, column=0, sticky="ew")
-        # Populate catalog immediately
-        try:
-            # Default sort for catalog: Album alphabetical
-            if not hasattr(self, 'catalog_sort_by'):
-                self.catalog_sort_by = 'Album'
-                self.catalog_sort_reverse = False
-            self.refresh_records()
-        except Exception:
-            pass
+        # The catalog itself is populated by load_data once the window is up
     
     def create_cart_section(self, parent):
         parent.grid_rowconfigure(0, weight=1)
@@ -1551,6 +2076,93 @@ class RecordStoreApp:
             except Exception:
                 pass
 
+    ORDERS_PAGE_SIZE = 50
+
+    def create_orders_tab(self, parent):
+        parent.grid_rowconfigure(0, weight=0)
+        parent.grid_rowconfigure(1, weight=1)
+        parent.grid_columnconfigure(0, weight=1)
+
+        header = tk.Frame(parent, bg=COLORS['bg'])
+        header.grid(row=0, column=0, sticky='ew', pady=8, padx=8)
+        header.grid_columnconfigure(0, weight=1)
+
+        tk.Label(header, text="My Orders", font=FONTS['h4'], bg=COLORS['bg'], fg=COLORS['fg']).grid(row=0, column=0, sticky='w')
+        self.orders_count_label = tk.Label(header, text="", font=FONTS['caption'], bg=COLORS['bg'], fg=COLORS['secondary'])
+        self.orders_count_label.grid(row=0, column=1, sticky='e', padx=10)
+        refresh_btn = tk.Button(header, text="Refresh", font=FONTS['button_small'], bg=COLORS['secondary'], fg=COLORS['white'], relief='flat', command=self.refresh_orders, cursor='hand2')
+        refresh_btn.grid(row=0, column=2, sticky='e')
+
+        tree_frame = tk.Frame(parent, bg=COLORS['bg'])
+        tree_frame.grid(row=1, column=0, sticky='nsew', padx=8, pady=8)
+        tree_frame.grid_rowconfigure(0, weight=1)
+        tree_frame.grid_columnconfigure(0, weight=1)
+
+        # Orders are top-level rows; their line items are loaded when a row is expanded
+        cols = ("Date", "Items", "Total", "Status")
+        self.orders_tree = ttk.Treeview(tree_frame, columns=cols, show='tree headings', height=14)
+        self.orders_tree.heading('#0', text="Order")
+        self.orders_tree.column('#0', width=260)
+        for c in cols:
+            self.orders_tree.heading(c, text=c)
+            self.orders_tree.column(c, width=140 if c == 'Date' else 90, anchor='center')
+        v = ttk.Scrollbar(tree_frame, orient='vertical', command=self.orders_tree.yview)
+        self.orders_tree.configure(yscrollcommand=v.set)
+        self.orders_tree.grid(row=0, column=0, sticky='nsew')
+        v.grid(row=0, column=1, sticky='ns')
+        self.orders_tree.bind('<<TreeviewOpen>>', self.on_order_expand)
+
+        self.orders_more_btn = tk.Button(parent, text="Load More Orders", font=FONTS['button_small'], bg=COLORS['primary'], fg=COLORS['white'], relief='flat', command=self.load_more_orders, cursor='hand2')
+        self.orders_more_btn.grid(row=2, column=0, sticky='ew', padx=8, pady=(0, 8))
+
+        self.refresh_orders()
+
+    def refresh_orders(self):
+        """Reload the first page of the customer's orders."""
+        self.orders_tree.delete(*self.orders_tree.get_children())
+        self.orders_after = None
+        total = self.db.count_customer_sales(self.user.get('id'))
+        self.orders_count_label.config(text=f"{total} order{'s' if total != 1 else ''}")
+        self.load_more_orders()
+
+    def load_more_orders(self):
+        """Append the next page of orders after the last one shown."""
+        orders = self.db.get_customer_sales(self.user.get('id'), limit=self.ORDERS_PAGE_SIZE,
+                                            after=self.orders_after)
+        for order in orders:
+            iid = f"order-{order['id']}"
+            self.orders_tree.insert('', 'end', iid=iid, text=f"Order #{order['id']}", values=(
+                order['sale_date'],
+                order['item_count'],
+                f"£{order['total_amount'] or 0:.2f}",
+                order['status']
+            ))
+            # Placeholder child so the row can be expanded
+            self.orders_tree.insert(iid, 'end', text="Loading…")
+        if orders:
+            self.orders_after = (orders[-1]['sale_date'], orders[-1]['id'])
+        if len(orders) < self.ORDERS_PAGE_SIZE:
+            self.orders_more_btn.grid_remove()
+        else:
+            self.orders_more_btn.grid()
+
+    def on_order_expand(self, event):
+        iid = self.orders_tree.focus()
+        if not iid.startswith('order-'):
+            return
+        children = self.orders_tree.get_children(iid)
+        if len(children) != 1 or self.orders_tree.item(children[0], 'text') != "Loading…":
+            return
+        self.orders_tree.delete(children[0])
+        details = self.db.get_sale_details(int(iid.split('-', 1)[1]))
+        for item in details.get('items', []):
+            self.orders_tree.insert(iid, 'end', text=f"{item['album']} - {item['artist']}", values=(
+                "",
+                item['quantity'],
+                f"£{item['price_at_time'] * item['quantity']:.2f}",
+                ""
+            ))
+
     def refresh_available_slots(self):
         """Populate the slot combobox with available performance slots."""
         slots = self.db.get_available_slots()
@@ -1585,6 +2197,7 @@ class RecordStoreApp:
             messagebox.showinfo("Booking Requested", f"Your booking request (ID: {booking_id}) has been submitted. It will be reviewed by the store.")
             self.refresh_artist_bookings()
             self.refresh_available_slots()
+            self.mark_tabs_stale('events')
             self.booking_notes.delete("1.0", tk.END)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to request booking: {str(e)}")
@@ -1619,17 +2232,27 @@ class RecordStoreApp:
             messagebox.showerror("Error", "Record not found")
             return
         
-        if record['stock'] <= 0:
+        # Stock held by other tills' carts is not available to this one
+        available = self.db.get_available_stock(record_id, holder=self.till_id)
+        available -= sum(item['quantity'] for item in self.cart if item['record_id'] == record_id)
+        if available <= 0:
             messagebox.showwarning("Out of Stock", "This item is out of stock")
             return
         
         quantity = simpledialog.askinteger("Quantity",
-                                         f"How many '{record['album']}' would you like?\nAvailable: {record['stock']}",
+                                         f"How many '{record['album']}' would you like?\nAvailable: {available}",
                                          minvalue=1,
-                                         maxvalue=record['stock'])
+                                         maxvalue=available)
         if not quantity:
             return
         
+        try:
+            self.db.reserve_stock(self.till_id, record_id, quantity)
+        except ValueError as e:
+            # Another till took the stock while the dialog was open
+            messagebox.showwarning("Out of Stock", str(e))
+            return
+        
         price = record['price']
         total = price * quantity
         
@@ -1670,6 +2293,7 @@ class RecordStoreApp:
         if not self.cart:
             return
         if messagebox.askyesno("Clear Cart", "Are you sure you want to clear your cart?"):
+            self.db.release_reservations(self.till_id)
             self.cart = []
             self.update_cart_display()
     
@@ -1687,20 +2311,35 @@ class RecordStoreApp:
 
         try:
             items = [{'record_id': item['record_id'], 'quantity': item['quantity']} for item in self.cart]
-            sale_id = self.db.create_sale(
+            sale_id = self.db.checkout_reservations(
+                self.till_id,
                 customer_id=self.user.get('id'),
                 items=items,
                 shipping_address=shipping_address
             )
-            messagebox.showinfo("Order Placed",
-                            f"Thank you for your order!\n\nOrder ID: {sale_id}\nTotal: £{self.cart_total:.2f}\n\nYour records will be shipped soon.")
+            if isinstance(sale_id, str):
+                # Queued by offline_till.OfflineTill; the server assigns the real order ID on sync
+                messagebox.showinfo("Order Placed",
+                                f"Thank you for your order!\n\nReference: {sale_id}\nTotal: £{self.cart_total:.2f}\n\n"
+                                "The store server is offline; this order will be sent when it is back.")
+            else:
+                messagebox.showinfo("Order Placed",
+                                f"Thank you for your order!\n\nOrder ID: {sale_id}\nTotal: £{self.cart_total:.2f}\n\nYour records will be shipped soon.")
             self.cart = []
             self.update_cart_display()
             self.refresh_records()
+            self.mark_tabs_stale('orders')
         except Exception as e:
             messagebox.showerror("Checkout Error", f"Failed to process order: {str(e)}")
     
     def logout(self):
         if messagebox.askyesno("Logout", "Are you sure you want to logout?"):
+            # Give the cart's stock back to the other tills
+            self.db.release_reservations(self.till_id)
+            self.db.stop_reservation_sweeper()
+            if self.user.get('session_token'):
+                self.db.end_session(self.user['session_token'])
+            # The login window is not themed live
+            THEME_REGISTRY.uninstall()
             if self.logout_callback:
                 self.logout_callback()
\ No newline at end of file
@@ -3,17 +3,30 @@ Seed script for Record_Store-main (VinylFlow) demo data.
 
 Creates demo customers (matching quick-login credentials), artist profiles,
 records, bookings, and a couple of sales. Safe to run multiple times; existing
-usernames are skipped. Backs up the existing SQLite DB before modifying it.
+usernames are skipped. Backs up the existing SQLite DB (incrementally, via incremental_backup) before modifying it.
+
+Generator mode instead builds a separate, production-sized database for
+benchmarks and query-plan work: Zipf-distributed artist and record
+popularity, repeat-buyer skew, multi-year sales with growth, weekly and
+December seasonality, and bookings history. Rows are bulk-loaded with
+executemany in large transactions, and the output depends only on the
+parameters and --seed.
 
 Run:
     python seed_demo_data.py
-
+    python seed_demo_data.py --generate --records 1000000 --customers 200000 \
+        --sales 2000000 --years 3 --seed 42 --out-dir generated
 """
+import argparse
+import itertools
+import math
 import os
-import shutil
+import sqlite3
+import time
 from datetime import datetime, timedelta
 import random
 
+from incremental_backup import IncrementalBackup, drop_change_log_triggers, install_change_log
 from database import Database
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -22,10 +35,8 @@ DB_PATH = os.path.join(BASE_DIR, "vinylflow.db")
 
 def backup_db():
     if os.path.exists(DB_PATH):
-        ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_path = os.path.join(BASE_DIR, f"vinylflow_backup_{ts}.db")
-        shutil.copy2(DB_PATH, backup_path)
-        print(f"Backed up existing DB to: {backup_path}")
+        backup_path = IncrementalBackup(DB_PATH).backup()
+        print(f"Backed up existing DB to: {backup_path}" if backup_path else "No changes since the last backup.")
     else:
         print("No existing DB found; a new database will be created.")
 
@@ -176,5 +187,252 @@ def seed():
     print(f"Customers created/seen: {len(created_customers)} | Records present: {len(db.get_all_records())}")
 
 
+# ---------- Generator mode ----------
+GENRES = [('Rock', 22), ('Pop', 15), ('Jazz', 10), ('Electronic', 12), ('Hip Hop', 9), ('Soul', 7),
+          ('Folk', 6), ('Classical', 5), ('Blues', 4), ('Reggae', 3), ('Metal', 4), ('Compilation', 3)]
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn',
+               'Rowan', 'Skyler', 'Charlie', 'Drew', 'Emery', 'Finley', 'Harper', 'Kai', 'Logan', 'Sage']
+LAST_NAMES = ['Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'Wilson', 'Evans', 'Thomas', 'Roberts', 'Walker',
+              'Wright', 'Green', 'Hall', 'Wood', 'Clarke', 'Hughes', 'Edwards', 'Turner', 'Murphy', 'Kelly']
+NAME_WORDS = ['Velvet', 'Neon', 'Blue', 'Golden', 'Silent', 'Electric', 'Midnight', 'Crystal', 'Wild', 'Paper',
+              'Echo', 'Horizon', 'Static', 'Lunar', 'Rust', 'Cinder', 'Harbor', 'Violet', 'Atlas', 'Ember',
+              'Signal', 'Hollow', 'Solar', 'Drift', 'Canyon', 'Mirror', 'Orchard', 'Fable', 'Tide', 'Pulse']
+STREETS = ['High St', 'Station Rd', 'Church Ln', 'Mill Rd', 'Park Ave', 'Victoria Rd', 'Green Ln', 'Kings Rd']
+GENERATED_PASSWORD = 'password123'
+
+
+def zipf_cum_weights(n: int, s: float = 1.1) -> list:
+    """Cumulative Zipf weights for ranks 1..n, for random.choices(cum_weights=...)"""
+    return list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def _name(index: int, words: int = 2) -> str:
+    parts = []
+    for _ in range(words):
+        index, part = divmod(index, len(NAME_WORDS))
+        parts.append(NAME_WORDS[part])
+    name = ' '.join(parts)
+    return f"{name} {index + 1}" if index else name
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _bulk_insert(conn, sql: str, rows, batch_size: int) -> int:
+    """executemany in chunks of batch_size, one transaction per chunk"""
+    total = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, batch_size))
+        if not chunk:
+            return total
+        conn.execute('BEGIN')
+        conn.executemany(sql, chunk)
+        conn.execute('COMMIT')
+        total += len(chunk)
+
+
+def generate(out_dir: str, records: int = 100_000, customers: int = 20_000, artists: int = None,
+             sales: int = 200_000, bookings: int = 10_000, years: int = 3, end_date: str = '2026-01-01',
+             seed: int = 42, batch_size: int = 50_000, force: bool = False):
+    """Build a synthetic database of the given size in out_dir/vinylflow.db"""
+    os.makedirs(out_dir, exist_ok=True)
+    db_path = os.path.join(out_dir, "vinylflow.db")
+    if os.path.exists(db_path):
+        if not force:
+            raise SystemExit(f"{db_path} already exists (use --force to replace it)")
+        os.remove(db_path)
+
+    rng = random.Random(seed)
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    start = end - timedelta(days=365 * years)
+    span_seconds = (end - start).total_seconds()
+    artists = artists or max(1, records // 8)
+    artist_customers = min(max(1, customers // 50), artists)
+
+    db = Database(out_dir)
+    # One hash for every generated account: hashing each one would take hours
+    password_hash = db._hash_password(GENERATED_PASSWORD)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+    # Generated rows are not changes to back up; the first backup of this database is a full base
+    drop_change_log_triggers(conn.cursor())
+    started = time.perf_counter()
+
+    def report(label, count):
+        print(f"  {label:<12} {count:>10,}  ({time.perf_counter() - started:6.1f}s)")
+
+    # Customers: registrations spread over the period, a few artists among them
+    def customer_rows():
+        for n in range(1, customers + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            registered = start + timedelta(seconds=rng.random() * span_seconds)
+            yield (n, f"gen_{n:07d}", password_hash, f"gen_{n:07d}@example.com", f"{first} {last}",
+                   f"{rng.randint(1, 250)} {rng.choice(STREETS)}", f"07{rng.randrange(10 ** 9):09d}",
+                   _timestamp(registered), 0 if rng.random() < 0.03 else 1,
+                   'artist' if n <= artist_customers else 'customer')
+
+    report('customers', _bulk_insert(conn, '''
+        INSERT INTO customers (id, username, password_hash, email, full_name, address, phone,
+                               registration_date, is_active, role)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', customer_rows(), batch_size))
+
+    genre_names = [g for g, _ in GENRES]
+    genre_cum = list(itertools.accumulate(w for _, w in GENRES))
+    artist_names = [_name(n) for n in range(artists)]
+    artist_genres = rng.choices(genre_names, cum_weights=genre_cum, k=artists)
+
+    def artist_rows():
+        for n in range(1, artist_customers + 1):
+            yield (n, n, artist_names[n - 1], "Generated artist profile.", artist_genres[n - 1],
+                   f"https://example.com/artist/{n}", None, 1 if rng.random() < 0.8 else 0)
+
+    report('artists', _bulk_insert(conn, '''
+        INSERT INTO artists (id, customer_id, stage_name, bio, genre, website, phone, is_approved)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', artist_rows(), batch_size))
+
+    # Records: a few artists own most of the catalogue (Zipf), prices are log-normal,
+    # stock is mostly small, release years cluster in the 70s and the last decade
+    record_artists = rng.choices(range(artists), cum_weights=zipf_cum_weights(artists), k=records)
+    albums_per_artist = [0] * artists
+    prices = [0.0] * (records + 1)
+
+    def record_rows():
+        for n in range(1, records + 1):
+            artist = record_artists[n - 1]
+            album = _name(albums_per_artist[artist] * 7919 + artist, words=2)
+            albums_per_artist[artist] += 1
+            genre = artist_genres[artist] if rng.random() < 0.85 else rng.choice(genre_names)
+            year = int(rng.gauss(1975, 8)) if rng.random() < 0.35 else int(end.year - rng.expovariate(1 / 8))
+            year = min(max(year, 1950), end.year)
+            price = round(min(max(rng.lognormvariate(math.log(22), 0.35), 4.99), 149.99), 2)
+            prices[n] = price
+            stock = 0 if rng.random() < 0.05 else min(int(rng.expovariate(1 / 6)) + 1, 200)
+            added = start + timedelta(seconds=rng.random() * span_seconds)
+            deleted = _timestamp(added + timedelta(days=rng.randint(1, 200))) if rng.random() < 0.02 else None
+            yield (n, artist_names[artist], album, genre, year, price, stock, _timestamp(added), deleted,
+                   0 if deleted else None)
+
+    report('records', _bulk_insert(conn, '''
+        INSERT INTO records (id, artist, album, genre, year, price, stock, date_added, deleted_at, deleted_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', record_rows(), batch_size))
+
+    # Sales: daily volume grows over the period, weekends and December are busier;
+    # buyers and records both follow Zipf popularity (repeat customers, hit records)
+    days = (end - start).days
+    day_cum = list(itertools.accumulate(
+        (1 + day / days) * (1.4 if (start + timedelta(days=day)).weekday() >= 5 else 1.0)
+        * (1.8 if (start + timedelta(days=day)).month == 12 else 1.0)
+        for day in range(days)))
+    sale_days = sorted(rng.choices(range(days), cum_weights=day_cum, k=sales))
+    buyer_rank = list(range(1, customers + 1))
+    rng.shuffle(buyer_rank)
+    record_rank = list(range(1, records + 1))
+    rng.shuffle(record_rank)
+    buyer_cum = zipf_cum_weights(customers, 0.8)
+    record_cum = zipf_cum_weights(records, 1.0)
+    items_per_sale = ([1] * 60) + ([2] * 25) + ([3] * 10) + ([4] * 3) + ([5] * 2)
+    sale_items = []
+
+    def sale_rows():
+        item_id = 0
+        for n, day in enumerate(sale_days, start=1):
+            moment = start + timedelta(days=day, hours=rng.triangular(9, 21, 16))
+            buyer = buyer_rank[rng.choices(range(customers), cum_weights=buyer_cum)[0]]
+            picked = {record_rank[i] for i in rng.choices(range(records), cum_weights=record_cum,
+                                                         k=rng.choice(items_per_sale))}
+            total = 0.0
+            for record_id in picked:
+                quantity = 1 if rng.random() < 0.9 else 2
+                item_id += 1
+                sale_items.append((item_id, n, record_id, quantity, prices[record_id]))
+                total += prices[record_id] * quantity
+            status = 'pending' if (end - moment).days < 3 else rng.choice(('completed',) * 19 + ('cancelled',))
+            yield (n, buyer, _timestamp(moment), round(total, 2), status, f"{rng.randint(1, 250)} {rng.choice(STREETS)}")
+
+    def flushed_sale_rows():
+        # Write items alongside their sales so the items list never holds the whole history
+        for row in sale_rows():
+            yield row
+            if len(sale_items) >= batch_size:
+                flush_sale_items()
+
+    def flush_sale_items():
+        _bulk_insert(conn, 'INSERT INTO sale_items (id, sale_id, record_id, quantity, price_at_time) '
+                           'VALUES (?, ?, ?, ?, ?)', sale_items, batch_size)
+        item_count[0] += len(sale_items)
+        sale_items.clear()
+
+    item_count = [0]
+    report('sales', _bulk_insert(conn, '''
+        INSERT INTO sales (id, customer_id, sale_date, total_amount, status, shipping_address)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', flushed_sale_rows(), batch_size))
+    flush_sale_items()
+    report('sale items', item_count[0])
+
+    # Bookings: evening slots across the period plus 90 days ahead
+    def booking_rows():
+        ahead = span_seconds + 90 * 86400
+        for n in range(1, bookings + 1):
+            day = start + timedelta(seconds=rng.random() * ahead)
+            when = day.replace(hour=rng.choice((18, 19, 20, 21)), minute=0, second=0, microsecond=0)
+            if when > end:
+                status = rng.choice(('pending', 'pending', 'confirmed'))
+            else:
+                status = rng.choice(('completed',) * 8 + ('cancelled', 'confirmed'))
+            created = when - timedelta(days=rng.randint(3, 60))
+            yield (n, rng.randint(1, artist_customers), _timestamp(when), rng.choice((30, 45, 60, 90)),
+                   status, "Generated booking", _timestamp(created), _timestamp(created))
+
+    report('bookings', _bulk_insert(conn, '''
+        INSERT INTO bookings (id, artist_id, performance_date, duration_minutes, status, notes,
+                              created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', booking_rows(), batch_size))
+
+    install_change_log(conn.cursor())
+    conn.close()
+    # Fill the reporting rollups now rather than on the first report
+    db.refresh_sales_rollup()
+    conn = sqlite3.connect(db_path)
+    conn.execute('ANALYZE')
+    conn.close()
+    print(f"Generated {db_path} in {time.perf_counter() - started:.1f}s "
+          f"(seed {seed}; every account's password is '{GENERATED_PASSWORD}')")
+    return db_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed demo data, or generate a large synthetic database")
+    parser.add_argument('--generate', action='store_true',
+                        help="build a synthetic database in --out-dir instead of seeding vinylflow.db")
+    parser.add_argument('--out-dir', default=os.path.join(BASE_DIR, "generated"))
+    parser.add_argument('--records', type=int, default=100_000)
+    parser.add_argument('--customers', type=int, default=20_000)
+    parser.add_argument('--artists', type=int, help="distinct artists (default: records / 8)")
+    parser.add_argument('--sales', type=int, default=200_000)
+    parser.add_argument('--bookings', type=int, default=10_000)
+    parser.add_argument('--years', type=int, default=3, help="years of sales and bookings history")
+    parser.add_argument('--end-date', default='2026-01-01', help="history ends here (YYYY-MM-DD)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=50_000, help="rows per transaction")
+    parser.add_argument('--force', action='store_true', help="replace an existing generated database")
+    args = parser.parse_args()
+
+    if not args.generate:
+        seed()
+        return
+    generate(args.out_dir, records=args.records, customers=args.customers, artists=args.artists,
+             sales=args.sales, bookings=args.bookings, years=args.years, end_date=args.end_date,
+             seed=args.seed, batch_size=args.batch_size, force=args.force)
+
+
 if __name__ == '__main__':
-    seed()
+    main()
@@ -0,0 +1,137 @@
+"""
+Fixed, parameterised SQL for the Database layer.
+
+sqlite3 keeps a per-connection cache of compiled statements keyed by the
+exact SQL text. Text that changes from call to call (a LIMIT formatted into
+the query, SET clauses in whatever order a dict had its keys) misses that
+cache and is compiled again. So that every call hits the cache:
+
+  * STATEMENTS maps a name to one fixed SQL text; values are always bound.
+    Database reuses its connections per thread, so each of these is
+    compiled once per connection rather than once per call. The registry
+    covers the catalog, sync and archive paths that run most often; the
+    rest of database.py keeps its SQL inline, and where that text is fixed
+    it is cached the same way.
+  * update_statement() builds an UPDATE from a dict of changes. Column names
+    are checked against UPDATABLE_COLUMNS and never taken from input as SQL.
+    They are put in a fixed order and the text is memoised, so one set of
+    columns always gives the same statement.
+  * ID_LIST is "IN (SELECT value FROM json_each(?))", with the ids bound as
+    one JSON array (id_list()), so any number of ids uses one statement.
+
+Connections are opened with cached_statements=STATEMENT_CACHE_SIZE, which
+is enough for everything here plus the per-method SQL in database.py.
+"""
+import json
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+STATEMENT_CACHE_SIZE = 256
+
+# Columns callers may change through update_statement(), in the order they appear in SET
+UPDATABLE_COLUMNS = {
+    'records': ('artist', 'album', 'genre', 'year', 'price', 'stock'),
+}
+
+ID_LIST = 'IN (SELECT value FROM json_each(?))'
+
+# The columns records and records_archive share, for moving rows between them
+RECORD_COLUMNS = ('id', 'artist', 'album', 'genre', 'year', 'price', 'stock', 'date_added',
+                  'deleted_at', 'deleted_by', 'row_version', 'updated_at')
+_RECORD_COLUMNS = ', '.join(RECORD_COLUMNS)
+
+STATEMENTS = {
+    'records.insert': '''
+        INSERT INTO records (artist, album, genre, year, price, stock)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''',
+    'records.get': 'SELECT * FROM records WHERE id = ? AND deleted_at IS NULL',
+    'records.list_live': 'SELECT * FROM records WHERE deleted_at IS NULL ORDER BY artist, album',
+    'records.list_live_page': '''
+        SELECT * FROM records WHERE deleted_at IS NULL ORDER BY artist, album LIMIT ? OFFSET ?
+    ''',
+    'records.list_all': 'SELECT * FROM records ORDER BY artist, album',
+    'records.list_all_page': 'SELECT * FROM records ORDER BY artist, album LIMIT ? OFFSET ?',
+    'records.search': '''
+        SELECT * FROM records
+        WHERE (artist LIKE ? OR album LIKE ? OR genre LIKE ?)
+        AND deleted_at IS NULL
+        ORDER BY artist, album
+        LIMIT ?
+    ''',
+    'records.soft_delete': '''
+        UPDATE records SET deleted_at = CURRENT_TIMESTAMP, deleted_by = ?
+        WHERE id = ?
+    ''',
+    'records.restore': f'''
+        UPDATE records SET deleted_at = NULL, deleted_by = NULL
+        WHERE id {ID_LIST} AND deleted_at IS NOT NULL
+    ''',
+    'records.version': 'SELECT COALESCE(MAX(row_version), 0) FROM records',
+    # Archived records keep the version of their soft delete, so a caller that has
+    # not synced since still learns they are gone
+    'records.changed_since': f'''
+        SELECT {_RECORD_COLUMNS} FROM records WHERE row_version > ?
+        UNION ALL
+        SELECT {_RECORD_COLUMNS} FROM records_archive WHERE row_version > ?
+        ORDER BY row_version LIMIT ?
+    ''',
+    'records.live_by_ids': f'SELECT * FROM records WHERE id {ID_LIST} AND deleted_at IS NULL',
+    'records.by_ids': f'SELECT * FROM records WHERE id {ID_LIST}',
+    # Soft deleted before the cutoff, never the row holding the highest row_version:
+    # the version triggers number from MAX(row_version), which must not go back
+    'records.archivable': '''
+        SELECT id FROM records
+        WHERE deleted_at < datetime('now', ?) AND row_version < (SELECT MAX(row_version) FROM records)
+        LIMIT ?
+    ''',
+    'records.archive': f'''
+        INSERT INTO records_archive ({_RECORD_COLUMNS})
+        SELECT {_RECORD_COLUMNS} FROM records WHERE id {ID_LIST}
+    ''',
+    'records.delete_archived': f'DELETE FROM records WHERE id {ID_LIST}',
+    'records.restorable': f'''
+        SELECT id FROM records WHERE id {ID_LIST} AND deleted_at IS NOT NULL
+        UNION ALL
+        SELECT id FROM records_archive WHERE id {ID_LIST}
+    ''',
+    # Archived records whose artist and album a live or soft-deleted record has taken since
+    'records_archive.conflicts': f'''
+        SELECT a.id FROM records_archive a JOIN records r ON r.artist = a.artist AND r.album = a.album
+        WHERE a.id {ID_LIST}
+    ''',
+    # row_version 0 lets the insert trigger give the restored row a new version
+    'records.unarchive': f'''
+        INSERT INTO records ({_RECORD_COLUMNS})
+        SELECT id, artist, album, genre, year, price, stock, date_added, NULL, NULL, 0, updated_at
+        FROM records_archive WHERE id {ID_LIST}
+    ''',
+    'records_archive.delete': f'DELETE FROM records_archive WHERE id {ID_LIST}',
+}
+
+
+def statement(name: str) -> str:
+    return STATEMENTS[name]
+
+
+def id_list(ids: Iterable[int]) -> str:
+    """The bound value for ID_LIST"""
+    return json.dumps([int(record_id) for record_id in ids])
+
+
+@lru_cache(maxsize=None)
+def _update_sql(table: str, columns: Tuple[str, ...]) -> str:
+    return f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?"
+
+
+def update_statement(table: str, updates: Dict) -> Tuple[str, List]:
+    """UPDATE ... WHERE id = ? for the changed columns, and its values (append the id).
+
+    Raises ValueError for a column that may not be updated.
+    """
+    allowed = UPDATABLE_COLUMNS[table]
+    unknown = set(updates) - set(allowed)
+    if unknown:
+        raise ValueError(f"Cannot update {', '.join(sorted(unknown))} on {table}")
+    columns = tuple(column for column in allowed if column in updates)
+    return _update_sql(table, columns), [updates[column] for column in columns]
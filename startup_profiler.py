@@ -0,0 +1,164 @@
+"""
+Startup profiler for VinylFlow.
+
+Records how long each module takes to import, how long Database
+initialisation takes and how long the main windows take to build, then
+prints a report to stderr.
+
+Enable it with either:
+    python main.py --profile
+    VINYLFLOW_PROFILE=1 python main.py
+
+Set VINYLFLOW_PROFILE_OUT=startup_profile.json to also save the report as JSON.
+When profiling is off every hook is a no-op and nothing is installed.
+"""
+import importlib.abc
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Taken as early as possible: main.py imports this module first
+PROCESS_START = time.perf_counter()
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module loader and times exec_module for the profiler"""
+
+    def __init__(self, loader, name, profiler):
+        self._loader = loader
+        self._name = name
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = self._profiler._import_stack
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self._profiler.imports.append({
+                'module': self._name,
+                'self_ms': (elapsed - children) * 1000,
+                'total_ms': elapsed * 1000,
+            })
+
+    def __getattr__(self, name):
+        # Everything else (get_source, is_package, resource readers...) is the real loader's
+        return getattr(self._loader, name)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Meta path hook that wraps the loader of every module imported after install"""
+
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, name, self._profiler)
+        return spec
+
+
+class StartupProfiler:
+    def __init__(self, enabled: bool = False, output_path: str = None):
+        self.enabled = enabled
+        self.output_path = output_path
+        self.imports = []
+        self.sections = []
+        self.marks = []
+        self._import_stack = []
+        self._depth = 0
+        self._finder = None
+        if enabled:
+            self._finder = _ImportTimer(self)
+            sys.meta_path.insert(0, self._finder)
+
+    @contextmanager
+    def section(self, label: str):
+        """Time the body of a with-block; nested sections are indented in the report"""
+        if not self.enabled:
+            yield
+            return
+        entry = {'label': label, 'depth': self._depth, 'ms': 0.0}
+        self.sections.append(entry)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry['ms'] = (time.perf_counter() - start) * 1000
+            self._depth -= 1
+
+    def instrument(self, owner, attr: str, label: str):
+        """Wrap owner.attr (a function or method) so every call is timed as a section"""
+        if not self.enabled:
+            return
+        func = getattr(owner, attr)
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            with self.section(label):
+                return func(*args, **kwargs)
+
+        setattr(owner, attr, timed)
+
+    def mark(self, label: str):
+        """Record the time since process start, e.g. when a window becomes interactive"""
+        if self.enabled:
+            self.marks.append({'label': label, 'ms': (time.perf_counter() - PROCESS_START) * 1000})
+
+    def report(self, top: int = 15):
+        """Print the report to stderr and save it as JSON if an output path is set"""
+        if not self.enabled:
+            return
+        out = sys.stderr
+        print("\n=== VinylFlow startup profile ===", file=out)
+        print(f"Slowest imports (of {len(self.imports)}):", file=out)
+        print(f"  {'module':<32} {'self ms':>9} {'total ms':>9}", file=out)
+        for entry in sorted(self.imports, key=lambda e: e['total_ms'], reverse=True)[:top]:
+            print(f"  {entry['module']:<32} {entry['self_ms']:>9.2f} {entry['total_ms']:>9.2f}", file=out)
+        print("Sections:", file=out)
+        for entry in self.sections:
+            label = '  ' * entry['depth'] + entry['label']
+            print(f"  {label:<42} {entry['ms']:>9.2f} ms", file=out)
+        print("Milestones (since process start):", file=out)
+        for entry in self.marks:
+            print(f"  {entry['label']:<42} {entry['ms']:>9.2f} ms", file=out)
+
+        if self.output_path:
+            try:
+                with open(self.output_path, 'w') as f:
+                    json.dump({'imports': self.imports,
+                               'sections': self.sections,
+                               'marks': self.marks}, f, indent=2)
+            except OSError as e:
+                print(f"Could not write startup profile: {e}", file=out)
+
+
+def _profiling_requested() -> bool:
+    if '--profile' in sys.argv:
+        sys.argv.remove('--profile')
+        return True
+    return os.environ.get('VINYLFLOW_PROFILE', '') not in ('', '0')
+
+
+PROFILER = StartupProfiler(enabled=_profiling_requested(),
+                           output_path=os.environ.get('VINYLFLOW_PROFILE_OUT'))
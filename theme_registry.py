@@ -0,0 +1,173 @@
+"""
+Live theme switching for Tk widgets built with literal palette colours.
+
+Widgets are created with values such as bg=COLORS['bg']. Tk keeps those as
+plain colour strings, so loading another palette into COLORS afterwards
+does not change them. THEME_REGISTRY fixes this without touching those
+call sites:
+
+  * COLORS holds config.PaletteColor values: strings that remember their
+    palette key ('bg', 'primary', ...).
+  * install(root) wraps widget construction and widget configure() until
+    uninstall(), which puts Tk's own methods back. Only widgets of root's
+    Tk interpreter are recorded, as widget -> {option: key}, for every
+    option given a PaletteColor. An option later set to a plain colour is
+    forgotten, so it keeps that colour.
+  * switch(theme) loads the theme into COLORS. It then reconfigures only
+    the recorded options whose key changes colour, in one pass, with one
+    configure() call per widget. All of it lands before Tk next redraws.
+
+ttk widgets take their colours from ttk.Style and are restyled separately
+(RecordStoreApp.create_styles).
+
+    THEME_REGISTRY.install(root)      # before the first widget is built
+    stats = THEME_REGISTRY.switch('vinyl')
+    stats['ms'], stats['widgets'], stats['options']
+    THEME_REGISTRY.uninstall()        # when the themed window is torn down
+"""
+import time
+import tkinter as tk
+import weakref
+from typing import Dict, Optional
+
+from config import COLORS, THEMES, PaletteColor, palette
+
+THEME_ORDER = ('dark', 'light', 'vinyl')
+# Tk's short option names, so bg= and background= are recorded as one option
+OPTION_ALIASES = {'bg': 'background', 'fg': 'foreground'}
+
+
+def next_theme(theme: str) -> str:
+    """The theme after `theme` in THEME_ORDER, wrapping around"""
+    if theme not in THEME_ORDER:
+        return THEME_ORDER[0]
+    return THEME_ORDER[(THEME_ORDER.index(theme) + 1) % len(THEME_ORDER)]
+
+
+class ThemeRegistry:
+    def __init__(self):
+        # Destroyed widgets drop out once nothing else refers to them
+        self._widgets: 'weakref.WeakKeyDictionary[tk.Misc, Dict[str, str]]' = weakref.WeakKeyDictionary()
+        # The Tk interpreter whose widgets are recorded, and (Tk's methods, the wrappers) while installed
+        self._tk = None
+        self._patched = None
+        self.theme: Optional[str] = None
+        self.last_switch: Optional[Dict] = None
+
+    def install(self, root: tk.Misc):
+        """Start recording palette colours given to widgets of root's Tk interpreter.
+
+        Calling it again moves recording to another root without wrapping twice.
+        """
+        self._tk = root.tk
+        if self._patched is not None:
+            return
+        registry = self
+        base_init = tk.BaseWidget.__init__
+        base_configure = tk.Misc._configure
+
+        def __init__(widget, master, widgetName, cnf={}, kw={}, extra=()):
+            base_init(widget, master, widgetName, cnf, kw, extra)
+            if widget.tk is registry._tk:
+                registry._record(widget, cnf, kw)
+
+        def _configure(widget, cmd, cnf, kw):
+            # Only the widget's own options: not itemconfigure, tag or entry configure
+            if cmd == 'configure' and widget.tk is registry._tk:
+                registry._record(widget, cnf, kw)
+            return base_configure(widget, cmd, cnf, kw)
+
+        self._patched = (base_init, base_configure, __init__, _configure)
+        tk.BaseWidget.__init__ = __init__
+        tk.Misc._configure = _configure
+
+    def uninstall(self):
+        """Stop recording, forget the recorded widgets and give Tk its own methods back"""
+        if self._patched is None:
+            return
+        base_init, base_configure, wrapped_init, wrapped_configure = self._patched
+        # Left in place (but recording nothing) if something else has wrapped them since
+        if tk.BaseWidget.__init__ is wrapped_init:
+            tk.BaseWidget.__init__ = base_init
+        if tk.Misc._configure is wrapped_configure:
+            tk.Misc._configure = base_configure
+        self._patched = None
+        self._tk = None
+        self._widgets.clear()
+
+    def _record(self, widget, *option_sets):
+        recorded = None
+        for options in option_sets:
+            if not isinstance(options, dict):
+                continue
+            for option, value in options.items():
+                option = OPTION_ALIASES.get(option.rstrip('_'), option.rstrip('_'))
+                if isinstance(value, PaletteColor):
+                    if recorded is None:
+                        recorded = self._widgets.setdefault(widget, {})
+                    recorded[option] = value.key
+                elif value is not None:
+                    self._widgets.get(widget, {}).pop(option, None)
+
+    def tracked(self) -> int:
+        """Number of widgets with at least one recorded palette colour"""
+        return sum(1 for options in self._widgets.values() if options)
+
+    def switch(self, theme: str) -> Dict:
+        """Load `theme` into COLORS and recolour the recorded widgets whose colours change.
+
+        Returns what was done: theme, widgets and options reconfigured, ms.
+        """
+        if theme not in THEMES:
+            raise ValueError(f"Unknown theme: {theme}")
+        start = time.perf_counter()
+        new = palette(theme)
+        changed = {key for key, value in new.items() if COLORS.get(key) != value}
+        COLORS.update(new)
+        self.theme = theme
+
+        reconfigured = options_set = 0
+        for widget, recorded in list(self._widgets.items()):
+            updates = {option: COLORS[key] for option, key in recorded.items() if key in changed}
+            if not updates:
+                continue
+            try:
+                self._apply(widget, updates)
+                applied = len(updates)
+            except tk.TclError:
+                applied = self._apply_each(widget, recorded, updates)
+            if applied:
+                reconfigured += 1
+                options_set += applied
+        self.last_switch = {'theme': theme, 'widgets': reconfigured, 'options': options_set,
+                            'ms': (time.perf_counter() - start) * 1000}
+        return self.last_switch
+
+    @staticmethod
+    def _apply(widget, updates: Dict[str, str]):
+        # Straight to Tk: going through configure() would only record the same keys again
+        widget.tk.call(widget._w, 'configure', *(item for option, value in updates.items()
+                                                 for item in ('-' + option, value)))
+
+    def _apply_each(self, widget, recorded: Dict[str, str], updates: Dict[str, str]) -> int:
+        """Fallback when a batched configure fails: drop dead widgets and options they do not have.
+
+        Returns the number of options set.
+        """
+        try:
+            if not widget.winfo_exists():
+                raise tk.TclError
+        except tk.TclError:
+            self._widgets.pop(widget, None)
+            return 0
+        applied = 0
+        for option, value in updates.items():
+            try:
+                self._apply(widget, {option: value})
+                applied += 1
+            except tk.TclError:
+                recorded.pop(option, None)
+        return applied
+
+
+THEME_REGISTRY = ThemeRegistry()